@@ -0,0 +1,140 @@
+import csv
+import os
+import pickle
+import tempfile
+from pathlib import Path
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+
+# Колонки файла экспорта — в порядке строк DatabaseManager.iter_catalog_export
+EXPORT_COLUMNS = ['Название', 'Тип', 'Действующие вещества', 'Описание', 'Норма расхода',
+                  'Фасовка', 'Цена, руб.', 'Производитель', 'Культуры', 'Болезни']
+EXPORT_SHEET_NAME = 'Препараты'
+
+# Ширина колонки Excel — по самому длинному значению, но не больше
+MAX_COLUMN_WIDTH = 50
+# Строк за один fetchmany / один кусок записи
+CHUNK_SIZE = 1000
+
+_THIN = Side(style='thin')
+
+
+def _no_progress(stage, done, total):
+    pass
+
+
+class ColumnWidths:
+    """Ширины колонок по самому длинному значению; считаются по кускам строк по мере выгрузки"""
+
+    def __init__(self, headers):
+        self._lengths = [len(str(header)) for header in headers]
+
+    def update(self, rows):
+        lengths = self._lengths
+        for row in rows:
+            for index, value in enumerate(row):
+                if value is not None:
+                    length = len(str(value))
+                    if length > lengths[index]:
+                        lengths[index] = length
+
+    def widths(self):
+        return [min(length + 2, MAX_COLUMN_WIDTH) for length in self._lengths]
+
+
+def export_catalog(db, file_path, search='', filters=None, sort_by='type', sort_order='asc', progress=None,
+                   sheet_name=EXPORT_SHEET_NAME):
+    """Выборка каталога в файл .xlsx или .csv (по расширению) -> число препаратов.
+
+    Строки идут с курсора iter_catalog_export кусками по CHUNK_SIZE и сразу
+    пишутся в файл, каталог целиком в памяти не собирается. Файл пишется во
+    временный рядом и заменяет file_path только в конце: при ошибке или отмене
+    (исключение из progress) прежний файл не портится. Пустая выборка — 0,
+    файл не создаётся. sheet_name — имя листа .xlsx.
+    """
+    progress = progress or _no_progress
+    progress("Выборка каталога", 0, 1)
+    total = db.count_catalog(search, filters)
+    if not total:
+        return 0
+
+    suffix = Path(file_path).suffix.lower()
+    if suffix == '.csv':
+        write = _write_csv
+    else:
+        def write(path, chunks, total, progress):
+            return _write_xlsx(path, chunks, total, progress, sheet_name)
+    chunks = _fetch_chunks(db.iter_catalog_export(search, filters, sort_by, sort_order), total, progress)
+    part_path = f"{file_path}.part"
+    try:
+        count = write(part_path, chunks, total, progress)
+        os.replace(part_path, file_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return count
+
+
+def _fetch_chunks(cursor, total, progress):
+    done = 0
+    while True:
+        progress("Выгрузка строк", done, total)
+        rows = cursor.fetchmany(CHUNK_SIZE)
+        if not rows:
+            return
+        done += len(rows)
+        yield rows
+
+
+def _write_xlsx(file_path, chunks, total, progress, sheet_name=EXPORT_SHEET_NAME):
+    """Write-only книга openpyxl. Ширины колонок пишутся в начало листа, поэтому
+    куски сначала сбрасываются во временный файл, а ширины считаются по ходу"""
+    widths = ColumnWidths(EXPORT_COLUMNS)
+    count = 0
+    with tempfile.TemporaryFile() as spool:
+        for rows in chunks:
+            widths.update(rows)
+            pickle.dump(rows, spool, protocol=pickle.HIGHEST_PROTOCOL)
+            count += len(rows)
+        spool.seek(0)
+
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(sheet_name)
+        for index, width in enumerate(widths.widths(), start=1):
+            worksheet.column_dimensions[get_column_letter(index)].width = width
+        worksheet.append([_header_cell(worksheet, header) for header in EXPORT_COLUMNS])
+        written = 0
+        while written < count:
+            progress("Запись файла", written, count)
+            rows = pickle.load(spool)
+            for row in rows:
+                worksheet.append(row)
+            written += len(rows)
+        progress("Сохранение файла", 0, 1)
+        workbook.save(file_path)
+    return count
+
+
+def _header_cell(worksheet, value):
+    # Заголовок в том же виде, что у DataFrame.to_excel: жирный, по центру, в рамке
+    cell = WriteOnlyCell(worksheet, value=value)
+    cell.font = Font(bold=True)
+    cell.border = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+    cell.alignment = Alignment(horizontal='center', vertical='top')
+    return cell
+
+
+def _write_csv(file_path, chunks, total, progress):
+    # utf-8-sig — чтобы Excel сразу открыл кириллицу
+    count = 0
+    with open(file_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
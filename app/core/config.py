@@ -13,9 +13,41 @@ class AppConfig:
         self.assets_dir = self.base_dir / "app" / "assets"
         self.models_dir = self.assets_dir / "models"
         self.database_dir = self.assets_dir / "database"
+        # Временные файлы приложения (изображения с масками и т.п.)
+        self.cache_dir = self.base_dir / "app" / "cache"
+        self.masks_cache_dir = self.cache_dir / "masks"
         
         # Настройки базы данных
         self.database_path = self.database_dir / "plant_protection.db"
+
+        # Настройки ONNX Runtime (0 — значение библиотеки по умолчанию)
+        self.onnx_intra_op_threads = 0
+        self.onnx_inter_op_threads = 0
+        self.onnx_graph_optimization = "all"        # disable / basic / extended / all
+        self.onnx_execution_mode = "sequential"     # sequential / parallel
+        self.onnx_enable_mem_arena = True
+        # Провайдеры в порядке приоритета; недоступные на устройстве пропускаются
+        self.onnx_providers = ["CPUExecutionProvider"]
+        # Сохранять оптимизированный граф рядом с моделью и загружать его при следующих запусках
+        self.onnx_cache_optimized = True
+        # Вариант моделей: fp32 / fp16 / int8 / auto (auto — по отчёту benchmarks/model_variants.py)
+        self.model_variant = "auto"
+        # Минимальное совпадение top-1 с fp32 (по виду и болезни) для автоматического выбора
+        self.model_variant_min_agreement = 0.98
+
+        # Кэш результатов диагностики
+        self.diagnosis_cache_enabled = True
+        self.diagnosis_cache_max_entries = 1000
+        self.diagnosis_cache_max_age_days = 90
+        # Каскад: сначала прогон на уменьшенном разрешении, полный 512×512 — только при неуверенности
+        self.cascade_enabled = False
+        self.cascade_size = (256, 256)
+        # Строить изображение с масками только по запросу пользователя («показать маску»)
+        self.lazy_mask_overlay = True
+        # Сервер инференса в локальной сети (python -m app.ml.inference_server), например
+        # "http://192.168.1.10:8765"; пусто — диагностика на устройстве. Без связи — тоже на устройстве
+        self.inference_server_url = ""
+        self.inference_server_timeout = 15
         
         # Создание директорий если не существуют
         self._create_directories()
@@ -25,7 +57,8 @@ class AppConfig:
         directories = [
             self.assets_dir,
             self.models_dir,
-            self.database_dir
+            self.database_dir,
+            self.masks_cache_dir
         ]
         
         for directory in directories:
@@ -1,6 +1,103 @@
 import sqlite3
+import threading
+import time
+import json
+import re
+from contextlib import contextmanager
 from pathlib import Path
 from app.core.config import AppConfig
+from app.core.reference_cache import ReferenceCache
+
+# ===== Полнотекстовый поиск по каталогу (FTS5) =====
+# unicode61 приводит регистр и для кириллицы; ё -> е делаем сами (и в индексе, и в запросе)
+FTS_TOKENIZER = "unicode61 remove_diacritics 2"
+# Веса bm25 по колонкам: name, substances, description, cultures, diseases
+FTS_WEIGHTS = (10.0, 5.0, 1.0, 2.0, 2.0)
+
+_FTS_SUBSTANCES_SQL = """(SELECT GROUP_CONCAT(a.substance_name, ' ')
+    FROM pesticide_active_substances pas JOIN active_substances a ON a.id = pas.substance_id
+    WHERE pas.pesticide_id = p.id)"""
+_FTS_CULTURES_SQL = """(SELECT GROUP_CONCAT(c.culture_name, ' ')
+    FROM pesticide_cultures pc JOIN cultures c ON c.id = pc.culture_id
+    WHERE pc.pesticide_id = p.id)"""
+_FTS_DISEASES_SQL = """(SELECT GROUP_CONCAT(d.disease_name, ' ')
+    FROM pesticide_diseases pd JOIN diseases d ON d.id = pd.disease_id
+    WHERE pd.pesticide_id = p.id)"""
+
+
+def _fold_yo_sql(expr):
+    return f"REPLACE(REPLACE({expr}, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def _fts_document_sql(condition):
+    """INSERT строк индекса для препаратов p, удовлетворяющих condition"""
+    columns = ", ".join(_fold_yo_sql(expr) for expr in (
+        "p.name", _FTS_SUBSTANCES_SQL, "p.description", _FTS_CULTURES_SQL, _FTS_DISEASES_SQL))
+    return (" INSERT INTO pesticides_fts (rowid, name, substances, description, cultures, diseases)"
+            f" SELECT p.id, {columns} FROM pesticides p WHERE {condition};")
+
+
+def _fts_refresh_sql(condition):
+    """Пересобрать строки индекса для препаратов p, удовлетворяющих condition"""
+    return (f" DELETE FROM pesticides_fts WHERE rowid IN (SELECT p.id FROM pesticides p WHERE {condition});"
+            + _fts_document_sql(condition))
+
+
+# Триггеры, поддерживающие pesticides_fts в актуальном состоянии: имя -> определение
+FTS_TRIGGERS = {
+    "pesticides_fts_ai": "AFTER INSERT ON pesticides BEGIN"
+                         + _fts_document_sql("p.id = NEW.id") + " END",
+    "pesticides_fts_au": "AFTER UPDATE OF name, description ON pesticides BEGIN"
+                         " DELETE FROM pesticides_fts WHERE rowid = OLD.id;"
+                         + _fts_document_sql("p.id = NEW.id") + " END",
+    "pesticides_fts_ad": "AFTER DELETE ON pesticides BEGIN"
+                         " DELETE FROM pesticides_fts WHERE rowid = OLD.id; END",
+}
+for _link in ("pesticide_active_substances", "pesticide_cultures", "pesticide_diseases"):
+    FTS_TRIGGERS[f"{_link}_fts_ai"] = (f"AFTER INSERT ON {_link} BEGIN"
+                                       + _fts_refresh_sql("p.id = NEW.pesticide_id") + " END")
+    FTS_TRIGGERS[f"{_link}_fts_ad"] = (f"AFTER DELETE ON {_link} BEGIN"
+                                       + _fts_refresh_sql("p.id = OLD.pesticide_id") + " END")
+    FTS_TRIGGERS[f"{_link}_fts_au"] = (f"AFTER UPDATE ON {_link} BEGIN"
+                                       + _fts_refresh_sql("p.id IN (OLD.pesticide_id, NEW.pesticide_id)") + " END")
+# Переименование вещества / культуры / болезни меняет документы всех связанных препаратов
+for _table, _column, _link, _key in (
+        ("active_substances", "substance_name", "pesticide_active_substances", "substance_id"),
+        ("cultures", "culture_name", "pesticide_cultures", "culture_id"),
+        ("diseases", "disease_name", "pesticide_diseases", "disease_id")):
+    FTS_TRIGGERS[f"{_table}_fts_au"] = (
+        f"AFTER UPDATE OF {_column} ON {_table} BEGIN"
+        + _fts_refresh_sql(f"p.id IN (SELECT pesticide_id FROM {_link} WHERE {_key} = NEW.id)") + " END")
+
+
+def fts_query(text):
+    """Строка пользователя -> запрос FTS5: все слова обязательны, каждое как префикс"""
+    text = text.replace('ё', 'е').replace('Ё', 'Е')
+    return " ".join(f'"{token}"*' for token in re.findall(r"\w+", text))
+
+
+# Колонки, у которых есть «тень» <колонка>_cf = casefold() для поиска без учёта регистра.
+# Без индекса: поиск по ним — LIKE '%...%', которому индекс не помогает
+CASEFOLD_COLUMNS = (
+    ("cultures", "culture_name"),
+    ("diseases", "disease_name"),
+    ("active_substances", "substance_name"),
+    ("pesticides", "name"),
+)
+
+
+class ObservedConnection(sqlite3.Connection):
+    """Соединение, оповещающее подписчиков об откате транзакции"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rollback_listeners = []
+
+    def rollback(self):
+        super().rollback()
+        for listener in self.rollback_listeners:
+            listener()
+
 
 class DatabaseManager:
     """Менеджер базы данных SQLite"""
@@ -10,6 +107,13 @@ class DatabaseManager:
         base_dir = Path(__file__).parent.parent.parent
         self.database_path = base_dir / "app" / "assets" / "database" / "plant_protection.db"
         self.connection = None
+        # Справочники (типы, культуры, болезни, вещества) в памяти — общие для импорта и редактирования
+        self.references = None
+        # Отдельное соединение для кэша диагнозов: пишется из потока инференса
+        self._cache_connection = None
+        self._cache_lock = threading.Lock()
+        # Поиск по каталогу через FTS5; False — сборка SQLite без FTS5, поиск через LIKE
+        self.fts_enabled = False
         
         # Создаем директорию если не существует
         self.database_path.parent.mkdir(parents=True, exist_ok=True)
@@ -17,19 +121,36 @@ class DatabaseManager:
     def initialize(self):
         """Инициализация базы данных"""
         try:
-            self.connection = sqlite3.connect(self.database_path)
-            self.connection.row_factory = sqlite3.Row
+            self._connect()
             self._create_tables()
             self._insert_sample_data()
             print("✅ База данных инициализирована успешно")
             print(f"📁 Путь к БД: {self.database_path}")
-            # ===== Функция для корректной работы с регистром при поиске
-            self.connection.create_function("LOWER_UNI", 1, lambda s: s.lower() if s is not None else None)
             return True
         except Exception as e:
             print(f"❌ Ошибка инициализации БД: {e}")
             return False
     
+    def _connect(self, **kwargs):
+        self.connection = sqlite3.connect(self.database_path, factory=ObservedConnection, **kwargs)
+        self.connection.row_factory = sqlite3.Row
+        self.references = ReferenceCache(self.connection)
+        # Откат отменяет и вставки, уже попавшие в кэш справочников
+        self.connection.rollback_listeners.append(self.references.invalidate)
+
+    def open_worker(self):
+        """Отдельный DatabaseManager над тем же файлом для фонового потока.
+
+        Схема уже создана основным соединением; у рабочего — своё соединение и
+        свой кэш справочников. check_same_thread=False: транзакцию импорта,
+        открытую в рабочем потоке, подтверждает или откатывает поток UI.
+        """
+        worker = DatabaseManager()
+        worker.database_path = self.database_path
+        worker.fts_enabled = self.fts_enabled
+        worker._connect(check_same_thread=False)
+        return worker
+
     def _create_tables(self):
         """Создание таблиц базы данных согласно схеме"""
         cursor = self.connection.cursor()
@@ -46,7 +167,8 @@ class DatabaseManager:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS cultures (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                culture_name TEXT NOT NULL UNIQUE
+                culture_name TEXT NOT NULL UNIQUE,
+                culture_name_cf TEXT                 -- culture_name.casefold(), для поиска без учёта регистра
             )
         ''')
         
@@ -54,7 +176,8 @@ class DatabaseManager:
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS active_substances (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                substance_name TEXT NOT NULL UNIQUE
+                substance_name TEXT NOT NULL UNIQUE,
+                substance_name_cf TEXT               -- substance_name.casefold()
             )
         ''')
                 # -- Таблица классов видов (растений)
@@ -80,6 +203,7 @@ class DatabaseManager:
             CREATE TABLE IF NOT EXISTS diseases (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 disease_name TEXT NOT NULL UNIQUE,
+                disease_name_cf TEXT,                -- disease_name.casefold()
                 symptoms TEXT,
                 prevention_methods TEXT,
                 culture_id INTEGER REFERENCES cultures(id),
@@ -98,7 +222,8 @@ class DatabaseManager:
                 price DECIMAL(10, 2),
                 manufacturer TEXT,
                 unit_of_measure TEXT,
-                pesticide_type_id INTEGER REFERENCES pesticide_types(id)
+                pesticide_type_id INTEGER REFERENCES pesticide_types(id),
+                name_cf TEXT                          -- name.casefold()
             )
         ''')
         
@@ -188,16 +313,123 @@ class DatabaseManager:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
+        # 12. Кэш результатов диагностики (ключ — хэш изображения + хэш моделей)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS diagnosis_cache (
+                image_hash TEXT NOT NULL,
+                model_hash TEXT NOT NULL,
+                species_probs TEXT NOT NULL,          -- JSON-список вероятностей видов
+                disease_probs TEXT NOT NULL,          -- JSON-список вероятностей болезней
+                leaf_mask BLOB,                       -- uint8-маска листа (zlib)
+                disease_mask BLOB,                    -- uint8-маска поражений (zlib)
+                masked_image_path TEXT,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (image_hash, model_hash)
+            )
+        ''')
         #  индексы в БД
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pesticides_name ON pesticides(name)")
-        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pesticides_price ON pesticides(price)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_diagnosis_cache_access ON diagnosis_cache(last_access)")
+        # Составные индексы под сортировку каталога и keyset-пагинацию (name, id) / (price, id)
+        cursor.execute("DROP INDEX IF EXISTS idx_pesticides_name")
+        cursor.execute("DROP INDEX IF EXISTS idx_pesticides_price")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pesticides_name_id ON pesticides(name, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_pesticides_price_id ON pesticides(price, id)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_pesticides_type ON pesticides(pesticide_type_id)")
-        
+
         self.connection.commit()
+        self._migrate_casefold_columns()
+        self._create_search_index()
         print("✅ Таблицы базы данных созданы")
         # Загружаем классы заболеваний из файла
         self._load_classes_from_files()
     
+    def _migrate_casefold_columns(self):
+        """Колонки *_cf со значением casefold().
+
+        Значение пишут сами места записи (ReferenceCache.add, импорт прайс-листа,
+        формы каталога) — без SQL-функций Python в триггерах, поэтому БД остаётся
+        доступной на запись из sqlite3 CLI и сторонних программ. Строки, записанные
+        в обход приложения (пустая *_cf), дозаполняются здесь при запуске.
+        """
+        cursor = self.connection.cursor()
+        for table, column in CASEFOLD_COLUMNS:
+            shadow = f"{column}_cf"
+            existing = {row['name'] for row in cursor.execute(f"PRAGMA table_info({table})")}
+            if shadow not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {shadow} TEXT")
+            # Прежняя схема поддерживала колонку триггерами с функцией CASEFOLD
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{shadow}_ai")
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{shadow}_au")
+            # Индекс прежней схемы только замедлял запись: LIKE '%...%' его не использует
+            cursor.execute(f"DROP INDEX IF EXISTS idx_{table}_{shadow}")
+            rows = cursor.execute(
+                f"SELECT id, {column} FROM {table} WHERE {shadow} IS NULL AND {column} IS NOT NULL").fetchall()
+            if rows:
+                cursor.executemany(f"UPDATE {table} SET {shadow} = ? WHERE id = ?",
+                                   [(row[column].casefold(), row['id']) for row in rows])
+                print(f"✅ {table}.{shadow} заполнена ({len(rows)} строк)")
+        self.connection.commit()
+
+    def _create_search_index(self):
+        """FTS5-индекс каталога и триггеры; для существующей БД индекс строится один раз"""
+        cursor = self.connection.cursor()
+        exists = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pesticides_fts'").fetchone()
+        try:
+            cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS pesticides_fts USING fts5(
+                    name, substances, description, cultures, diseases,
+                    tokenize = '{FTS_TOKENIZER}'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"⚠️ FTS5 недоступен, поиск по каталогу без индекса: {e}")
+            self.fts_enabled = False
+            return
+        for name, definition in FTS_TRIGGERS.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {definition}")
+        self.fts_enabled = True
+        if not exists:
+            self.rebuild_search_index()
+        self.connection.commit()
+
+    def rebuild_search_index(self):
+        """Полностью пересобрать FTS-индекс каталога (после миграции или массового импорта)"""
+        if not self.fts_enabled:
+            return
+        cursor = self.connection.cursor()
+        cursor.execute("DELETE FROM pesticides_fts")
+        cursor.execute(_fts_document_sql("1 = 1"))
+        cursor.execute("INSERT INTO pesticides_fts (pesticides_fts) VALUES ('optimize')")
+        self.connection.commit()
+        print("✅ Поисковый индекс каталога перестроен")
+
+    @contextmanager
+    def search_index_suspended(self, condition=None):
+        """Массовая запись без триггеров FTS: индекс обновляется один раз в конце.
+
+        Без condition индекс перестраивается целиком (с commit). С condition
+        (SQL-условие на препараты p) пересобираются только их документы, внутри
+        текущей транзакции — rollback отменяет и запись, и изменения индекса.
+        """
+        if not self.fts_enabled:
+            yield
+            return
+        cursor = self.connection.cursor()
+        for name in FTS_TRIGGERS:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {name}")
+        try:
+            yield
+        finally:
+            for name, definition in FTS_TRIGGERS.items():
+                cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {definition}")
+            if condition is None:
+                self.rebuild_search_index()
+            else:
+                cursor.execute(f"DELETE FROM pesticides_fts WHERE rowid IN (SELECT p.id FROM pesticides p WHERE {condition})")
+                cursor.execute(_fts_document_sql(condition))
+
     def _load_classes_from_files(self):
         """Загружает species_classes и disease_classes из файлов в папке assets"""
         import csv
@@ -245,67 +477,25 @@ class DatabaseManager:
     pass
 
       
-    def _is_similar(self, s1, s2, threshold=2):
-        """Простая проверка на опечатку: если строки начинаются одинаково и длина отличается не более чем на threshold символов."""
-        s1 = s1.lower().strip()
-        s2 = s2.lower().strip()
-        # Если одна строка является началом другой — считаем похожими
-        if s1.startswith(s2) or s2.startswith(s1):
-            return True
-        # Если первые 3 символа совпадают и длины близки — тоже похожи
-        if s1[:3] == s2[:3] and abs(len(s1) - len(s2)) <= threshold:
-            return True
-        return False
-    
     def get_or_create_culture(self, name, cursor=None):
-        # Приводим к формату "Первая буква заглавная, остальные строчные"
-        name = name.strip().capitalize()
-        if cursor is None:
-            cursor = self.connection.cursor()
-            own_cursor = True
-        else:
-            own_cursor = False
-
-        # 1. Точное совпадение (без учёта регистра)
-        cursor.execute("SELECT id, culture_name FROM cultures WHERE LOWER_UNI(culture_name) = LOWER_UNI(?)", (name,))
-        row = cursor.fetchone()
-        if row:
-            return row['id']
-
-        # 2. Поиск похожих названий
-        cursor.execute("SELECT id, culture_name FROM cultures")
-        for row in cursor.fetchall():
-            if self._is_similar(row['culture_name'], name):
-                return row['id']
-
-        # 3. Создаём новую запись
-        cursor.execute("INSERT INTO cultures (culture_name) VALUES (?)", (name,))
-        if own_cursor:
-            self.connection.commit()
-        return cursor.lastrowid
+        return self._get_or_create_reference("cultures", name, cursor)
 
     def get_or_create_disease(self, name, cursor=None):
+        return self._get_or_create_reference("diseases", name, cursor)
+
+    def _get_or_create_reference(self, kind, name, cursor=None):
+        """Культура/болезнь по названию: точное совпадение без учёта регистра, затем похожее, иначе новая запись"""
+        # Приводим к формату "Первая буква заглавная, остальные строчные"
         name = name.strip().capitalize()
+        ref_id = self.references.find_folded(kind, name)
+        if ref_id is None:
+            ref_id = self.references.find_similar(kind, name)
+        if ref_id is not None:
+            return ref_id
+        ref_id = self.references.add(kind, name, cursor)
         if cursor is None:
-            cursor = self.connection.cursor()
-            own_cursor = True
-        else:
-            own_cursor = False
-
-        cursor.execute("SELECT id, disease_name FROM diseases WHERE LOWER_UNI(disease_name) = LOWER_UNI(?)", (name,))
-        row = cursor.fetchone()
-        if row:
-            return row['id']
-
-        cursor.execute("SELECT id, disease_name FROM diseases")
-        for row in cursor.fetchall():
-            if self._is_similar(row['disease_name'], name):
-                return row['id']
-
-        cursor.execute("INSERT INTO diseases (disease_name) VALUES (?)", (name,))
-        if own_cursor:
             self.connection.commit()
-        return cursor.lastrowid
+        return ref_id
 
     def get_disease_class_by_index(self, class_index):
         """Получение класса заболевания по индексу нейросети"""
@@ -449,11 +639,62 @@ class DatabaseManager:
         
         return result
 
-    def get_pesticides_paginated(self, offset=0, limit=20, search='', filters=None, sort_by='name', sort_order='asc'):
-        cursor = self.connection.cursor()
-        # Базовый запрос
+    @staticmethod
+    def catalog_cursor(row, sort_by='name'):
+        """Курсор продолжения для get_pesticides_paginated: (значение сортировки, id) последней строки"""
+        return (row['price'] if sort_by == 'price' else row['name'], row['id'])
+
+    def get_pesticides_paginated(self, offset=0, limit=20, search='', filters=None, sort_by='name', sort_order='asc',
+                                 after=None):
+        """Страница каталога.
+
+        after — курсор последней строки предыдущей страницы (см. catalog_cursor):
+        страница продолжается с него по индексу (name, id) / (price, id),
+        без пропуска offset строк. offset оставлен для совместимости.
+        """
+        sql, where, params = self._catalog_selection(search, filters)
+        sql = "SELECT DISTINCT p.*, pt.type_name as pesticide_type " + sql
+
+        # Сортировка (id — для стабильного порядка при одинаковых значениях)
+        sort_column = 'price' if sort_by == 'price' else 'name'
+        descending = str(sort_order).lower() == 'desc'
+        sort_order = 'DESC' if descending else 'ASC'
+
+        # Продолжение с курсора (keyset). NULL-цены в SQLite идут первыми при ASC и
+        # последними при DESC, поэтому хвост страницы может добираться вторым
+        # диапазоном — так каждый запрос остаётся поиском по индексу, без OR
+        column = f"p.{sort_column}"
+        if after is None:
+            ranges = [(None, [])]
+        else:
+            after_value, after_id = after
+            offset = 0
+            if after_value is None:
+                op = '<' if descending else '>'
+                ranges = [(f"{column} IS NULL AND p.id {op} ?", [after_id])]
+                if not descending:
+                    ranges.append((f"{column} IS NOT NULL", []))
+            else:
+                op = '<' if descending else '>'
+                ranges = [(f"({column}, p.id) {op} (?, ?)", [after_value, after_id])]
+                if descending and sort_column == 'price':
+                    ranges.append((f"{column} IS NULL", []))
+
+        result = []
+        for keyset, keyset_params in ranges:
+            page_where = where + [keyset] if keyset else where
+            page = self._query_catalog_page(
+                sql + " WHERE " + " AND ".join(page_where), params + keyset_params,
+                sort_column, sort_order, limit - len(result), offset)
+            result.extend(page)
+            if len(result) >= limit:
+                break
+        return result
+
+    def _catalog_selection(self, search='', filters=None):
+        """FROM ... JOIN, условия WHERE и параметры выборки каталога по поиску и фильтрам
+        (общие для страниц каталога и экспорта)"""
         sql = """
-            SELECT DISTINCT p.*, pt.type_name as pesticide_type
             FROM pesticides p
             LEFT JOIN pesticide_types pt ON p.pesticide_type_id = pt.id
         """
@@ -462,15 +703,20 @@ class DatabaseManager:
         joins = []
         where = ["1=1"]
 
-        # Поиск по названию/описанию
-        if search:
-            search_lower = search.lower()
+        # Поиск по FTS-индексу: название, вещества, описание, культуры, болезни
+        match = fts_query(search) if search and self.fts_enabled else ''
+        if match:
+            where.append("p.id IN (SELECT rowid FROM pesticides_fts WHERE pesticides_fts MATCH ?)")
+            params.append(match)
+        elif search and not self.fts_enabled:
+            # Без FTS5 — прежний поиск подстрокой по названию и веществам
+            search_folded = search.casefold()
             sql += """
                 LEFT JOIN pesticide_active_substances pas2 ON p.id = pas2.pesticide_id
                 LEFT JOIN active_substances a2 ON pas2.substance_id = a2.id
             """
-            where.append("(LOWER_UNI(p.name) LIKE ? OR LOWER_UNI(a2.substance_name) LIKE ?)")
-            params.extend([f'%{search_lower}%', f'%{search_lower}%'])
+            where.append("(p.name_cf LIKE ? OR a2.substance_name_cf LIKE ?)")
+            params.extend([f'%{search_folded}%', f'%{search_folded}%'])
 
         # Фильтр по типу
         if filters and filters.get('type'):
@@ -501,63 +747,241 @@ class DatabaseManager:
         if filters and filters.get('max_price') and filters['max_price'].strip():
             where.append("p.price <= ?")
             params.append(float(filters['max_price']))
+        sql += " ".join(joins)
+        return sql, where, params
 
-        # Собираем запрос
-        sql += " ".join(joins) + " WHERE " + " AND ".join(where)
+    def _query_catalog_page(self, sql, params, sort_column, sort_order, limit, offset):
+        """Страница каталога по готовому SELECT ... WHERE вместе с веществами"""
+        sql += f" ORDER BY p.{sort_column} {sort_order}, p.id {sort_order} LIMIT ? OFFSET ?"
+        params = params + [limit, offset]
 
-        # Сортировка
-        if sort_by == 'price':
-            sql += f" ORDER BY p.price {sort_order}"
-        else:
-            sql += f" ORDER BY p.name {sort_order}"
+        # Вещества агрегируются одним запросом для всей страницы, а не подзапросом на каждую строку
+        sql = f"""
+            WITH page AS ({sql})
+            SELECT page.*, COALESCE(s.substances, '') AS substances
+            FROM page
+            LEFT JOIN (
+                SELECT pas.pesticide_id,
+                       GROUP_CONCAT(a.substance_name || ' ' || pas.concentration, '||') AS substances
+                FROM pesticide_active_substances pas
+                JOIN active_substances a ON pas.substance_id = a.id
+                WHERE pas.pesticide_id IN (SELECT id FROM page)
+                GROUP BY pas.pesticide_id
+            ) s ON s.pesticide_id = page.id
+            ORDER BY page.{sort_column} {sort_order}, page.id {sort_order}
+        """
+        cursor = self.connection.cursor()
+        cursor.execute(sql, params)
+        return [dict(row) for row in cursor.fetchall()]
 
-        sql += " LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+    def count_catalog(self, search='', filters=None):
+        """Число препаратов в выборке каталога по поиску и фильтрам"""
+        sql, where, params = self._catalog_selection(search, filters)
+        cursor = self.connection.cursor()
+        cursor.execute(f"SELECT COUNT(DISTINCT p.id) {sql} WHERE {' AND '.join(where)}", params)
+        return cursor.fetchone()[0]
 
-        print("DEBUG SQL:", sql)
-        print("DEBUG PARAMS:", params)
+    def iter_catalog_export(self, search='', filters=None, sort_by='name', sort_order='asc'):
+        """Строки экспорта каталога — кортежами в порядке EXPORT_COLUMNS (app/core/catalog_export.py).
 
-        cursor.execute(sql, params)
-        rows = cursor.fetchall()
-        result = []
-        for row in rows:
-            d = dict(row)
-            # Получаем вещества отдельно
-            sub_sql = """
-                SELECT GROUP_CONCAT(a.substance_name || ' ' || pas.concentration, '||')
+        Вещества, культуры и болезни собираются тремя GROUP BY по выборке,
+        а не запросами на каждый препарат; строки читаются с курсора по мере
+        обхода. sort_by='type' — по типу и названию (полный экспорт).
+        """
+        sql, where, params = self._catalog_selection(search, filters)
+        descending = str(sort_order).lower() == 'desc'
+        direction = 'DESC' if descending else 'ASC'
+        if sort_by == 'type':
+            order = f"pt.type_name {direction}, p.name {direction}, p.id {direction}"
+        else:
+            sort_column = 'price' if sort_by == 'price' else 'name'
+            order = f"p.{sort_column} {direction}, p.id {direction}"
+        cursor = self.connection.cursor()
+        cursor.row_factory = None
+        cursor.execute(f"""
+            WITH selected AS (SELECT DISTINCT p.id {sql} WHERE {' AND '.join(where)}),
+            substance_lists AS (
+                SELECT pas.pesticide_id, GROUP_CONCAT(a.substance_name || ' ' || pas.concentration, '; ') AS value
                 FROM pesticide_active_substances pas
                 JOIN active_substances a ON pas.substance_id = a.id
-                WHERE pas.pesticide_id = ?
-            """
-            cursor.execute(sub_sql, (d['id'],))
-            subs_row = cursor.fetchone()
-            d['substances'] = subs_row[0] if subs_row and subs_row[0] else ''
-            result.append(d)
-        return result
+                WHERE pas.pesticide_id IN (SELECT id FROM selected)
+                GROUP BY pas.pesticide_id
+            ),
+            culture_lists AS (
+                SELECT pc.pesticide_id, GROUP_CONCAT(c.culture_name, ', ') AS value
+                FROM pesticide_cultures pc
+                JOIN cultures c ON pc.culture_id = c.id
+                WHERE pc.pesticide_id IN (SELECT id FROM selected)
+                GROUP BY pc.pesticide_id
+            ),
+            disease_lists AS (
+                SELECT pd.pesticide_id, GROUP_CONCAT(d.disease_name, ', ') AS value
+                FROM pesticide_diseases pd
+                JOIN diseases d ON pd.disease_id = d.id
+                WHERE pd.pesticide_id IN (SELECT id FROM selected)
+                GROUP BY pd.pesticide_id
+            )
+            SELECT p.name, pt.type_name, COALESCE(s.value, ''), COALESCE(p.description, ''),
+                   COALESCE(p.application_rate, ''), COALESCE(p.packaging, ''), p.price,
+                   COALESCE(p.manufacturer, ''), COALESCE(c.value, ''), COALESCE(d.value, '')
+            FROM selected
+            JOIN pesticides p ON p.id = selected.id
+            LEFT JOIN pesticide_types pt ON p.pesticide_type_id = pt.id
+            LEFT JOIN substance_lists s ON s.pesticide_id = p.id
+            LEFT JOIN culture_lists c ON c.pesticide_id = p.id
+            LEFT JOIN disease_lists d ON d.pesticide_id = p.id
+            ORDER BY {order}
+        """, params)
+        return cursor
 
-    def search_pesticides(self, query, filters=None):
-        """Поиск препаратов с фильтрами"""
-        print(f"Поиск по '{query}', фильтры {filters} пока не применяются")
+    def search_pesticides(self, query, filters=None, limit=50):
+        """Поиск препаратов по релевантности (bm25) среди всех полей каталога.
+
+        Каждое слово запроса ищется как префикс. С фильтрами или без FTS5
+        поиск идёт через get_pesticides_paginated (порядок — по названию).
+        """
+        if not fts_query(query):
+            return []
+        if filters or not self.fts_enabled:
+            return self.get_pesticides_paginated(limit=limit, search=query, filters=filters)
+        weights = ", ".join(str(weight) for weight in FTS_WEIGHTS)
         cursor = self.connection.cursor()
-        
-        sql = '''
-            SELECT DISTINCT p.*
-            FROM pesticides p
-            LEFT JOIN pesticide_active_substances pas ON p.id = pas.pesticide_id
-            LEFT JOIN active_substances as ON pas.substance_id = as.id
-            LEFT JOIN pesticide_diseases pd ON p.id = pd.pesticide_id
-            LEFT JOIN diseases d ON pd.disease_id = d.id
-            WHERE (p.name LIKE ? OR as.substance_name LIKE ? OR d.disease_name LIKE ?)
-        '''
-        params = [f'%{query}%', f'%{query}%', f'%{query}%']
-        
-        cursor.execute(sql, params)
-        return cursor.fetchall()
-        
+        cursor.execute(f"""
+            SELECT p.*, pt.type_name as pesticide_type
+            FROM pesticides_fts
+            JOIN pesticides p ON p.id = pesticides_fts.rowid
+            LEFT JOIN pesticide_types pt ON p.pesticide_type_id = pt.id
+            WHERE pesticides_fts MATCH ?
+            ORDER BY bm25(pesticides_fts, {weights})
+            LIMIT ?
+        """, (fts_query(query), limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+    # ======= Кэш диагнозов =========
+    def _get_cache_connection(self):
+        """Соединение для кэша диагнозов, допускающее вызовы из рабочих потоков"""
+        if self._cache_connection is None:
+            self._cache_connection = sqlite3.connect(self.database_path, timeout=1.0,
+                                                     check_same_thread=False)
+            self._cache_connection.row_factory = sqlite3.Row
+        return self._cache_connection
+
+    def get_cached_diagnosis(self, image_hash, model_hash):
+        """Получение закэшированного результата диагностики или None"""
+        try:
+            with self._cache_lock:
+                conn = self._get_cache_connection()
+                row = conn.execute('''
+                    SELECT species_probs, disease_probs, leaf_mask, disease_mask, masked_image_path
+                    FROM diagnosis_cache
+                    WHERE image_hash = ? AND model_hash = ?
+                ''', (image_hash, model_hash)).fetchone()
+                if not row:
+                    return None
+                conn.execute('''
+                    UPDATE diagnosis_cache SET last_access = ?
+                    WHERE image_hash = ? AND model_hash = ?
+                ''', (time.time(), image_hash, model_hash))
+                conn.commit()
+            return {
+                'species_probs': json.loads(row['species_probs']),
+                'disease_probs': json.loads(row['disease_probs']),
+                'leaf_mask': row['leaf_mask'],
+                'disease_mask': row['disease_mask'],
+                'masked_image_path': row['masked_image_path'],
+            }
+        except sqlite3.Error as e:
+            print(f"⚠️ Ошибка чтения кэша диагнозов: {e}")
+            return None
+
+    def save_cached_diagnosis(self, image_hash, model_hash, species_probs, disease_probs,
+                              leaf_mask=None, disease_mask=None, masked_image_path=None,
+                              max_entries=1000, max_age_days=90):
+        """Сохранение результата диагностики в кэш с последующей очисткой устаревших записей"""
+        now = time.time()
+        try:
+            with self._cache_lock:
+                conn = self._get_cache_connection()
+                conn.execute('''
+                    INSERT OR REPLACE INTO diagnosis_cache
+                        (image_hash, model_hash, species_probs, disease_probs,
+                         leaf_mask, disease_mask, masked_image_path, created_at, last_access)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (image_hash, model_hash, json.dumps(species_probs), json.dumps(disease_probs),
+                      leaf_mask, disease_mask, masked_image_path, now, now))
+                self._evict_diagnosis_cache(conn, now, max_entries, max_age_days)
+                conn.commit()
+            return True
+        except sqlite3.Error as e:
+            print(f"⚠️ Ошибка записи кэша диагнозов: {e}")
+            return False
+
+    def update_cached_mask_path(self, image_hash, model_hash, masked_image_path):
+        """Обновление пути к изображению с масками для записи кэша"""
+        try:
+            with self._cache_lock:
+                conn = self._get_cache_connection()
+                conn.execute('''
+                    UPDATE diagnosis_cache SET masked_image_path = ?
+                    WHERE image_hash = ? AND model_hash = ?
+                ''', (masked_image_path, image_hash, model_hash))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Ошибка записи кэша диагнозов: {e}")
+
+    def _evict_diagnosis_cache(self, conn, now, max_entries, max_age_days):
+        """Удаление записей старше срока хранения и сверх лимита (по давности обращения)"""
+        self._delete_cached_diagnoses(conn, "last_access < ?", (now - max_age_days * 86400,))
+        self._delete_cached_diagnoses(conn, '''
+            rowid IN (
+                SELECT rowid FROM diagnosis_cache
+                ORDER BY last_access DESC
+                LIMIT -1 OFFSET ?
+            )
+        ''', (max_entries,))
+
+    def _delete_cached_diagnoses(self, conn, where, params=()):
+        """Удаление записей кэша вместе с их PNG с масками.
+
+        Файл masked_<хэш изображения>.png может быть общим у записей разных
+        версий моделей — он удаляется, только если на него больше никто не ссылается.
+        """
+        paths = {row[0] for row in conn.execute(
+            f"SELECT masked_image_path FROM diagnosis_cache WHERE ({where}) AND masked_image_path IS NOT NULL",
+            params)}
+        conn.execute(f"DELETE FROM diagnosis_cache WHERE {where}", params)
+        if not paths:
+            return
+        placeholders = ", ".join("?" * len(paths))
+        paths -= {row[0] for row in conn.execute(
+            f"SELECT masked_image_path FROM diagnosis_cache WHERE masked_image_path IN ({placeholders})",
+            tuple(paths))}
+        for path in paths:
+            try:
+                Path(path).unlink(missing_ok=True)
+            except OSError as e:
+                print(f"⚠️ Не удалось удалить {path}: {e}")
+
+    def purge_diagnosis_cache(self, keep_model_hash=None):
+        """Удаление записей кэша, полученных другими версиями моделей (или всего кэша)"""
+        try:
+            with self._cache_lock:
+                conn = self._get_cache_connection()
+                if keep_model_hash is None:
+                    self._delete_cached_diagnoses(conn, "1 = 1")
+                else:
+                    self._delete_cached_diagnoses(conn, "model_hash != ?", (keep_model_hash,))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Ошибка очистки кэша диагнозов: {e}")
+
     def close(self):
             """Закрытие соединения с БД"""
             if self.connection:
                 self.connection.close()
+            if self._cache_connection:
+                self._cache_connection.close()
+                self._cache_connection = None
 
     def _load_disease_classes_from_file(self):
         """Загрузка классов заболеваний из TXT файла"""
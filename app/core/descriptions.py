@@ -0,0 +1,89 @@
+import pandas as pd
+
+# Колонки листа описаний препаратов
+DESCRIPTION_COLUMNS = ['Название', 'Культуры', 'Болезни', 'Описание']
+
+
+def _no_progress(stage, done, total):
+    pass
+
+
+def import_descriptions(db, source, sheet_names, progress=None):
+    """Описания, культуры и болезни препаратов из листов Excel (в одной транзакции).
+
+    source — путь к файлу или pd.ExcelFile. Транзакция остаётся открытой:
+    commit или rollback делает вызывающий после просмотра отчёта.
+    progress(этап, сделано, всего) вызывается на каждой строке.
+    """
+    progress = progress or _no_progress
+    cursor = db.connection.cursor()
+    cursor.execute("BEGIN TRANSACTION")
+    try:
+        total_updated = 0
+        not_found_list = []   # (название, причина)
+
+        for sheet_number, sheet_name in enumerate(sheet_names):
+            progress(f"Чтение листа '{sheet_name}'", sheet_number, len(sheet_names))
+            df = pd.read_excel(source, sheet_name=sheet_name, header=0)
+            if not all(col in df.columns for col in DESCRIPTION_COLUMNS):
+                missing = [col for col in DESCRIPTION_COLUMNS if col not in df.columns]
+                found = [col for col in df.columns if col in DESCRIPTION_COLUMNS]
+                not_found_list.append((
+                    f"Лист '{sheet_name}'",
+                    f"Отсутствуют колонки: {', '.join(missing)}.\nНайдены: {', '.join(found) if found else 'нет'}" ))
+                continue
+
+            stage = f"Лист '{sheet_name}'"
+            for row_number, (_, row) in enumerate(df.iterrows()):
+                progress(stage, row_number, len(df))
+                name = str(row['Название']).strip()
+                if not name:
+                    continue
+                cursor.execute("SELECT id, description FROM pesticides WHERE name = ?", (name,))
+                res = cursor.fetchone()
+                if not res:
+                    not_found_list.append((name, "Препарат не найден в БД"))
+                    continue
+
+                pesticide_id = res['id']
+                old_description = res['description'] or ""
+
+                new_description = str(row['Описание']).strip() if pd.notna(row['Описание']) else ""
+                cultures_str = str(row['Культуры']).strip() if pd.notna(row['Культуры']) else ""
+                diseases_str = str(row['Болезни']).strip() if pd.notna(row['Болезни']) else ""
+
+                has_changes = False
+
+                if new_description != old_description:
+                    cursor.execute("UPDATE pesticides SET description = ? WHERE id = ?", (new_description, pesticide_id))
+                    has_changes = True
+
+                if cultures_str:
+                    cursor.execute("DELETE FROM pesticide_cultures WHERE pesticide_id = ?", (pesticide_id,))
+                    culture_list = [c.strip() for c in cultures_str.split(',') if c.strip()]
+                    for cult_name in culture_list:
+                        culture_id = db.get_or_create_culture(cult_name, cursor=cursor)
+                        cursor.execute("INSERT OR IGNORE INTO pesticide_cultures (pesticide_id, culture_id) VALUES (?, ?)",
+                                       (pesticide_id, culture_id))
+                    has_changes = True
+
+                if diseases_str:
+                    cursor.execute("DELETE FROM pesticide_diseases WHERE pesticide_id = ?", (pesticide_id,))
+                    disease_list = [d.strip() for d in diseases_str.split(',') if d.strip()]
+                    for dis_name in disease_list:
+                        disease_id = db.get_or_create_disease(dis_name, cursor=cursor)
+                        cursor.execute("INSERT OR IGNORE INTO pesticide_diseases (pesticide_id, disease_id) VALUES (?, ?)",
+                                       (pesticide_id, disease_id))
+                    has_changes = True
+
+                if has_changes:
+                    total_updated += 1
+    except Exception:
+        db.connection.rollback()
+        raise
+
+    return {
+        'cursor': cursor,
+        'updated': total_updated,
+        'not_found': not_found_list,
+    }
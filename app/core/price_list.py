@@ -0,0 +1,563 @@
+import abc
+import re
+from contextlib import ExitStack, contextmanager
+
+import pandas as pd
+from openpyxl import load_workbook
+
+# Колонки прайс-листа поставщика
+NAME_COLUMN = 'Препараты'
+COMPOSITION_COLUMN = 'Состав'
+MANUFACTURER_COLUMN = 'Производитель'
+PACKAGING_COLUMN = 'Упаковка'
+RATE_COLUMN = 'Норма расхода, кг(л)/га'
+PRICE_COLUMN = 'Цена за ед. (с НДС) в руб.'
+REQUIRED_COLUMNS = [NAME_COLUMN, COMPOSITION_COLUMN, MANUFACTURER_COLUMN, PACKAGING_COLUMN,
+                    RATE_COLUMN, PRICE_COLUMN]
+
+# Строки-разделители внутри листа, задающие тип препаратов ниже них
+TYPE_VARIANTS = {
+    "ГЕРБИЦИДЫ": "Гербициды",
+    "ГЕРБЕЦИДЫ": "Гербициды",
+    "ИНСЕКТИЦИДЫ": "Инсектициды",
+    "ФУНГИЦИДЫ": "Фунгициды",
+    "ДЕСИКАНТЫ": "Десиканты",
+    "ПРОТРАВИТЕЛИ": "Протравители",
+    "ФУМИГАНТЫ": "Фумиганты",
+    "СПЕЦПРЕПАРАТЫ": "Спецпрепараты",
+    "РОДЕНТИЦИДЫ": "Родентициды"
+}
+
+# Временное увеличение кэша страниц на время массовой записи
+BULK_PRAGMAS = {"cache_size": -65536}
+# Временные таблицы (temp.price_list_indexed) — в памяти. SQLite не меняет temp_store
+# внутри транзакции, поэтому прагма ставится до BEGIN IMMEDIATE; вернуть её можно только
+# после commit/rollback, который делает вызывающий (обычно на рабочем соединении open_worker)
+TRANSACTION_PRAGMAS = {"temp_store": 2}
+
+# Новый препарат или (при совпадении id) обновление полей прайс-листа; описание не трогаем
+INSERT_PESTICIDE_SQL = """
+    INSERT INTO pesticides (id, name, name_cf, description, application_rate, packaging, price, manufacturer,
+                            pesticide_type_id)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        application_rate = excluded.application_rate,
+        packaging = excluded.packaging,
+        price = excluded.price,
+        manufacturer = excluded.manufacturer,
+        pesticide_type_id = excluded.pesticide_type_id
+"""
+UPSERT_SUBSTANCE_LINK_SQL = """
+    INSERT INTO pesticide_active_substances (pesticide_id, substance_id, concentration)
+    VALUES (?, ?, ?)
+    ON CONFLICT (pesticide_id, substance_id) DO UPDATE SET concentration = excluded.concentration
+"""
+
+_CONCENTRATION_PATTERN = re.compile(r'([\d,\.]+\s*(?:г/кг|г/л|%|мг/кг|мг/л))')
+
+
+def parse_composition(composition_str):
+    """Строка «Состав» -> [(вещество, концентрация)] без повторов"""
+    if not composition_str:
+        return []
+    # Разделяем по + или ; с пробелами
+    fragments = re.split(r'\s*[+;]\s*', composition_str)
+    result = []
+    for frag in fragments:
+        frag = frag.strip()
+        if not frag:
+            continue
+        match = _CONCENTRATION_PATTERN.search(frag)
+        if match:
+            conc = match.group(1).strip()
+            # Убираем концентрацию из строки, остальное – название
+            name = frag[:match.start()].strip() + " " + frag[match.end():].strip()
+            name = name.strip()
+            if not name and result:
+                # Если концентрация была в начале, а название не выделилось,
+                # используем название предыдущего вещества (редкий случай)
+                name = result[-1][0]
+            result.append((name, conc))
+        else:
+            # Нет концентрации – дописываем к последнему названию
+            if result:
+                last_name, last_conc = result[-1]
+                result[-1] = (f"{last_name} {frag}".strip(), last_conc)
+            else:
+                result.append((frag, ''))
+    # Удаляем дубликаты
+    return list(dict.fromkeys(result))
+
+
+def parse_price(text):
+    """Цена из текста ячейки или None, если это не число ('по запросу')"""
+    try:
+        return float(text.replace(',', '.'))
+    except ValueError:
+        return None
+
+
+def _cell_text(value):
+    """Значение ячейки -> строка без пробелов по краям; пустая ячейка -> ''.
+
+    Целые числа, записанные как float, приводятся к int, как это делает read_excel.
+    """
+    if value is None or value != value:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def _no_progress(stage, done, total):
+    pass
+
+
+class PriceListSheet:
+    """Строки препаратов листа (или его куска) по колонкам; разделители и пустые строки отброшены"""
+
+    def __init__(self, name, names, compositions, manufacturers, packagings, rates, prices, types):
+        self.name = name
+        self.names = names
+        self.compositions = compositions
+        self.manufacturers = manufacturers
+        self.packagings = packagings
+        self.rates = rates
+        self.prices = prices   # None — цену не удалось разобрать
+        self.types = types
+
+    def __len__(self):
+        return len(self.names)
+
+    def rows(self):
+        return zip(self.names, self.compositions, self.manufacturers, self.packagings,
+                   self.rates, self.prices, self.types)
+
+
+class PriceListSheetReader:
+    """Потоковый разбор листа прайс-листа: строки значений -> куски PriceListSheet.
+
+    rows — итератор кортежей значений ячеек (openpyxl iter_rows(values_only=True)
+    или DataFrame.itertuples). Строка заголовков ищется при создании; затем
+    chunks() читает лист дальше и отдаёт по chunk_size строк препаратов, так что
+    в памяти одновременно находится только один кусок. error — строка отчёта,
+    если лист не подходит; empty — лист без строк (в отчёт не попадает).
+    """
+
+    CHUNK_SIZE = 1000
+
+    def __init__(self, name, rows, total_rows=0):
+        self.name = name
+        self.total_rows = total_rows or 0   # оценка числа строк листа (для прогресса), 0 — неизвестно
+        self.rows_read = 0
+        self.error = None
+        self.empty = False
+        self._rows = iter(rows)
+        self._columns = None
+        self._find_header()
+
+    def _find_header(self):
+        # Строка с заголовками — первая, где в первой колонке «№ п/п» или «Препараты»
+        for values in self._rows:
+            self.rows_read += 1
+            first = _cell_text(values[0]) if values else ""
+            if first == "№ п/п" or first == NAME_COLUMN or "препараты" in first.lower():
+                break
+        else:
+            if self.rows_read:
+                self.error = f"Лист '{self.name}': не найден заголовок, пропущен"
+            else:
+                self.empty = True
+            return
+
+        header = [_cell_text(value) for value in values]
+        if not all(col in header for col in REQUIRED_COLUMNS):
+            missing = [col for col in REQUIRED_COLUMNS if col not in header]
+            found = [col for col in header if col in REQUIRED_COLUMNS]
+            self.error = (
+                f"Лист '{self.name}': не найдены необходимые колонки.\n"
+                f"   Ожидались: {', '.join(REQUIRED_COLUMNS)}\n"
+                f"   Найдены: {', '.join(found) if found else 'нет'}\n"
+                f"   Отсутствуют: {', '.join(missing)}"
+            )
+            return
+        self._columns = [header.index(col) for col in REQUIRED_COLUMNS]
+
+    def chunks(self, chunk_size=None):
+        """Куски PriceListSheet по chunk_size строк препаратов"""
+        if self._columns is None:
+            return
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        name_col, composition_col, manufacturer_col, packaging_col, rate_col, price_col = self._columns
+        width = max(self._columns) + 1
+        # Тип — по последнему разделителю выше строки, до первого разделителя — по названию листа
+        current_type = TYPE_VARIANTS.get(self.name.strip().upper(), self.name.capitalize())
+        columns = [[] for _ in range(7)]
+        names, compositions, manufacturers, packagings, rates, prices, types = columns
+
+        for values in self._rows:
+            self.rows_read += 1
+            if not values:
+                continue
+            marker = _cell_text(values[0]).upper()
+            if marker in TYPE_VARIANTS:
+                current_type = TYPE_VARIANTS[marker]
+                continue
+            if len(values) < width:
+                values = tuple(values) + (None,) * (width - len(values))
+            name = _cell_text(values[name_col])
+            if not name:
+                continue
+            names.append(name)
+            compositions.append(_cell_text(values[composition_col]))
+            manufacturers.append(_cell_text(values[manufacturer_col]))
+            packagings.append(_cell_text(values[packaging_col]))
+            rates.append(_cell_text(values[rate_col]))
+            prices.append(parse_price(_cell_text(values[price_col])))
+            types.append(current_type)
+            if len(names) >= chunk_size:
+                yield PriceListSheet(self.name, *columns)
+                columns = [[] for _ in range(7)]
+                names, compositions, manufacturers, packagings, rates, prices, types = columns
+        if names:
+            yield PriceListSheet(self.name, *columns)
+
+
+def dataframe_sheet(sheet_name, df):
+    """Лист, уже прочитанный read_excel(header=None), как PriceListSheetReader"""
+    return PriceListSheetReader(sheet_name, df.itertuples(index=False, name=None), total_rows=len(df))
+
+
+def read_price_list_sheet(sheet_name, df):
+    """Лист read_excel(header=None) -> (PriceListSheet, None) или (None, строка отчёта).
+
+    Пустой лист даёт (None, None) и в отчёт не попадает.
+    """
+    reader = dataframe_sheet(sheet_name, df)
+    if reader.error or reader.empty:
+        return None, reader.error
+    sheet = PriceListSheet(sheet_name, [], [], [], [], [], [], [])
+    for chunk in reader.chunks():
+        for mine, theirs in zip((sheet.names, sheet.compositions, sheet.manufacturers, sheet.packagings,
+                                 sheet.rates, sheet.prices, sheet.types),
+                                (chunk.names, chunk.compositions, chunk.manufacturers, chunk.packagings,
+                                 chunk.rates, chunk.prices, chunk.types)):
+            mine.extend(theirs)
+    return sheet, None
+
+
+def open_price_list(file_path, sheet_names, progress=None):
+    """Листы прайс-листа из .xlsx потоком (openpyxl read_only) -> PriceListSheetReader по одному.
+
+    Лист не загружается целиком: строки читаются по мере обхода chunks().
+    Книга закрывается, когда генератор исчерпан или закрыт.
+    """
+    progress = progress or _no_progress
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        for sheet_number, sheet_name in enumerate(sheet_names):
+            progress(f"Чтение листа '{sheet_name}'", sheet_number, len(sheet_names))
+            worksheet = workbook[sheet_name]
+            # Размер из заголовка файла — только для прогресса; сами строки читаются без него,
+            # т.к. некоторые программы записывают неверный dimension
+            total_rows = worksheet.max_row or 0
+            worksheet.reset_dimensions()
+            yield PriceListSheetReader(sheet_name, worksheet.iter_rows(values_only=True), total_rows)
+    finally:
+        workbook.close()
+
+
+class _PriceListLoader(abc.ABC):
+    """Общая часть импорта и обновления: транзакция, справочники, пачечная запись.
+
+    Транзакция остаётся открытой: commit или rollback делает вызывающий после
+    просмотра отчёта (cursor возвращается в статистике). TRANSACTION_PRAGMAS
+    ставятся до BEGIN и после успешной загрузки остаются на соединении.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.connection = db.connection
+        self.skipped_items = []   # (лист, препарат, причина)
+        self._reference_ids = {}
+        self._progress = _no_progress
+
+    def run(self, sheets, progress=None):
+        """sheets — PriceListSheetReader по листам (open_price_list, dataframe_sheet) -> статистика
+        в формате диалога отчёта.
+
+        progress(этап, сделано, всего) вызывается по ходу работы; исключение из
+        него (например, отмена) откатывает транзакцию.
+        """
+        self._progress = progress or _no_progress
+        cursor = self.connection.cursor()
+        saved = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in TRANSACTION_PRAGMAS}
+        for name, value in TRANSACTION_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            stats = self._load(cursor, sheets)
+        except Exception:
+            self.connection.rollback()
+            for name, value in saved.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            raise
+        stats['cursor'] = cursor
+        return stats
+
+    @abc.abstractmethod
+    def _load(self, cursor, sheets):
+        """Запись листов в открытой транзакции -> статистика для отчёта"""
+
+    def _reference_id(self, kind, name, cursor):
+        # Пока транзакция открыта (BEGIN IMMEDIATE), справочники никто другой не меняет —
+        # каждое название разрешается через db.references один раз за загрузку
+        ids = self._reference_ids.setdefault(kind, {})
+        ref_id = ids.get(name)
+        if ref_id is None:
+            ref_id = ids[name] = self.db.references.get_or_create(kind, name, cursor)
+        return ref_id
+
+    def _substance_links(self, composition, cursor):
+        """{id вещества: концентрация} по строке «Состав»; повтор вещества не перезаписывает первое"""
+        links = {}
+        for substance_name, concentration in parse_composition(composition):
+            if substance_name:
+                links.setdefault(self._reference_id("substances", substance_name, cursor), concentration)
+        return links
+
+    @staticmethod
+    def _next_pesticide_id(cursor):
+        """Следующий id препарата так, как его выдал бы AUTOINCREMENT"""
+        row = cursor.execute("""
+            SELECT MAX(COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'pesticides'), 0),
+                       COALESCE((SELECT MAX(id) FROM pesticides), 0))
+        """).fetchone()
+        return row[0] + 1
+
+    @contextmanager
+    def _bulk_write(self, cursor):
+        """Запись пачками: увеличенный кэш страниц и триггеры FTS отключены;
+        документы поискового индекса для отмеченных (_mark_indexed) препаратов
+        строятся одним запросом в конце"""
+        saved = {name: cursor.execute(f"PRAGMA {name}").fetchone()[0] for name in BULK_PRAGMAS}
+        for name, value in BULK_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS price_list_indexed (id INTEGER PRIMARY KEY)")
+        try:
+            with self.db.search_index_suspended("p.id IN (SELECT id FROM temp.price_list_indexed)"):
+                yield
+        finally:
+            cursor.execute("DROP TABLE IF EXISTS temp.price_list_indexed")
+            for name, value in saved.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+
+    @staticmethod
+    def _mark_indexed(cursor, pesticide_ids):
+        """Препараты, чьи документы поискового индекса пересоберутся в конце _bulk_write"""
+        cursor.executemany("INSERT OR IGNORE INTO temp.price_list_indexed (id) VALUES (?)",
+                           [(pesticide_id,) for pesticide_id in pesticide_ids])
+
+
+class PriceListImporter(_PriceListLoader):
+    """Импорт прайс-листа: новые препараты пишутся пачками (executemany) в одной транзакции.
+
+    Листы читаются кусками (PriceListSheetReader.chunks), каждый кусок
+    записывается сразу. Типы и вещества разрешаются через db.references,
+    дубликаты — по множеству названий в памяти.
+    """
+
+    def _load(self, cursor, sheets):
+        existing = {row[0] for row in cursor.execute("SELECT name FROM pesticides")}
+        next_id = self._next_pesticide_id(cursor)
+        report_lines = []
+        totals = {'inserted': 0, 'skipped': 0, 'duplicates': 0, 'sheets': 0}
+
+        with ExitStack() as writing:
+            bulk = False
+            for reader in sheets:
+                if reader.error or reader.empty:
+                    if reader.error:
+                        report_lines.append(reader.error)
+                    continue
+                sheet_name = reader.name
+                inserted = skipped = duplicates = 0
+                stage = f"Лист '{sheet_name}'"
+                for chunk in reader.chunks():
+                    self._progress(stage, reader.rows_read, reader.total_rows)
+                    pesticide_rows = []
+                    substance_rows = []
+                    for name, composition, manufacturer, packaging, rate, price, ptype in chunk.rows():
+                        if price is None:
+                            skipped += 1
+                            self.skipped_items.append((sheet_name, name, "Неверная цена (не число или 'по запросу')"))
+                            continue
+                        type_id = self._reference_id("types", ptype, cursor)
+                        if name in existing:
+                            duplicates += 1
+                            self.skipped_items.append((sheet_name, name, "Дубликат в файле"))
+                            continue
+                        existing.add(name)
+                        pesticide_rows.append((next_id, name, name.casefold(), "", rate, packaging, price,
+                                               manufacturer, type_id))
+                        substance_rows.extend((next_id, substance_id, concentration) for substance_id, concentration
+                                              in self._substance_links(composition, cursor).items())
+                        next_id += 1
+                        inserted += 1
+
+                    if pesticide_rows:
+                        if not bulk:
+                            writing.enter_context(self._bulk_write(cursor))
+                            bulk = True
+                        self._mark_indexed(cursor, [row[0] for row in pesticide_rows])
+                        cursor.executemany(INSERT_PESTICIDE_SQL, pesticide_rows)
+                        cursor.executemany(UPSERT_SUBSTANCE_LINK_SQL, substance_rows)
+
+                totals['inserted'] += inserted
+                totals['skipped'] += skipped
+                totals['duplicates'] += duplicates
+                totals['sheets'] += 1
+                report_lines.append(f"Лист '{sheet_name}': добавлено {inserted}, пропущено (цена) {skipped}, дубликатов {duplicates}")
+
+            self._progress("Запись в каталог", 0, 1)
+        return dict(totals, report=report_lines)
+
+
+# Поля, которые обновление прайс-листа может изменить у существующего препарата
+UPDATE_FIELDS = ('price', 'application_rate', 'packaging', 'manufacturer', 'pesticide_type_id')
+
+
+class PriceListUpdater(_PriceListLoader):
+    """Обновление каталога по прайс-листу: сравнение множествами вместо построчных запросов.
+
+    Строки всех листов собираются в одну таблицу с ключом «название»,
+    сопоставляются с каталогом одним merge и делятся на новые, изменённые и
+    без изменений; запись — пачками upsert (INSERT ... ON CONFLICT).
+    Повтор названия в файле: применяется последняя строка.
+    """
+
+    def _load(self, cursor, sheets):
+        frames = []
+        report_order = []   # (лист, None) или (None, строка отчёта об ошибке) в порядке листов
+        for reader in sheets:
+            if reader.error or reader.empty:
+                if reader.error:
+                    report_order.append((None, reader.error))
+                continue
+            report_order.append((reader.name, None))
+            stage = f"Лист '{reader.name}'"
+            for chunk in reader.chunks():
+                self._progress(stage, reader.rows_read, reader.total_rows)
+                frames.append(pd.DataFrame({
+                    'sheet': reader.name, 'name': chunk.names, 'composition': chunk.compositions,
+                    'manufacturer': chunk.manufacturers, 'packaging': chunk.packagings,
+                    'application_rate': chunk.rates, 'price': pd.Series(chunk.prices, dtype=object),
+                    'type': chunk.types,
+                }))
+        rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(
+            columns=['sheet', 'name', 'composition', 'manufacturer', 'packaging', 'application_rate', 'price', 'type'])
+
+        # 1. Строки с неразборчивой ценой и повторы названий (остаётся последняя строка)
+        bad_price = rows['price'].isna()
+        for sheet_name, name in zip(rows['sheet'][bad_price], rows['name'][bad_price]):
+            self.skipped_items.append((sheet_name, name, "Некорректная цена."))
+        skipped_by_sheet = rows['sheet'][bad_price].value_counts()
+        rows = rows[~bad_price].reset_index(drop=True)
+        rows['price'] = rows['price'].astype(float)
+        rows['pesticide_type_id'] = rows['type'].map({t: self._reference_id("types", t, cursor)
+                                                      for t in rows['type'].unique()})
+        repeated = rows['name'].duplicated(keep='last')
+        for sheet_name, name in zip(rows['sheet'][repeated], rows['name'][repeated]):
+            self.skipped_items.append((sheet_name, name, "Повтор в файле: применена последняя строка."))
+        repeated_by_sheet = rows['sheet'][repeated].value_counts()
+        rows = rows[~repeated].reset_index(drop=True)
+
+        # 2. Сопоставление с каталогом (при одинаковых названиях в БД — последний препарат)
+        # Чтение каталога целиком — кортежами, без sqlite3.Row
+        plain = self.connection.cursor()
+        plain.row_factory = None
+        existing = pd.DataFrame(
+            plain.execute(f"SELECT id, name, {', '.join(UPDATE_FIELDS)} FROM pesticides ORDER BY id").fetchall(),
+            columns=['id', 'name', *UPDATE_FIELDS],
+        ).drop_duplicates('name', keep='last')
+        rows = rows.merge(existing, on='name', how='left', suffixes=('', '_old'))
+        is_new = rows['id'].isna()
+
+        # 3. Изменённые поля: цена и тип — всегда из файла, текстовые — если в файле не пусто
+        changed = {}
+        for field in UPDATE_FIELDS:
+            new, old = rows[field], rows[f'{field}_old']
+            if field in ('price', 'pesticide_type_id'):
+                changed[field] = ~is_new & (new != old)
+            else:
+                changed[field] = ~is_new & (new != "") & (new != old)
+                rows[field] = new.where(is_new | (new != ""), old)
+        fields_changed = pd.concat(changed, axis=1).any(axis=1)
+        next_id = self._next_pesticide_id(cursor)
+        rows.loc[is_new, 'id'] = range(next_id, next_id + int(is_new.sum()))
+        rows['id'] = rows['id'].astype(int)
+
+        # 4. Состав: у новых — из файла; у существующих заменяется, только если отличается
+        current_links = {}
+        for pesticide_id, substance_id, concentration in plain.execute(
+                "SELECT pesticide_id, substance_id, concentration FROM pesticide_active_substances"):
+            current_links.setdefault(pesticide_id, {})[substance_id] = concentration
+        link_rows = []
+        unlink_rows = []
+        links_changed = []
+        for row_number, (pesticide_id, composition, new) in enumerate(
+                zip(rows['id'].tolist(), rows['composition'], is_new)):
+            self._progress("Сравнение с каталогом", row_number, len(rows))
+            if not new and not composition:
+                links_changed.append(False)
+                continue
+            links = self._substance_links(composition, cursor)
+            current = current_links.get(pesticide_id, {})
+            links_changed.append(not new and links != current)
+            link_rows.extend((pesticide_id, substance_id, concentration)
+                             for substance_id, concentration in links.items()
+                             if substance_id not in current or current[substance_id] != concentration)
+            unlink_rows.extend((pesticide_id, substance_id) for substance_id in current if substance_id not in links)
+        links_changed = pd.Series(links_changed, index=rows.index, dtype=bool)
+
+        # 5. Запись пачками
+        rows['status'] = 'unchanged'
+        rows.loc[fields_changed | links_changed, 'status'] = 'updated'
+        rows.loc[is_new, 'status'] = 'new'
+        upserts = rows[is_new | fields_changed]
+        self._progress("Запись в каталог", 0, 1)
+        if len(upserts) or link_rows or unlink_rows:
+            with self._bulk_write(cursor):
+                self._mark_indexed(cursor, rows['id'][is_new | links_changed].tolist())
+                cursor.executemany(INSERT_PESTICIDE_SQL, zip(
+                    upserts['id'].tolist(), upserts['name'].tolist(),
+                    [name.casefold() for name in upserts['name'].tolist()], [""] * len(upserts),
+                    upserts['application_rate'].tolist(), upserts['packaging'].tolist(), upserts['price'].tolist(),
+                    upserts['manufacturer'].tolist(), upserts['pesticide_type_id'].tolist()))
+                cursor.executemany("DELETE FROM pesticide_active_substances WHERE pesticide_id = ? AND substance_id = ?",
+                                   unlink_rows)
+                cursor.executemany(UPSERT_SUBSTANCE_LINK_SQL, link_rows)
+
+        # 6. Сводка
+        counts = rows.groupby(['sheet', 'status']).size()
+        stats = {'new': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0, 'repeated': 0, 'sheets': 0, 'report': []}
+        for sheet_name, error in report_order:
+            if sheet_name is None:
+                stats['report'].append(error)
+                continue
+            sheet_counts = {status: int(counts.get((sheet_name, status), 0)) for status in ('new', 'updated', 'unchanged')}
+            skipped = int(skipped_by_sheet.get(sheet_name, 0))
+            repeated_count = int(repeated_by_sheet.get(sheet_name, 0))
+            for key, value in sheet_counts.items():
+                stats[key] += value
+            stats['skipped'] += skipped
+            stats['repeated'] += repeated_count
+            stats['sheets'] += 1
+            line = (f"Лист '{sheet_name}': новых {sheet_counts['new']}, обновлено {sheet_counts['updated']},"
+                    f" без изменений {sheet_counts['unchanged']}, пропущено {skipped}")
+            if repeated_count:
+                line += f", повторов {repeated_count}"
+            stats['report'].append(line)
+        stats['changes'] = {field: int(mask.sum()) for field, mask in changed.items()}
+        stats['changes']['substances'] = int(links_changed.sum())
+        return stats
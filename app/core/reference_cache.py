@@ -0,0 +1,122 @@
+import bisect
+
+# Справочники: вид -> (таблица, колонка названия)
+REFERENCE_TABLES = {
+    "types": ("pesticide_types", "type_name"),
+    "cultures": ("cultures", "culture_name"),
+    "diseases": ("diseases", "disease_name"),
+    "substances": ("active_substances", "substance_name"),
+}
+# Справочники с колонкой <название>_cf = casefold() (см. CASEFOLD_COLUMNS в database.py)
+FOLDED_KINDS = ("cultures", "diseases", "substances")
+
+# Верхняя граница для поиска по префиксу в отсортированном списке
+_PREFIX_END = "\U0010ffff"
+
+
+class _Dictionary:
+    """Один справочник в памяти: точный, регистронезависимый и «похожий» поиск.
+
+    При совпадении нескольких записей возвращается наименьший id — так же,
+    как первая строка SELECT без ORDER BY в прежних запросах.
+    """
+
+    def __init__(self, rows):
+        self.by_name = {}        # название как в БД -> id
+        self.by_folded = {}      # casefold() -> id
+        self.by_lower = {}       # lower().strip() -> id (для проверки «начинается с»)
+        self.sorted_lower = []   # отсортированные lower().strip() — поиск по префиксу
+        self.by_head = {}        # первые 3 символа lower().strip() -> [(длина, id)]
+        for ref_id, name in rows:
+            self.add(ref_id, name)
+
+    def add(self, ref_id, name):
+        lower = name.lower().strip()
+        self.by_name.setdefault(name, ref_id)
+        self.by_folded.setdefault(name.casefold(), ref_id)
+        if self.by_lower.setdefault(lower, ref_id) == ref_id:
+            bisect.insort(self.sorted_lower, lower)
+        self.by_head.setdefault(lower[:3], []).append((len(lower), ref_id))
+
+    def similar(self, name, threshold):
+        """id записи, похожей на name (та же логика, что у прежнего DatabaseManager._is_similar)"""
+        query = name.lower().strip()
+        candidates = []
+        # 1. Существующее название — начало запроса
+        for end in range(len(query) + 1):
+            ref_id = self.by_lower.get(query[:end])
+            if ref_id is not None:
+                candidates.append(ref_id)
+        # 2. Запрос — начало существующего названия
+        start = bisect.bisect_left(self.sorted_lower, query)
+        stop = bisect.bisect_right(self.sorted_lower, query + _PREFIX_END)
+        candidates.extend(self.by_lower[lower] for lower in self.sorted_lower[start:stop])
+        # 3. Совпадают первые 3 символа и длины близки
+        candidates.extend(ref_id for length, ref_id in self.by_head.get(query[:3], ())
+                          if abs(length - len(query)) <= threshold)
+        return min(candidates) if candidates else None
+
+
+class ReferenceCache:
+    """Кэш небольших справочников (типы, культуры, болезни, вещества) поверх соединения.
+
+    Справочник загружается целиком при первом обращении; вставки через add /
+    get_or_create сразу попадают в кэш. Кэш сбрасывается при rollback соединения
+    (invalidate) и при изменении БД другим соединением (PRAGMA data_version).
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._dictionaries = {}
+        self._data_version = None
+
+    def invalidate(self):
+        self._dictionaries.clear()
+
+    def _dictionary(self, kind):
+        # data_version меняется только после коммитов других соединений
+        version = self.connection.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._dictionaries.clear()
+            self._data_version = version
+        dictionary = self._dictionaries.get(kind)
+        if dictionary is None:
+            table, column = REFERENCE_TABLES[kind]
+            rows = self.connection.execute(f"SELECT id, {column} FROM {table} ORDER BY id").fetchall()
+            dictionary = self._dictionaries[kind] = _Dictionary((row[0], row[1]) for row in rows)
+        return dictionary
+
+    def find(self, kind, name):
+        """id по точному названию или None"""
+        return self._dictionary(kind).by_name.get(name)
+
+    def find_folded(self, kind, name):
+        """id по названию без учёта регистра или None"""
+        return self._dictionary(kind).by_folded.get(name.casefold())
+
+    def find_similar(self, kind, name, threshold=2):
+        """id записи с похожим названием (опечатка, сокращение) или None"""
+        return self._dictionary(kind).similar(name, threshold)
+
+    def add(self, kind, name, cursor=None):
+        """Вставить запись в справочник (без commit) и сразу добавить её в кэш"""
+        dictionary = self._dictionary(kind)
+        table, column = REFERENCE_TABLES[kind]
+        cursor = cursor or self.connection.cursor()
+        if kind in FOLDED_KINDS:
+            cursor.execute(f"INSERT INTO {table} ({column}, {column}_cf) VALUES (?, ?)", (name, name.casefold()))
+        else:
+            cursor.execute(f"INSERT INTO {table} ({column}) VALUES (?)", (name,))
+        dictionary.add(cursor.lastrowid, name)
+        return cursor.lastrowid
+
+    def get_or_create(self, kind, name, cursor=None):
+        """id по точному названию; если записи нет — вставить (без commit)"""
+        ref_id = self.find(kind, name)
+        if ref_id is None:
+            ref_id = self.add(kind, name, cursor)
+        return ref_id
+
+    def names(self, kind):
+        """Все названия справочника по алфавиту"""
+        return sorted(self._dictionary(kind).by_name)
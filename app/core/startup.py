@@ -0,0 +1,51 @@
+import json
+import os
+import sys
+import time
+
+# Путь к JSON-отчёту о запуске (benchmarks/startup.py); без переменной отчёт не пишется
+PROFILE_ENV = "PLANT_STARTUP_PROFILE"
+# "1" — закрыть приложение сразу после первого кадра (для бенчмарка)
+EXIT_ENV = "PLANT_STARTUP_EXIT"
+
+
+class StartupProfiler:
+    """Отметки времени запуска приложения: от старта main.py до первого кадра.
+
+    Создаётся первой строкой main.py, до импорта Kivy, поэтому отметка
+    'imports' включает импорт всех модулей, нужных для первого кадра.
+    Ленивые вкладки добавляют свои отметки при первом показе.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.marks = {}   # название -> секунды от старта (первая отметка с этим названием)
+
+    def mark(self, name):
+        elapsed = time.perf_counter() - self.started
+        self.marks.setdefault(name, elapsed)
+        return elapsed
+
+    def measure(self, name, started):
+        """Длительность шага, начатого в started (perf_counter), как отдельная отметка"""
+        duration = time.perf_counter() - started
+        self.marks.setdefault(name, duration)
+        return duration
+
+    def report(self):
+        return {
+            'marks_ms': {name: round(seconds * 1000, 1) for name, seconds in self.marks.items()},
+            'modules': len(sys.modules),
+        }
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def profile_path():
+        return os.environ.get(PROFILE_ENV)
+
+    @staticmethod
+    def exit_after_first_frame():
+        return os.environ.get(EXIT_ENV) == "1"
@@ -0,0 +1,149 @@
+import threading
+import time
+import traceback
+
+# Состояния фоновой задачи
+TASK_RUNNING = "running"
+TASK_DONE = "done"
+TASK_FAILED = "failed"
+TASK_CANCELLED = "cancelled"
+
+
+class TaskCancelled(Exception):
+    """Задача отменена (бросается из progress между строками)"""
+
+
+class BackgroundTask:
+    """Одна фоновая задача импорта/экспорта"""
+
+    # Не чаще, чем раз в PROGRESS_INTERVAL секунд, прогресс передаётся в UI
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, run, post, on_progress=None, on_done=None, on_error=None, on_cancelled=None):
+        self.run = run                    # run(db, progress) -> результат
+        self.post = post
+        self.on_progress = on_progress    # on_progress(stage, done, total)
+        self.on_done = on_done            # on_done(result)
+        self.on_error = on_error          # on_error(exception)
+        self.on_cancelled = on_cancelled  # on_cancelled()
+        self.state = TASK_RUNNING
+        self._cancelled = threading.Event()
+        self._last_progress = 0.0
+        self._last_stage = None
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Отменить задачу: она прервётся на ближайшем вызове progress, транзакция откатится"""
+        self._cancelled.set()
+
+    def progress(self, stage, done=0, total=0):
+        """Вызывается пайплайном из рабочего потока (например, на каждой строке)"""
+        if self.cancelled:
+            raise TaskCancelled()
+        if self.on_progress is None:
+            return
+        # Смена этапа и последний шаг передаются всегда, остальное — с прореживанием
+        now = time.monotonic()
+        if stage != self._last_stage or (total and done >= total) or now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self._last_stage = stage
+            self.post(lambda: self.on_progress(stage, done, total))
+
+
+class TaskRunner:
+    """Выполнение импорта/экспорта каталога в фоновом потоке.
+
+    Каждая задача получает своё соединение SQLite (db.open_worker()) и
+    выполняется в отдельном потоке; одновременно — одна задача. Колбэки
+    передаются в post (в приложении — Clock.schedule_once), то есть
+    вызываются в потоке UI. Ошибка или отмена откатывают транзакцию.
+    Если результат оставил транзакцию открытой (отчёт импорта ждёт
+    подтверждения), соединение не закрывается и исполнитель остаётся
+    занятым, пока вызывающий не вызовет finish(): до этого записи в базу
+    заблокированы транзакцией, и новая задача не принимается.
+    """
+
+    def __init__(self, db, post=None):
+        self.db = db
+        self.post = post or (lambda callback: callback())
+        self._task = None
+        self._pending_db = None           # рабочее соединение с транзакцией, ждущей finish()
+        self._lock = threading.Lock()
+
+    def submit(self, run, on_progress=None, on_done=None, on_error=None, on_cancelled=None):
+        """Запустить run(db, progress) в фоне. None — уже выполняется другая задача"""
+        with self._lock:
+            if self._task is not None:
+                return None
+            task = self._task = BackgroundTask(run, self.post, on_progress, on_done, on_error, on_cancelled)
+        threading.Thread(target=self._work, args=(task,), daemon=True).start()
+        return task
+
+    def cancel(self):
+        with self._lock:
+            if self._task is not None:
+                self._task.cancel()
+
+    def is_busy(self):
+        with self._lock:
+            return self._task is not None
+
+    def finish(self, commit):
+        """Зафиксировать или откатить транзакцию, оставленную задачей, и освободить исполнитель"""
+        with self._lock:
+            worker_db, self._pending_db = self._pending_db, None
+            if worker_db is not None:
+                self._task = None
+        if worker_db is None:
+            return
+        try:
+            if commit:
+                worker_db.connection.commit()
+            else:
+                # rollback() соединения, а не SQL ROLLBACK: сбрасывает и кэш справочников
+                worker_db.connection.rollback()
+        finally:
+            worker_db.close()
+
+    def _work(self, task):
+        worker_db = None
+        try:
+            worker_db = self.db.open_worker()
+            result = task.run(worker_db, task.progress)
+            if task.cancelled:
+                raise TaskCancelled()
+        except TaskCancelled:
+            task.state = TASK_CANCELLED
+            self._discard(worker_db)
+            print("⏹ Фоновая задача отменена")
+            callback, args = task.on_cancelled, ()
+        except Exception as e:
+            task.state = TASK_FAILED
+            self._discard(worker_db)
+            print(f"❌ Ошибка фоновой задачи: {e}")
+            traceback.print_exc()
+            callback, args = task.on_error, (e,)
+        else:
+            task.state = TASK_DONE
+            if worker_db.connection.in_transaction:
+                with self._lock:
+                    self._pending_db = worker_db
+            else:
+                worker_db.close()
+            callback, args = task.on_done, (result,)
+        finally:
+            with self._lock:
+                if self._pending_db is None:
+                    self._task = None
+        if callback:
+            self.post(lambda: callback(*args))
+
+    @staticmethod
+    def _discard(worker_db):
+        if worker_db is None or worker_db.connection is None:
+            return
+        worker_db.connection.rollback()
+        worker_db.close()
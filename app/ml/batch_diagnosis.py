@@ -0,0 +1,336 @@
+"""Пакетная диагностика архива фотографий без UI.
+
+Запуск из корня репозитория:
+    python -m app.ml.batch_diagnosis photos/ --out results.csv
+    python -m app.ml.batch_diagnosis photos/ --out results.parquet --workers 8 --batch-size 16
+
+Папка обходится рекурсивно. Изображения делятся на батчи по batch_size;
+батчи раздаются пулу процессов, в каждом процессе своя PlantModel (одна
+пара ONNX-сессий на процесс): декодирование и уменьшение снимков идут
+параллельно в разных процессах, а сессия прогоняет батч одним тензором NCHW.
+Потоки ONNX Runtime делятся между процессами поровну.
+
+Результаты (top-k видов и болезней с уверенностью, площади по маскам)
+дописываются в .csv или в папку .parquet по мере готовности батчей.
+Повторный запуск с тем же --out пропускает изображения, уже обработанные
+без ошибки, поэтому прерванный прогон продолжается с места остановки
+(--restart — начать заново). Файлы с ошибкой чтения пробуются снова, их
+новая строка дописывается после прежней: актуальна последняя строка пути.
+
+Для .parquet нужен pyarrow — он не входит в зависимости проекта (pyproject.toml)
+и ставится отдельно: pip install pyarrow. Вывод в .csv работает без него.
+"""
+import argparse
+import csv
+import os
+import shutil
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.core.config import AppConfig
+from app.ml.inference import (
+    disease_ru, idx_to_disease, idx_to_species, mask_areas, species_ru, PlantModel,
+)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp')
+
+# Колонки результата — в порядке кортежей, которые возвращает _diagnose_chunk
+RESULT_COLUMNS = ['path', 'species', 'species_ru', 'species_conf', 'species_top',
+                  'disease', 'disease_ru', 'disease_conf', 'disease_top',
+                  'leaf_area', 'disease_share', 'inference_path', 'error']
+_FLOAT_COLUMNS = ('species_conf', 'disease_conf', 'leaf_area', 'disease_share')
+
+BATCH_SIZE = 8
+TOP_K = 3
+# Батчей в работе на один процесс: пока батч считается, следующий уже ждёт в очереди пула
+BATCHES_IN_FLIGHT = 2
+# Строк в одном файле папки .parquet
+PARQUET_PART_ROWS = 5000
+# Как часто печатать прогресс, секунд
+REPORT_INTERVAL = 5.0
+
+
+def find_images(root):
+    """Пути изображений в папке root (рекурсивно), относительные и в стабильном порядке"""
+    root = Path(root)
+    paths = []
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        base = Path(directory).relative_to(root)
+        paths.extend((base / name).as_posix() for name in sorted(filenames)
+                     if name.lower().endswith(IMAGE_EXTENSIONS))
+    return paths
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+def _top_k(probs, names, k):
+    """'имя:уверенность; ...' для k самых вероятных классов"""
+    ranked = sorted(range(len(probs)), key=lambda i: -probs[i])[:k]
+    return "; ".join(f"{names[i]}:{probs[i]:.4f}" for i in ranked)
+
+
+def _result_row(path, result, top_k):
+    if "error" in result:
+        return (path,) + (None,) * (len(RESULT_COLUMNS) - 2) + (result["error"],)
+    species, disease = result["species_idx"], result["disease_idx"]
+    leaf_area, disease_share = mask_areas(result)
+    return (path,
+            idx_to_species[species], species_ru.get(species, idx_to_species[species]), result["species_conf"],
+            _top_k(result["species_probs"], idx_to_species, top_k),
+            idx_to_disease[disease], disease_ru.get(disease, idx_to_disease[disease]), result["disease_conf"],
+            _top_k(result["disease_probs"], idx_to_disease, top_k),
+            leaf_area, disease_share, result["inference_path"], None)
+
+
+# ================== РАБОЧИЙ ПРОЦЕСС ==================
+# Модель загружается один раз при старте процесса пула (_init_worker)
+_MODEL = None
+_SETTINGS = None
+
+
+def _init_worker(settings):
+    global _MODEL, _SETTINGS
+    _SETTINGS = settings
+    config = AppConfig()
+    config.models_dir = Path(settings['models_dir'])
+    config.model_variant = settings['variant']
+    config.onnx_intra_op_threads = settings['threads']
+    config.onnx_inter_op_threads = 1
+    config.lazy_mask_overlay = True       # PNG с масками не нужны, только площади
+    model = PlantModel(config)            # без кэша диагнозов: архив просматривается один раз
+    if model.load_models() and model.warm_up():
+        _MODEL = model
+
+
+def _diagnose_chunk(paths):
+    """Батч относительных путей -> строки результата (без масок: в главный процесс идёт только итог)"""
+    if _MODEL is None:
+        raise RuntimeError("Не удалось загрузить ONNX модели")
+    root = _SETTINGS['root']
+    results = _MODEL.predict_batch([os.path.join(root, path) for path in paths], batch_size=len(paths))
+    return [_result_row(path, result, _SETTINGS['top_k']) for path, result in zip(paths, results)]
+
+
+# ================== ФАЙЛЫ РЕЗУЛЬТАТОВ ==================
+class CsvResults:
+    """Результаты в CSV: строки дописываются в конец и сбрасываются на диск после каждого батча"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._file = None
+        self._writer = None
+
+    def open(self):
+        """Открыть файл на дозапись -> множество путей, уже обработанных без ошибки"""
+        done = set()
+        if self.path.exists():
+            self._drop_partial_line()
+            with open(self.path, newline='', encoding='utf-8-sig') as f:
+                for row in csv.reader(f):
+                    if row and row != RESULT_COLUMNS and not row[-1]:
+                        done.add(row[0])
+        new_file = not self.path.exists() or self.path.stat().st_size == 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', newline='', encoding='utf-8-sig' if new_file else 'utf-8')
+        self._writer = csv.writer(self._file)
+        if new_file:
+            self._writer.writerow(RESULT_COLUMNS)
+        return done
+
+    def _drop_partial_line(self):
+        # Прогон, убитый посреди записи, мог оставить недописанную последнюю строку
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ParquetResults:
+    """Результаты в папке .parquet: по файлу part-NNNNN.parquet на PARQUET_PART_ROWS строк.
+
+    Parquet нельзя дописывать, поэтому каждая часть пишется целиком во
+    временный файл и переименовывается; после прерывания остаются только
+    целые части. Папку читают pandas.read_parquet и pyarrow.dataset.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._rows = []
+        self._parts = 0
+
+    def open(self):
+        import pyarrow.parquet as pq
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        for temp in self.path.glob("*.tmp"):
+            temp.unlink()
+        parts = sorted(self.path.glob("part-*.parquet"))
+        self._parts = len(parts)
+        done = set()
+        for part in parts:
+            table = pq.read_table(part, columns=['path', 'error']).to_pydict()
+            done.update(path for path, error in zip(table['path'], table['error']) if error is None)
+        return done
+
+    def write(self, rows):
+        self._rows.extend(rows)
+        if len(self._rows) >= PARQUET_PART_ROWS:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        schema = pa.schema([(name, pa.float64() if name in _FLOAT_COLUMNS else pa.string())
+                            for name in RESULT_COLUMNS])
+        columns = list(zip(*self._rows))
+        table = pa.table([pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                         schema=schema)
+        part_path = self.path / f"part-{self._parts:05d}.parquet"
+        temp_path = part_path.with_name(part_path.name + ".tmp")
+        pq.write_table(table, temp_path)
+        os.replace(temp_path, part_path)
+        self._parts += 1
+        self._rows = []
+
+    def close(self):
+        self._flush()
+
+
+def open_results(path, restart=False):
+    """CsvResults или ParquetResults по расширению; restart — удалить прежние результаты"""
+    path = Path(path)
+    suffix = path.suffix.lower()
+    if suffix not in ('.csv', '.parquet'):
+        raise ValueError(f"Неподдерживаемый формат результатов: {suffix or path.name} (нужен .csv или .parquet)")
+    if restart and path.exists():
+        shutil.rmtree(path) if path.is_dir() else path.unlink()
+    return ParquetResults(path) if suffix == '.parquet' else CsvResults(path)
+
+
+# ================== ПРОГОН ==================
+def run_batch(root, out, workers=None, batch_size=BATCH_SIZE, top_k=TOP_K,
+              models_dir=None, variant="auto", restart=False, limit=None):
+    """Диагностика всех изображений папки root с записью в out -> статистика прогона.
+
+    Батчи уходят в пул по мере освобождения процессов (не больше
+    BATCHES_IN_FLIGHT на процесс), результаты пишутся в порядке батчей.
+    При Ctrl+C или ошибке модели уже записанное сохраняется.
+    """
+    workers = workers or default_workers()
+    results = open_results(out, restart)
+    done = results.open()
+    try:
+        paths = [path for path in find_images(root) if path not in done]
+        if limit is not None:
+            paths = paths[:limit]
+        stats = {'images': 0, 'errors': 0, 'skipped': len(done), 'pending': len(paths),
+                 'workers': workers, 'seconds': 0.0, 'images_per_second': 0.0, 'interrupted': False}
+        if not paths:
+            print(f"✅ Новых изображений нет (уже обработано: {len(done)})")
+            return stats
+
+        workers = min(workers, (len(paths) + batch_size - 1) // batch_size)
+        stats['workers'] = workers
+        settings = {
+            'root': str(root),
+            'models_dir': str(models_dir or AppConfig().models_dir),
+            'variant': variant,
+            'threads': max(1, default_workers() // workers),
+            'top_k': top_k,
+        }
+        print(f"Изображений: {len(paths)} (пропущено ранее обработанных: {len(done)}), "
+              f"процессов: {workers}, потоков ONNX на процесс: {settings['threads']}")
+
+        chunks = (paths[start:start + batch_size] for start in range(0, len(paths), batch_size))
+        started = last_report = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(settings,)) as pool:
+            pending = deque()
+            try:
+                for chunk in chunks:
+                    pending.append(pool.submit(_diagnose_chunk, chunk))
+                    if len(pending) >= workers * BATCHES_IN_FLIGHT:
+                        break
+                while pending:
+                    rows = pending.popleft().result()
+                    results.write(rows)
+                    stats['images'] += len(rows)
+                    stats['errors'] += sum(1 for row in rows if row[-1] is not None)
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        pending.append(pool.submit(_diagnose_chunk, chunk))
+                    now = time.perf_counter()
+                    if now - last_report >= REPORT_INTERVAL:
+                        last_report = now
+                        print(f"⏳ {stats['images']}/{len(paths)}, "
+                              f"{stats['images'] / (now - started):.1f} изобр/с")
+            except KeyboardInterrupt:
+                stats['interrupted'] = True
+                print("⏹ Прервано: записанные результаты сохранены, повторный запуск продолжит")
+            except Exception as e:
+                stats['interrupted'] = True
+                print(f"❌ Ошибка пакетной диагностики: {e}")
+            finally:
+                for future in pending:
+                    future.cancel()
+
+        stats['seconds'] = time.perf_counter() - started
+        if stats['seconds'] > 0:
+            stats['images_per_second'] = stats['images'] / stats['seconds']
+        return stats
+    finally:
+        results.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетная диагностика папки с фотографиями")
+    parser.add_argument("images", help="папка с фото (обходится рекурсивно)")
+    parser.add_argument("--out", required=True, help="файл результатов: .csv или .parquet (папка)")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="число процессов")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--top-k", type=int, default=TOP_K, help="сколько вариантов вида и болезни сохранять")
+    parser.add_argument("--models-dir", default=None, help="папка с моделями (по умолчанию из AppConfig)")
+    parser.add_argument("--variant", default="auto", help="fp32 / fp16 / int8 / auto")
+    parser.add_argument("--limit", type=int, default=None, help="обработать не больше N новых изображений")
+    parser.add_argument("--restart", action="store_true", help="удалить прежние результаты и начать заново")
+    args = parser.parse_args()
+
+    if not Path(args.images).is_dir():
+        parser.error(f"папка {args.images} не найдена")
+    if args.batch_size < 1 or args.workers < 1:
+        parser.error("--batch-size и --workers должны быть >= 1")
+    try:
+        stats = run_batch(args.images, args.out, workers=args.workers, batch_size=args.batch_size,
+                          top_k=args.top_k, models_dir=args.models_dir, variant=args.variant,
+                          restart=args.restart, limit=args.limit)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+    except ImportError as e:
+        print(f"❌ Для записи .parquet нужен pyarrow: {e}")
+        return 1
+    if stats['images']:
+        print(f"✅ Обработано: {stats['images']} (ошибок чтения: {stats['errors']}) за {stats['seconds']:.1f} с — "
+              f"{stats['images_per_second']:.1f} изобр/с, процессов: {stats['workers']}")
+    return 1 if stats['interrupted'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
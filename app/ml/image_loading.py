@@ -0,0 +1,92 @@
+"""Общая загрузка изображений для нейросетей.
+
+JPEG декодируется сразу в уменьшенном масштабе (draft-режим libjpeg:
+1/2, 1/4, 1/8 — самый мелкий, который ещё не меньше целевого размера),
+поэтому 12–48 Мп снимки с телефона не разворачиваются в память целиком.
+Поворот по EXIF применяется после декодирования, до изменения размера.
+"""
+import io
+import threading
+
+import numpy as np
+from PIL import Image, ImageOps
+
+# Форматы, которые PIL умеет декодировать с понижением масштаба
+DRAFT_FORMATS = ("JPEG", "MPO")
+
+# EXIF Orientation: значения, при которых изображение повёрнуто на 90°
+EXIF_ORIENTATION_TAG = 0x0112
+_TRANSPOSED_ORIENTATIONS = (5, 6, 7, 8)
+
+
+def open_image(source):
+    """Открыть изображение без декодирования: путь, bytes или файловый объект"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    return Image.open(source)
+
+
+def load_rgb(source, size, resample=Image.BILINEAR):
+    """Декодировать изображение в RGB ровно размера size (ширина, высота) с учётом EXIF"""
+    image = open_image(source)
+    try:
+        orientation = image.getexif().get(EXIF_ORIENTATION_TAG, 1)
+    except Exception:
+        orientation = 1
+
+    if image.format in DRAFT_FORMATS:
+        # draft задаётся в координатах хранения файла — до поворота по EXIF
+        draft_size = size[::-1] if orientation in _TRANSPOSED_ORIENTATIONS else size
+        image.draft("RGB", tuple(draft_size))
+
+    if orientation != 1:
+        image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if image.size != tuple(size):
+        image = image.resize(tuple(size), resample)
+    return image
+
+
+def load_rgb_array(source, size, resample=Image.BILINEAR):
+    """То же, что load_rgb, но uint8 массив (высота, ширина, 3)"""
+    return np.asarray(load_rgb(source, size, resample), dtype=np.uint8)
+
+
+def normalization_luts(mean, std):
+    """Таблицы uint8 -> float32 для каждого канала: (v / 255 - mean) / std"""
+    values = np.arange(256, dtype=np.float32) / 255.0
+    return np.stack([(values - m) / s for m, s in zip(mean, std)]).astype(np.float32)
+
+
+def normalize_chw(rgb, luts, out=None):
+    """uint8 HWC -> нормализованный float32 CHW по таблицам, без промежуточных float-копий"""
+    height, width, channels = rgb.shape
+    if out is None:
+        out = np.empty((channels, height, width), dtype=np.float32)
+    for c in range(channels):
+        np.take(luts[c], rgb[:, :, c], out=out[c])
+    return out
+
+
+class BufferPool:
+    """Переиспользуемые рабочие массивы, свои для каждого потока.
+
+    Буфер хранится по форме без первой оси и растёт до наибольшего
+    запрошенного N; возвращается срез [:N] (непрерывный). Массив действителен
+    до следующего запроса той же формы в этом потоке — подходит для входных
+    тензоров, которые нужны только на время одного вызова сессии.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def get(self, shape, dtype=np.float32):
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None:
+            buffers = self._local.buffers = {}
+        key = (tuple(shape[1:]), np.dtype(dtype).str)
+        buf = buffers.get(key)
+        if buf is None or buf.shape[0] < shape[0]:
+            buf = buffers[key] = np.empty(shape, dtype=dtype)
+        return buf[:shape[0]]
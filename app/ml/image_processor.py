@@ -1,7 +1,8 @@
-import io
 import numpy as np
 from PIL import Image
 
+from app.ml.image_loading import load_rgb_array
+
 class ImageProcessor:
     """Класс для обработки изображений перед подачей в нейросеть"""
     
@@ -9,20 +10,9 @@ class ImageProcessor:
     def preprocess_image(image_path, target_size=(224, 224)):
         """Предобработка изображения для нейросети"""
         try:
-            # Загрузка изображения
-            image = Image.open(image_path)
-            image = image.convert('RGB')
-            
-            # Изменение размера
-            image = image.resize(target_size)
-            
-            # Конвертация в numpy array и нормализация
-            image_array = np.array(image) / 255.0
-            
-            # Добавление batch dimension
-            image_array = np.expand_dims(image_array, axis=0)
-            
-            return image_array
+            # Загрузка (JPEG — сразу в уменьшенном масштабе) с учётом EXIF
+            image = load_rgb_array(image_path, target_size, Image.BICUBIC)
+            return ImageProcessor._to_batch(image)
             
         except Exception as e:
             print(f"Ошибка обработки изображения: {e}")
@@ -33,12 +23,15 @@ class ImageProcessor:
     def load_and_preprocess_from_bytes(image_bytes, target_size=(224, 224)):
         """Загрузка и предобработка изображения из bytes (без OpenCV)"""
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            image = image.convert('RGB')
-            image = image.resize(target_size)
-            image_array = np.array(image) / 255.0
-            image_array = np.expand_dims(image_array, axis=0)
-            return image_array
+            image = load_rgb_array(image_bytes, target_size, Image.BICUBIC)
+            return ImageProcessor._to_batch(image)
         except Exception as e:
             print(f"Ошибка обработки изображения из bytes: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def _to_batch(image):
+        """uint8 HWC -> (1, H, W, 3) в диапазоне [0, 1], нормализация сразу в выходной массив"""
+        image_array = np.empty((1,) + image.shape, dtype=np.float64)
+        np.multiply(image, 1.0 / 255.0, out=image_array[0])
+        return image_array
@@ -1,9 +1,14 @@
-import onnxruntime as ort
+import hashlib
+import json
+import threading
+import zlib
+
 import numpy as np
 from PIL import Image
 from pathlib import Path
-from kivy.clock import Clock
-from kivy.app import App
+
+from app.core.config import AppConfig
+from app.ml.image_loading import BufferPool, load_rgb_array, normalization_luts, normalize_chw
 
 # ================== СЛОВАРИ КЛАССОВ ==================
 idx_to_species = {
@@ -88,167 +93,641 @@ disease_ru = {
 }
 
 THRESHOLD = 0.9
+INPUT_SIZE = (512, 512)
+
+# Статистика ImageNet
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+_NORMALIZATION_LUTS = normalization_luts(MEAN, STD)
+
+
+class ImagePipeline:
+    """Изображение, декодированное один раз, со всеми промежуточными представлениями.
+
+    resized — uint8 массив (512,512,3) для наложения масок
+    tensor  — нормализованный float32 тензор CHW (3,512,512) для обеих сетей
+
+    Полноразмерный декод не хранится: JPEG сразу читается в уменьшенном
+    масштабе (см. app/ml/image_loading.py).
+    """
+
+    def __init__(self, source_path, size=INPUT_SIZE, data=None):
+        self.source_path = source_path
+        # data — уже прочитанные байты файла (чтобы не читать его повторно)
+        self.resized = load_rgb_array(data if data is not None else source_path, size)
+        self.tensor = normalize_chw(self.resized, _NORMALIZATION_LUTS)
+
+    def tensor_at(self, size):
+        """Нормализованный тензор CHW другого разрешения (для каскада), из 512×512 копии"""
+        if tuple(size) == self.resized.shape[1::-1]:
+            return self.tensor
+        small = np.asarray(Image.fromarray(self.resized).resize(tuple(size), Image.BILINEAR))
+        return normalize_chw(small, _NORMALIZATION_LUTS)
+
+
+# Базовые имена файлов моделей и доступные варианты точности
+SEGMENTATION_MODEL = "segmentation_model"
+CLASSIFIER_MODEL = "model_classifier"
+MODEL_VARIANTS = ("fp32", "fp16", "int8")
+# Результаты бенчмарка вариантов (пишет benchmarks/model_variants.py)
+VARIANTS_REPORT_FILE = "model_variants.json"
+
+
+def model_path(models_dir, base_name, variant="fp32"):
+    """Путь к файлу модели: fp32 — исходный .onnx, иначе <имя>.<вариант>.onnx"""
+    if variant == "fp32":
+        return Path(models_dir) / f"{base_name}.onnx"
+    return Path(models_dir) / f"{base_name}.{variant}.onnx"
+
+
+def select_variant(models_dir, min_agreement):
+    """Самый быстрый вариант, у которого совпадение top-1 с fp32 по обеим головам не ниже порога"""
+    report_path = Path(models_dir) / VARIANTS_REPORT_FILE
+    if not report_path.exists():
+        return "fp32"
+    try:
+        report = json.loads(report_path.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Не удалось прочитать {VARIANTS_REPORT_FILE}: {e}")
+        return "fp32"
+    candidates = [
+        (stats["latency_ms"], variant)
+        for variant, stats in report.get("variants", {}).items()
+        if variant in MODEL_VARIANTS
+        and min(stats.get("species_agreement", 0), stats.get("disease_agreement", 0)) >= min_agreement
+    ]
+    return min(candidates)[1] if candidates else "fp32"
+
+
+# Этапы пайплайна в порядке выполнения и доля готовности после каждого.
+# progress_callback(stage, fraction) вызывается по фактическому завершению этапа
+PIPELINE_STAGES = {
+    "decode": 0.15,
+    "segmentation": 0.5,
+    "classification": 0.85,
+    "done": 1.0,
+}
+
+
+def _report(progress_callback, stage):
+    if progress_callback:
+        progress_callback(stage, PIPELINE_STAGES[stage])
+
+
+# Имена значений ort.GraphOptimizationLevel / ort.ExecutionMode (сами перечисления — после импорта onnxruntime)
+GRAPH_OPTIMIZATION_LEVELS = {
+    "disable": "ORT_DISABLE_ALL",
+    "basic": "ORT_ENABLE_BASIC",
+    "extended": "ORT_ENABLE_EXTENDED",
+    "all": "ORT_ENABLE_ALL",
+}
+EXECUTION_MODES = {
+    "sequential": "ORT_SEQUENTIAL",
+    "parallel": "ORT_PARALLEL",
+}
+
+
+def _onnxruntime():
+    """onnxruntime импортируется при создании первой сессии, а не вместе с модулем:
+    CLI, сервер и бенчмарки получают PlantModel без его загрузки"""
+    import onnxruntime
+    return onnxruntime
+
+
+# Состояния готовности моделей
+MODEL_NOT_LOADED = "not_loaded"
+MODEL_LOADING = "loading"
+MODEL_WARM = "warm"
+MODEL_FAILED = "failed"
+
+
+def _hash_file(path, chunk_size=1 << 20):
+    """SHA-256 содержимого файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _mask_to_u8(mask):
+    """Маска [0,1] -> uint8 [0,255]; uint8-маски возвращаются как есть"""
+    if mask.dtype == np.uint8:
+        return mask
+    return np.rint(np.clip(mask, 0, 1) * 255).astype(np.uint8)
+
+
+def _upscale_mask(mask):
+    """Маска уменьшенного разрешения -> uint8 маска INPUT_SIZE"""
+    return np.asarray(Image.fromarray(_mask_to_u8(mask)).resize(INPUT_SIZE, Image.BILINEAR))
+
+
+def _pack_mask(mask):
+    """Маска -> сжатые uint8 байты (для кэша и ленивой отрисовки)"""
+    return zlib.compress(_mask_to_u8(mask).tobytes(), 1)
+
+
+def _unpack_mask(blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=np.uint8).reshape(INPUT_SIZE)
+
+
+# Порог uint8-маски, с которого пиксель считается листом / поражением
+MASK_THRESHOLD = 128
+
+
+def mask_areas(result):
+    """Площади по маскам результата: (доля снимка под листом, доля поражённой площади листа)"""
+    leaf = _unpack_mask(result["leaf_mask"]) >= MASK_THRESHOLD
+    disease = _unpack_mask(result["disease_mask"]) >= MASK_THRESHOLD
+    leaf_pixels = np.count_nonzero(leaf)
+    disease_share = np.count_nonzero(disease & leaf) / leaf_pixels if leaf_pixels else 0.0
+    return leaf_pixels / leaf.size, float(disease_share)
+
+
+# Прозрачность масок (0.0 = полностью прозрачно, 1.0 = непрозрачно)
+LEAF_ALPHA = 0.5      # зелёная маска листа
+DISEASE_ALPHA = 0.5   # красная маска болезни
+
+# Таблицы для целочисленного смешивания по значению маски m (0..255):
+# KEEP — доля исходного пикселя (1 - alpha*m) в фиксированной точке *256,
+# ADD — вклад цвета маски m * alpha*m (для листа уже умножен на 256)
+_levels = np.arange(256, dtype=np.float64) / 255.0
+_KEEP_LEAF_LUT = np.rint((1 - LEAF_ALPHA * _levels) * 256).astype(np.uint32)
+_KEEP_DISEASE_LUT = np.rint((1 - DISEASE_ALPHA * _levels) * 256).astype(np.uint32)
+_ADD_LEAF_LUT = np.rint(255 * LEAF_ALPHA * _levels * _levels * 256).astype(np.uint32)
+_ADD_DISEASE_LUT = np.rint(255 * DISEASE_ALPHA * _levels * _levels).astype(np.uint32)
+
 
 class PlantModel:
-    def __init__(self):
+    def __init__(self, config=None, cache=None):
+        self.config = config or AppConfig()
+        # cache — DatabaseManager (или совместимый объект) для кэша диагнозов
+        self.cache = cache if self.config.diagnosis_cache_enabled else None
         self.seg_sess = None
         self.cls_sess = None
         self.loaded = False
+        self.model_hash = None
+        self.variant = None
+        self.state = MODEL_NOT_LOADED
+        self._state_lock = threading.Lock()
+        self._ready = threading.Event()
+        # Рабочие входные тензоры батча переиспользуются между вызовами
+        self._buffers = BufferPool()
+
+    def start_loading(self):
+        """Запустить загрузку и прогрев моделей в фоновом потоке (без блокировки UI)"""
+        with self._state_lock:
+            if self.state in (MODEL_LOADING, MODEL_WARM):
+                return
+            self.state = MODEL_LOADING
+            self._ready.clear()
+        threading.Thread(target=self._load_and_warm, daemon=True).start()
+
+    def _load_and_warm(self):
+        ok = self.load_models() and self.warm_up()
+        with self._state_lock:
+            self.state = MODEL_WARM if ok else MODEL_FAILED
+        self._ready.set()
+
+    def wait_until_ready(self, timeout=None):
+        """Дождаться окончания загрузки. True — модели загружены и прогреты"""
+        if self.state in (MODEL_NOT_LOADED, MODEL_FAILED):
+            self.start_loading()
+        self._ready.wait(timeout)
+        return self.state == MODEL_WARM
+
+    def warm_up(self):
+        """Пустой прогон обеих сетей: инициализация ядер и аллокаторов до первого снимка"""
+        try:
+            seg_input = np.zeros((1, 3) + INPUT_SIZE, dtype=np.float32)
+            cls_input = np.zeros((1, 5) + INPUT_SIZE, dtype=np.float32)
+            self.seg_sess.run(None, {"input_rgb": seg_input})
+            self.cls_sess.run(None, {"input": cls_input})
+            print(" Модели ONNX прогреты")
+            return True
+        except Exception as e:
+            print(f" Ошибка прогрева моделей: {e}")
+            return False
 
     def load_models(self):
         """Загрузить ONNX модели из папки assets"""
         try:
-            base_dir = Path(__file__).parent.parent.parent
-            models_dir = base_dir / "app" / "assets" / "models"
-            seg_path = models_dir / "segmentation_model.onnx"
-            cls_path = models_dir / "model_classifier.onnx"
+            models_dir = Path(self.config.models_dir)
+            self.variant = self._resolve_variant(models_dir)
+            seg_path = model_path(models_dir, SEGMENTATION_MODEL, self.variant)
+            cls_path = model_path(models_dir, CLASSIFIER_MODEL, self.variant)
             
-            self.seg_sess = ort.InferenceSession(str(seg_path))
-            self.cls_sess = ort.InferenceSession(str(cls_path))
+            self.seg_sess = self._create_session(seg_path)
+            self.cls_sess = self._create_session(cls_path)
+            self.model_hash = self._compute_model_hash(seg_path, cls_path)
+            if self.cache:
+                # Результаты прежних версий моделей больше не действительны
+                self.cache.purge_diagnosis_cache(keep_model_hash=self.model_hash)
             self.loaded = True
-            print(" Модели ONNX загружены")
+            print(f" Модели ONNX загружены: {self.variant} ({', '.join(self.seg_sess.get_providers())})")
             return True
         except Exception as e:
             print(f" Ошибка загрузки моделей: {e}")
             self.loaded = False
             return False
 
-    def _resize_and_normalize(self, img_pil, size=(512, 512), mean=None, std=None):
-        """Изменяет размер и нормализует изображение (HWC -> CHW)"""
-        img = img_pil.resize(size, Image.BILINEAR)
-        img_np = np.array(img, dtype=np.float32) / 255.0
-        if mean is not None and std is not None:
-            img_np = (img_np - mean) / std
-        # CHW
-        img_np = img_np.transpose((2, 0, 1))
-        return img_np
-
-    def preprocess_segmentation(self, image_path):
+    def _resolve_variant(self, models_dir):
+        """Вариант моделей из конфигурации; при отсутствии файлов — исходный fp32"""
+        variant = self.config.model_variant
+        if variant == "auto":
+            variant = select_variant(models_dir, self.config.model_variant_min_agreement)
+        if variant not in MODEL_VARIANTS:
+            print(f"⚠️ Неизвестный вариант моделей '{variant}', используется fp32")
+            return "fp32"
+        if variant != "fp32" and not all(
+            model_path(models_dir, name, variant).exists() for name in (SEGMENTATION_MODEL, CLASSIFIER_MODEL)
+        ):
+            print(f"⚠️ Файлы моделей {variant} не найдены, используется fp32")
+            return "fp32"
+        return variant
+
+    def _compute_model_hash(self, *model_paths):
+        """Общий хэш файлов моделей — ключ инвалидации кэша диагнозов"""
+        digest = hashlib.sha256()
+        for path in model_paths:
+            digest.update(_hash_file(path).encode())
+        return digest.hexdigest()
+
+    def _get_providers(self):
+        """Провайдеры из конфигурации, доступные в текущей сборке onnxruntime"""
+        available = set(_onnxruntime().get_available_providers())
+        providers = [p for p in self.config.onnx_providers if p in available]
+        return providers or ["CPUExecutionProvider"]
+
+    def _session_options(self):
+        """SessionOptions по настройкам AppConfig"""
+        ort = _onnxruntime()
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = self.config.onnx_intra_op_threads
+        opts.inter_op_num_threads = self.config.onnx_inter_op_threads
+        opts.graph_optimization_level = getattr(ort.GraphOptimizationLevel,
+                                                GRAPH_OPTIMIZATION_LEVELS[self.config.onnx_graph_optimization])
+        opts.execution_mode = getattr(ort.ExecutionMode, EXECUTION_MODES[self.config.onnx_execution_mode])
+        opts.enable_cpu_mem_arena = self.config.onnx_enable_mem_arena
+        return opts
+
+    def _optimized_model_path(self, model_path, providers):
+        """Путь к кэшу оптимизированного графа для уровня оптимизации и провайдера"""
+        provider = providers[0].replace("ExecutionProvider", "").lower()
+        level = self.config.onnx_graph_optimization
+        return model_path.with_name(f"{model_path.stem}.{level}.{provider}.opt.onnx")
+
+    def _create_session(self, model_path):
+        """Создать InferenceSession с учётом кэша оптимизированного графа"""
+        ort = _onnxruntime()
+        model_path = Path(model_path)
+        providers = self._get_providers()
+        opts = self._session_options()
+
+        if not self.config.onnx_cache_optimized or self.config.onnx_graph_optimization == "disable":
+            return ort.InferenceSession(str(model_path), sess_options=opts, providers=providers)
+
+        cached_path = self._optimized_model_path(model_path, providers)
+        if cached_path.exists() and cached_path.stat().st_mtime >= model_path.stat().st_mtime:
+            # Граф уже оптимизирован — повторная оптимизация не нужна
+            opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+            try:
+                return ort.InferenceSession(str(cached_path), sess_options=opts, providers=providers)
+            except Exception as e:
+                print(f"⚠️ Кэш оптимизированной модели повреждён, пересоздаём: {e}")
+                cached_path.unlink(missing_ok=True)
+                opts = self._session_options()
+
+        opts.optimized_model_filepath = str(cached_path)
+        return ort.InferenceSession(str(model_path), sess_options=opts, providers=providers)
+
+    def prepare_image(self, image_path, data=None):
+        """Декодировать изображение один раз и подготовить общий пайплайн"""
+        return ImagePipeline(image_path, data=data)
+
+    def preprocess_segmentation(self, pipeline):
         """Подготовка изображения для сегментационной модели (без torchvision)"""
-        # Статистика ImageNet
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-        std  = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        img_pil = Image.open(image_path).convert('RGB')
-        img_tensor = self._resize_and_normalize(img_pil, size=(512, 512), mean=mean, std=std)
-        img_tensor = np.expand_dims(img_tensor, axis=0)  # (1,3,512,512)
-        return img_pil, img_tensor
-
-    def preprocess_classification(self, img_pil, leaf_mask, disease_mask):
+        return pipeline.tensor[np.newaxis]  # (1,3,512,512), без копии
+
+    def preprocess_classification(self, pipeline, leaf_mask, disease_mask):
         """Подготовка 5-канального входа для классификатора"""
-        mean = np.array([0.485, 0.456, 0.406], dtype=np.float32)
-        std  = np.array([0.229, 0.224, 0.225], dtype=np.float32)
-        # RGB каналы (нормализованные, CHW)
-        rgb_np = self._resize_and_normalize(img_pil, size=(512, 512), mean=mean, std=std)  # (3,512,512)
-        # Маски: (512,512) -> (1,512,512)
-        leaf_mask_np = leaf_mask[np.newaxis, :, :]
-        disease_mask_np = disease_mask[np.newaxis, :, :]
-        # Конкатенация по каналам -> (5,512,512)
-        input_cls = np.concatenate([rgb_np, leaf_mask_np, disease_mask_np], axis=0)
-        input_cls = np.expand_dims(input_cls, axis=0).astype(np.float32)  # (1,5,512,512)
-        return input_cls
-
-    def create_masked_image(self, image_path, leaf_mask, disease_mask):
-        """Наложить полупрозрачные маски на изображение и сохранить в PNG"""
-        img = Image.open(image_path).convert('RGB')
-        img = img.resize((512, 512), Image.BILINEAR)
-        img_np = np.array(img).astype(np.float32) / 255.0  # (512,512,3)
-
-        # Результат начинаем с копии оригинала
-        result = img_np.copy()
-
-        # Настройки прозрачности (0.0 = полностью прозрачно, 1.0 = непрозрачно)
-        leaf_alpha = 0.5      # зелёная маска листа
-        disease_alpha = 0.5   # красная маска болезни
-
-        # Маска листа (зелёный цвет)
-        leaf_overlay = np.zeros_like(result)
-        leaf_overlay[:, :, 1] = leaf_mask   # зелёный канал
-        alpha = leaf_alpha * leaf_mask[:, :, np.newaxis]
-        result = result * (1 - alpha) + leaf_overlay * alpha
-
-        # Маска болезни (красный цвет)
-        disease_overlay = np.zeros_like(result)
-        disease_overlay[:, :, 0] = disease_mask   # красный канал
-        alpha = disease_alpha * disease_mask[:, :, np.newaxis]
-        result = result * (1 - alpha) + disease_overlay * alpha
-
-        result = np.clip(result, 0, 1)
-        result = (result * 255).astype(np.uint8)
-
-        # Сохраняем как PNG (поддерживает прозрачность, но здесь она не нужна)
-        temp_path = Path(image_path).parent / f"masked_{Path(image_path).stem}.png"
-        Image.fromarray(result).save(temp_path, format='PNG')
-        return str(temp_path)
+        # RGB каналы берём из пайплайна — это тот же тензор, что и у сегментации
+        input_cls = np.empty((1, 5) + pipeline.tensor.shape[1:], dtype=np.float32)
+        input_cls[0, :3] = pipeline.tensor
+        input_cls[0, 3] = leaf_mask
+        input_cls[0, 4] = disease_mask
+        return input_cls  # (1,5,512,512)
 
-    def predict(self, image_path, progress_callback=None):
-        """Выполнить полный пайплайн: сегментация -> классификация"""
-        if not self.loaded:
-            raise RuntimeError("Модели не загружены. ")
+    def render_overlay(self, resized, leaf_mask, disease_mask):
+        """Наложить полупрозрачные маски на uint8-изображение (512,512,3).
 
-        if progress_callback:
-            progress_callback(0.1)
-        img_pil, seg_input = self.preprocess_segmentation(image_path)
-        leaf_prob, disease_prob = self.seg_sess.run(None, {"input_rgb": seg_input})
-        leaf_mask = leaf_prob[0, 0, :, :]      # (512,512)
-        disease_mask = disease_prob[0, 0, :, :]
+        Смешивание целочисленное по заранее посчитанным таблицам: без
+        полноразмерных float-копий изображения и промежуточных оверлеев.
+        """
+        leaf_u8 = _mask_to_u8(leaf_mask)
+        disease_u8 = _mask_to_u8(disease_mask)
+        keep_leaf = _KEEP_LEAF_LUT[leaf_u8]          # (1 - a_leaf) * 256
+        keep_disease = _KEEP_DISEASE_LUT[disease_u8]  # (1 - a_disease) * 256
+        buf = np.empty(leaf_u8.shape, dtype=np.uint32)
+        out = np.empty_like(resized)
 
-        masked_path = self.create_masked_image(image_path, leaf_mask, disease_mask)
+        # Зелёный: (G * (1 - a1) + leaf * a1) * (1 - a2)
+        np.multiply(resized[:, :, 1], keep_leaf, out=buf)
+        buf += _ADD_LEAF_LUT[leaf_u8]
+        buf *= keep_disease
+        buf >>= 16
+        out[:, :, 1] = buf
 
-        if progress_callback:
-            progress_callback(0.5)
+        # Красный и синий: C * (1 - a1) * (1 - a2) (+ disease * a2 для красного)
+        keep_leaf *= keep_disease
+        np.multiply(resized[:, :, 0], keep_leaf, out=buf)
+        buf >>= 16
+        buf += _ADD_DISEASE_LUT[disease_u8]
+        np.minimum(buf, 255, out=buf)
+        out[:, :, 0] = buf
+        np.multiply(resized[:, :, 2], keep_leaf, out=buf)
+        buf >>= 16
+        out[:, :, 2] = buf
+        return out
 
-        cls_input = self.preprocess_classification(img_pil, leaf_mask, disease_mask)
-        species_logits, disease_logits = self.cls_sess.run(None, {"input": cls_input})
+    def create_masked_image(self, pipeline, leaf_mask, disease_mask, image_hash=None):
+        """Наложить маски на изображение и сохранить PNG в кэш-папку приложения"""
+        result = self.render_overlay(pipeline.resized, leaf_mask, disease_mask)
+        masks_dir = Path(self.config.masks_cache_dir)
+        masks_dir.mkdir(parents=True, exist_ok=True)
+        name = image_hash or Path(pipeline.source_path).stem
+        temp_path = masks_dir / f"masked_{name}.png"
+        Image.fromarray(result).save(temp_path, format='PNG', compress_level=1)
+        return str(temp_path)
 
-        if progress_callback:
-            progress_callback(0.9)
+    def render_mask(self, result):
+        """Построить изображение с масками для результата (лениво, по запросу пользователя)"""
+        masked_path = result.get("masked_image_path")
+        if masked_path and Path(masked_path).exists():
+            return masked_path
+        pipeline = self.prepare_image(result["path"])
+        masked_path = self.create_masked_image(pipeline, _unpack_mask(result["leaf_mask"]),
+                                               _unpack_mask(result["disease_mask"]), result.get("image_hash"))
+        result["masked_image_path"] = masked_path
+        if self.cache and result.get("image_hash"):
+            self.cache.update_cached_mask_path(result["image_hash"], self.model_hash, masked_path)
+        return masked_path
 
-        # Softmax
-        def softmax(x):
-            ex = np.exp(x - np.max(x, axis=1, keepdims=True))
-            return ex / np.sum(ex, axis=1, keepdims=True)
+    def _softmax(self, x):
+        """Softmax по оси классов (N, C)"""
+        ex = np.exp(x - np.max(x, axis=1, keepdims=True))
+        return ex / np.sum(ex, axis=1, keepdims=True)
 
-        species_probs = softmax(species_logits)
-        disease_probs = softmax(disease_logits)
+    def _build_result(self, species_probs, disease_probs, masked_path):
+        """Сформировать словарь результата по вероятностям одного изображения"""
+        species_top1 = int(np.argmax(species_probs))
+        species_conf = species_probs[species_top1]
+        disease_top1 = int(np.argmax(disease_probs))
+        disease_conf = disease_probs[disease_top1]
 
-        species_top1 = np.argmax(species_probs[0])
-        species_conf = species_probs[0, species_top1]
-        disease_top1 = np.argmax(disease_probs[0])
-        disease_conf = disease_probs[0, disease_top1]
-        
         # ==== русскоязычные названия из локального кода 
         species_text_ru = species_ru.get(species_top1, idx_to_species[species_top1])
         # Формирование текста по пороговой логике
         if species_conf >= THRESHOLD:
-            # species_text = f"{idx_to_species[species_top1]} ({species_conf:.3f})"
             species_text = f"{species_text_ru} ({species_conf:.3f})"
         else:
-            top3_idx = np.argsort(species_probs[0])[::-1][:3]
-            # top3 = [f"{idx_to_species[i]}: {species_probs[0,i]:.3f}" for i in top3_idx]
-            top3 = [f"{species_ru.get(i, idx_to_species[i])}: {species_probs[0,i]:.3f}" for i in top3_idx]
+            top3_idx = np.argsort(species_probs)[::-1][:3]
+            top3 = [f"{species_ru.get(i, idx_to_species[i])}: {species_probs[i]:.3f}" for i in top3_idx]
             species_text = "не уверен, возможные варианты:\n" + "\n".join(top3)
 
         disease_text_ru = disease_ru.get(disease_top1, idx_to_disease[disease_top1])
         if disease_conf >= THRESHOLD:
-            # disease_text = f"{idx_to_disease[disease_top1]} ({disease_conf:.3f})"
             disease_text = f"{disease_text_ru} ({disease_conf:.3f})"
         else:
-            top3_idx = np.argsort(disease_probs[0])[::-1][:3]
-            # top3 = [f"{idx_to_disease[i]}: {disease_probs[0,i]:.3f}" for i in top3_idx]
-            top3 = [f"{disease_ru.get(i, idx_to_disease[i])}: {disease_probs[0,i]:.3f}" for i in top3_idx]
+            top3_idx = np.argsort(disease_probs)[::-1][:3]
+            top3 = [f"{disease_ru.get(i, idx_to_disease[i])}: {disease_probs[i]:.3f}" for i in top3_idx]
             disease_text = "не уверен, возможные варианты:\n" + "\n".join(top3)
 
-        if progress_callback:
-            progress_callback(1.0)
-
         return {
             "species": species_text,
             "disease": disease_text,
             "species_conf": float(species_conf),
             "disease_conf": float(disease_conf),
-            "species_idx": int(species_top1),
-            "disease_idx": int(disease_top1),
+            "species_idx": species_top1,
+            "disease_idx": disease_top1,
             "masked_image_path": masked_path,
-            "species_probs": species_probs[0].tolist(),
-            "disease_probs": disease_probs[0].tolist()
-        }
\ No newline at end of file
+            "species_probs": species_probs.tolist(),
+            "disease_probs": disease_probs.tolist()
+        }
+
+    def _read_image(self, image_path):
+        """Прочитать байты изображения и посчитать ключ кэша"""
+        data = Path(image_path).read_bytes()
+        return data, hashlib.sha256(data).hexdigest()
+
+    def _lookup_cache(self, image_path, data, image_hash):
+        """Результат из кэша диагнозов или None"""
+        if not self.cache:
+            return None
+        cached = self.cache.get_cached_diagnosis(image_hash, self.model_hash)
+        if not cached or cached['leaf_mask'] is None:
+            return None
+        masked_path = cached['masked_image_path']
+        if masked_path and not Path(masked_path).exists():
+            masked_path = None
+        result = self._build_result(np.asarray(cached['species_probs']),
+                                    np.asarray(cached['disease_probs']), masked_path)
+        self._attach_masks(result, image_path, image_hash, cached['leaf_mask'], cached['disease_mask'])
+        result["cached"] = True
+        result["inference_path"] = "cache"
+        if masked_path is None and not self.config.lazy_mask_overlay:
+            # Файл с масками удалён — восстанавливаем его из сохранённых масок без инференса
+            pipeline = self.prepare_image(image_path, data=data)
+            result["masked_image_path"] = self.create_masked_image(
+                pipeline, _unpack_mask(cached['leaf_mask']), _unpack_mask(cached['disease_mask']), image_hash)
+            self.cache.update_cached_mask_path(image_hash, self.model_hash, result["masked_image_path"])
+        return result
+
+    def _attach_masks(self, result, image_path, image_hash, leaf_blob, disease_blob):
+        """Добавить к результату сжатые маски и ключи для ленивой отрисовки"""
+        result["path"] = str(image_path)
+        result["image_hash"] = image_hash
+        result["leaf_mask"] = leaf_blob
+        result["disease_mask"] = disease_blob
+
+    def _finish_result(self, result, pipeline, image_hash, leaf_mask, disease_mask):
+        """Маски в результат, при необходимости — сразу PNG с наложением, затем запись в кэш"""
+        self._attach_masks(result, pipeline.source_path, image_hash,
+                           _pack_mask(leaf_mask), _pack_mask(disease_mask))
+        if not self.config.lazy_mask_overlay:
+            result["masked_image_path"] = self.create_masked_image(pipeline, leaf_mask, disease_mask, image_hash)
+        if not self.cache:
+            return
+        self.cache.save_cached_diagnosis(
+            image_hash, self.model_hash,
+            result["species_probs"], result["disease_probs"],
+            leaf_mask=result["leaf_mask"], disease_mask=result["disease_mask"],
+            masked_image_path=result["masked_image_path"],
+            max_entries=self.config.diagnosis_cache_max_entries,
+            max_age_days=self.config.diagnosis_cache_max_age_days,
+        )
+
+    def predict(self, image_path, progress_callback=None):
+        """Выполнить полный пайплайн: сегментация -> классификация.
+
+        progress_callback(stage, fraction) вызывается после каждого этапа из
+        PIPELINE_STAGES; исключение из него прерывает пайплайн (отмена задачи).
+        """
+        if not self.loaded:
+            raise RuntimeError("Модели не загружены. ")
+
+        data, image_hash = self._read_image(image_path)
+        result = self._lookup_cache(image_path, data, image_hash)
+        if result is not None:
+            _report(progress_callback, "done")
+            return result
+
+        pipeline = self.prepare_image(image_path, data=data)
+        _report(progress_callback, "decode")
+        leaf_mask, disease_mask, species_probs, disease_probs, inference_path = \
+            self._diagnose([pipeline], progress_callback)[0]
+
+        result = self._build_result(species_probs, disease_probs, None)
+        result["inference_path"] = inference_path
+        self._finish_result(result, pipeline, image_hash, leaf_mask, disease_mask)
+        _report(progress_callback, "done")
+
+        return result
+
+    def _infer(self, seg_batch, progress_callback=None):
+        """Сегментация + классификация батча NCHW одного разрешения"""
+        leaf_prob, disease_prob = self._run_batched(self.seg_sess, "input_rgb", seg_batch)
+        leaf_masks = leaf_prob[:, 0, :, :]          # (N,H,W)
+        disease_masks = disease_prob[:, 0, :, :]
+        _report(progress_callback, "segmentation")
+
+        # Вход классификатора: нормализованный RGB сегментации + две маски -> (N,5,H,W)
+        cls_batch = self._buffers.get((seg_batch.shape[0], 5) + seg_batch.shape[2:])
+        cls_batch[:, :3] = seg_batch
+        cls_batch[:, 3] = leaf_masks
+        cls_batch[:, 4] = disease_masks
+        species_logits, disease_logits = self._run_batched(self.cls_sess, "input", cls_batch)
+        _report(progress_callback, "classification")
+        return leaf_masks, disease_masks, self._softmax(species_logits), self._softmax(disease_logits)
+
+    def supports_cascade(self):
+        """Каскад возможен, только если обе сети принимают вход произвольного разрешения:
+        модель с фиксированным H/W не примет и cascade_size, и INPUT_SIZE при эскалации"""
+        for sess in (self.seg_sess, self.cls_sess):
+            height, width = sess.get_inputs()[0].shape[2:4]
+            if isinstance(height, int) or isinstance(width, int):
+                return False
+        return True
+
+    def _diagnose(self, pipelines, progress_callback=None):
+        """Инференс для списка пайплайнов.
+
+        Возвращает для каждого кортеж (маска листа, маска болезни, вероятности
+        видов, вероятности болезней, путь): "full" — проход 512×512,
+        "low_res" — уверенный ответ каскада на уменьшенном разрешении.
+        """
+        if not self.config.cascade_enabled or not self.supports_cascade():
+            full = self._stack([pipeline.tensor for pipeline in pipelines])  # (N,3,512,512)
+            outputs = self._infer(full, progress_callback)
+            return [tuple(out[i] for out in outputs) + ("full",) for i in range(len(pipelines))]
+
+        low = self._stack([pipeline.tensor_at(self.config.cascade_size) for pipeline in pipelines])
+        low_leaf, low_disease, low_species, low_diseases = self._infer(low)
+        confident = (low_species.max(axis=1) >= THRESHOLD) & (low_diseases.max(axis=1) >= THRESHOLD)
+
+        results = [None] * len(pipelines)
+        for i in np.flatnonzero(confident):
+            results[i] = (_upscale_mask(low_leaf[i]), _upscale_mask(low_disease[i]),
+                          low_species[i], low_diseases[i], "low_res")
+
+        uncertain = np.flatnonzero(~confident)
+        if not uncertain.size:
+            # Все ответы получены на уменьшенном разрешении
+            _report(progress_callback, "segmentation")
+            _report(progress_callback, "classification")
+        else:
+            # Неуверенные изображения эскалируются на полное разрешение
+            full = self._stack([pipelines[i].tensor for i in uncertain])
+            outputs = self._infer(full, progress_callback)
+            for row, i in enumerate(uncertain):
+                results[i] = tuple(out[row] for out in outputs) + ("full",)
+        return results
+
+    def _stack(self, tensors):
+        """Собрать батч NCHW в переиспользуемый буфер"""
+        batch = self._buffers.get((len(tensors),) + tensors[0].shape)
+        return np.stack(tensors, axis=0, out=batch)
+
+    def _supports_batch(self, sess):
+        """Проверить, допускает ли вход сессии батч больше 1 (динамическая ось N)"""
+        batch_dim = sess.get_inputs()[0].shape[0]
+        return not isinstance(batch_dim, int) or batch_dim != 1
+
+    def _run_batched(self, sess, input_name, batch):
+        """Прогнать батч NCHW через сессию; при фиксированном N=1 — по одному"""
+        if len(batch) == 1 or self._supports_batch(sess):
+            return sess.run(None, {input_name: batch})
+        outputs = [sess.run(None, {input_name: batch[i:i + 1]}) for i in range(len(batch))]
+        return [np.concatenate(parts, axis=0) for parts in zip(*outputs)]
+
+    def predict_batch(self, image_paths, batch_size=8, progress_callback=None):
+        """Пакетная диагностика: список путей -> список результатов в том же порядке.
+
+        Изображения группируются по batch_size и прогоняются через обе сети
+        одним тензором NCHW. Для нечитаемых файлов вместо результата
+        возвращается словарь {"error": ...}. progress_callback("batch", fraction)
+        вызывается после каждого батча.
+        """
+        if not self.loaded:
+            raise RuntimeError("Модели не загружены. ")
+        if batch_size < 1:
+            raise ValueError("batch_size должен быть >= 1")
+
+        image_paths = list(image_paths)
+        results = []
+        for start in range(0, len(image_paths), batch_size):
+            chunk = image_paths[start:start + batch_size]
+            results.extend(self._predict_chunk([(path, None) for path in chunk]))
+            if progress_callback:
+                progress_callback("batch", len(results) / len(image_paths))
+        return results
+
+    def predict_images(self, images):
+        """Диагностика уже прочитанных изображений одним батчем: [(имя, байты)] -> результаты.
+
+        Для сервера инференса: байты приходят по сети, на диск не пишутся.
+        Имя попадает в result["path"]; ошибки декодирования — {"error": ...}.
+        """
+        if not self.loaded:
+            raise RuntimeError("Модели не загружены. ")
+        return self._predict_chunk(list(images))
+
+    def _predict_chunk(self, sources):
+        """Один батч [(путь или имя, байты или None)] -> результаты; при None байты читаются из файла"""
+        results = [None] * len(sources)
+
+        # Предобработка: каждый файл декодируется один раз
+        items = []
+        for idx, (path, data) in enumerate(sources):
+            try:
+                if data is None:
+                    data, image_hash = self._read_image(path)
+                else:
+                    image_hash = hashlib.sha256(data).hexdigest()
+                cached = self._lookup_cache(path, data, image_hash)
+                if cached is not None:
+                    results[idx] = cached
+                    continue
+                pipeline = self.prepare_image(path, data=data)
+                items.append((idx, pipeline, image_hash))
+            except Exception as e:
+                results[idx] = {"path": str(path), "error": str(e)}
+
+        outputs = self._diagnose([pipeline for _, pipeline, _ in items]) if items else []
+        for (idx, pipeline, image_hash), output in zip(items, outputs):
+            leaf_mask, disease_mask, species_probs, disease_probs, inference_path = output
+            result = self._build_result(species_probs, disease_probs, None)
+            result["inference_path"] = inference_path
+            self._finish_result(result, pipeline, image_hash, leaf_mask, disease_mask)
+            results[idx] = result
+        return results
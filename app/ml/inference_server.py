@@ -0,0 +1,309 @@
+"""Сервер инференса для планшетов в локальной сети.
+
+Запуск из корня репозитория:
+    python -m app.ml.inference_server --host 0.0.0.0 --port 8765
+    python -m app.ml.inference_server --max-batch 16 --max-wait-ms 10
+
+HTTP API (JSON в ответах):
+    POST /diagnose  тело — байты изображения (заголовок X-Image-Name — имя
+                    файла для результата) -> результат PlantModel; маски —
+                    в base64 (leaf_mask, disease_mask), чтобы клиент рисовал
+                    наложение сам
+    GET  /health    {"status": "ok", "variant": ...}
+    GET  /metrics   глубина очереди, гистограмма размеров батчей, p50/p99
+                    задержки
+
+Запросы от всех клиентов попадают в одну очередь. DynamicBatcher берёт
+первый запрос и добирает к нему следующие, пока не наберётся max_batch
+изображений или не пройдёт max_wait_ms с момента прихода первого; батч
+прогоняется через seg_sess/cls_sess одним тензором NCHW, результаты
+раздаются ожидающим запросам.
+"""
+import argparse
+import base64
+import json
+import queue
+import sys
+import threading
+import time
+import urllib.parse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from app.core.config import AppConfig
+from app.ml.inference import PlantModel
+
+DEFAULT_PORT = 8765
+MAX_BATCH = 8
+MAX_WAIT_MS = 5.0
+# Запросов в очереди сверх этого — сразу 503: клиент посчитает локально
+MAX_QUEUE = 64
+# Байт в теле запроса не больше (снимок телефона — единицы МБ)
+MAX_IMAGE_BYTES = 32 * 2 ** 20
+# Сколько последних запросов учитывать в p50/p99
+LATENCY_WINDOW = 1024
+
+
+class QueueFull(Exception):
+    """Очередь сервера заполнена — запрос не принят"""
+
+
+class ServerMetrics:
+    """Счётчики сервера; обновляются из потока батчера и потоков HTTP"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batch_sizes = {}                       # размер батча -> сколько раз
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record_batch(self, size):
+        with self._lock:
+            self.batches += 1
+            self.batch_sizes[size] = self.batch_sizes.get(size, 0) + 1
+
+    def record_request(self, seconds, failed=False):
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+            self._latencies.append(seconds)
+
+    def record_rejected(self):
+        with self._lock:
+            self.rejected += 1
+
+    def snapshot(self, queue_depth):
+        with self._lock:
+            latencies = np.asarray(self._latencies) * 1000
+            images = sum(size * count for size, count in self.batch_sizes.items())
+            return {
+                'queue_depth': queue_depth,
+                'requests': self.requests,
+                'errors': self.errors,
+                'rejected': self.rejected,
+                'batches': self.batches,
+                'mean_batch_size': images / self.batches if self.batches else 0.0,
+                'batch_size_histogram': {str(size): count for size, count in sorted(self.batch_sizes.items())},
+                'latency_ms': {
+                    'p50': float(np.percentile(latencies, 50)) if latencies.size else None,
+                    'p99': float(np.percentile(latencies, 99)) if latencies.size else None,
+                    'window': int(latencies.size),
+                },
+            }
+
+
+class _PendingRequest:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.enqueued = time.perf_counter()
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class DynamicBatcher:
+    """Собирает одиночные запросы в батчи и прогоняет их через общую модель в одном потоке"""
+
+    def __init__(self, model, max_batch=MAX_BATCH, max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE, metrics=None):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.metrics = metrics or ServerMetrics()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker = threading.Thread(target=self._work, daemon=True)
+        self._closed = False
+
+    def start(self):
+        self._worker.start()
+
+    def close(self):
+        self._closed = True
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._worker.join()
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def submit(self, name, data, timeout=None):
+        """Диагностика одного изображения (блокирует до готовности батча) -> результат"""
+        if self._closed:
+            raise QueueFull("Сервер останавливается")
+        request = _PendingRequest(name, data)
+        try:
+            self._queue.put_nowait(request)
+        except queue.Full:
+            self.metrics.record_rejected()
+            raise QueueFull("Очередь сервера заполнена")
+        if not request.done.wait(timeout):
+            raise TimeoutError("Превышено время ожидания результата")
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def _collect(self, first):
+        """Первый запрос + те, что пришли за max_wait от его появления, не больше max_batch"""
+        batch = [first]
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                request = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is None:
+                self._closed = True
+                break
+            batch.append(request)
+        return batch
+
+    def _work(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            self.metrics.record_batch(len(batch))
+            try:
+                results = self.model.predict_images([(request.name, request.data) for request in batch])
+            except Exception as e:
+                print(f"❌ Ошибка инференса батча: {e}")
+                results = None
+                for request in batch:
+                    request.error = e
+            finished = time.perf_counter()
+            for index, request in enumerate(batch):
+                if results is not None:
+                    request.result = results[index]
+                failed = request.error is not None or "error" in request.result
+                self.metrics.record_request(finished - request.enqueued, failed)
+                request.done.set()
+            if self._closed:
+                return
+
+
+def encode_result(result):
+    """Результат PlantModel -> JSON-совместимый словарь (маски в base64)"""
+    encoded = dict(result)
+    for key in ('leaf_mask', 'disease_mask'):
+        if encoded.get(key) is not None:
+            encoded[key] = base64.b64encode(encoded[key]).decode('ascii')
+    return encoded
+
+
+class InferenceRequestHandler(BaseHTTPRequestHandler):
+    server_version = "PlantInference/1.0"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send_json(200, {'status': 'ok', 'variant': self.server.batcher.model.variant})
+        elif self.path == "/metrics":
+            batcher = self.server.batcher
+            self._send_json(200, batcher.metrics.snapshot(batcher.queue_depth))
+        else:
+            self._send_json(404, {'error': f"Неизвестный путь {self.path}"})
+
+    def do_POST(self):
+        if self.path != "/diagnose":
+            self._send_json(404, {'error': f"Неизвестный путь {self.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            self._send_json(400, {'error': "Пустое тело запроса"})
+            return
+        if length > MAX_IMAGE_BYTES:
+            self._send_json(413, {'error': "Изображение слишком большое"})
+            return
+        data = self.rfile.read(length)
+        name = urllib.parse.unquote(self.headers.get('X-Image-Name') or "image")
+        try:
+            result = self.server.batcher.submit(name, data, timeout=self.server.request_timeout)
+        except QueueFull as e:
+            self._send_json(503, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        if "error" in result:
+            # Нечитаемое изображение — ошибка клиента, повтор на устройстве не поможет
+            self._send_json(400, result)
+            return
+        self._send_json(200, encode_result(result))
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Журнал на каждый запрос не нужен: сводка — в /metrics
+        pass
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """HTTP-сервер над DynamicBatcher; каждый запрос — в своём потоке, инференс — в потоке батчера"""
+
+    daemon_threads = True
+
+    def __init__(self, address, batcher, request_timeout=60):
+        super().__init__(address, InferenceRequestHandler)
+        self.batcher = batcher
+        self.request_timeout = request_timeout
+
+
+def create_server(host="127.0.0.1", port=DEFAULT_PORT, model=None, max_batch=MAX_BATCH,
+                  max_wait_ms=MAX_WAIT_MS, max_queue=MAX_QUEUE):
+    """Сервер с запущенным батчером (модель должна быть загружена); port=0 — свободный порт"""
+    if model is None:
+        config = AppConfig()
+        config.lazy_mask_overlay = True     # наложение масок рисует клиент
+        model = PlantModel(config)
+        if not model.load_models() or not model.warm_up():
+            raise RuntimeError("Не удалось загрузить ONNX модели")
+    batcher = DynamicBatcher(model, max_batch=max_batch, max_wait_ms=max_wait_ms, max_queue=max_queue)
+    batcher.start()
+    return InferenceServer((host, port), batcher)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сервер инференса диагностики растений")
+    parser.add_argument("--host", default="127.0.0.1", help="0.0.0.0 — принимать запросы из локальной сети")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="изображений в батче не больше")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="сколько ждать добора батча после первого запроса")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE)
+    args = parser.parse_args()
+
+    try:
+        server = create_server(args.host, args.port, max_batch=args.max_batch,
+                               max_wait_ms=args.max_wait_ms, max_queue=args.max_queue)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        return 1
+    print(f"✅ Сервер инференса: http://{args.host}:{server.server_address[1]} "
+          f"(батч до {args.max_batch}, ожидание {args.max_wait_ms:g} мс)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("⏹ Сервер остановлен")
+    finally:
+        server.server_close()
+        server.batcher.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import queue
+import threading
+
+# Состояния задачи инференса
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+
+class InferenceCancelled(Exception):
+    """Задача отменена (бросается из progress_callback между этапами пайплайна)"""
+
+
+class InferenceJob:
+    """Одна задача инференса: одиночное изображение или пакет"""
+
+    def __init__(self, key, run, on_progress=None, on_done=None, on_error=None):
+        self.key = key
+        self.run = run                  # run(progress_callback) -> результат
+        self.on_progress = on_progress  # on_progress(stage, fraction)
+        self.on_done = on_done          # on_done(result)
+        self.on_error = on_error        # on_error(exception)
+        self.state = JOB_QUEUED
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Отменить задачу: в очереди — не будет запущена, в работе — прервётся на ближайшем этапе"""
+        self._cancelled.set()
+
+    def _progress(self, stage, fraction):
+        if self.cancelled:
+            raise InferenceCancelled()
+        if self.on_progress:
+            self.on_progress(stage, fraction)
+
+
+class InferenceJobManager:
+    """Очередь задач инференса над общим PlantModel.
+
+    Один рабочий поток — модель никогда не используется параллельно;
+    очередь ограничена max_queue; повторная постановка того же изображения,
+    пока прежняя задача в очереди или в работе, возвращает существующую
+    задачу (single-flight). Колбэки вызываются из рабочего потока.
+    """
+
+    def __init__(self, model, max_queue=4):
+        self.model = model
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._active = {}               # key -> InferenceJob (в очереди или в работе)
+        self._lock = threading.Lock()
+        self._worker = None
+        self._closed = False
+
+    def submit(self, image_path, on_progress=None, on_done=None, on_error=None):
+        """Поставить диагностику изображения в очередь. None — очередь заполнена"""
+        run = lambda progress: self.model.predict(image_path, progress_callback=progress)
+        return self._submit(("image", str(image_path)), run, on_progress, on_done, on_error)
+
+    def submit_batch(self, image_paths, batch_size=8, on_progress=None, on_done=None, on_error=None):
+        """Поставить пакетную диагностику в очередь. None — очередь заполнена"""
+        image_paths = [str(path) for path in image_paths]
+        run = lambda progress: self.model.predict_batch(image_paths, batch_size=batch_size,
+                                                        progress_callback=progress)
+        return self._submit(("batch",) + tuple(image_paths), run, on_progress, on_done, on_error)
+
+    def _submit(self, key, run, on_progress, on_done, on_error):
+        with self._lock:
+            if self._closed:
+                return None
+            job = self._active.get(key)
+            if job is not None and not job.cancelled:
+                return job
+            job = InferenceJob(key, run, on_progress, on_done, on_error)
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                return None
+            self._active[key] = job
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._work, daemon=True)
+                self._worker.start()
+        return job
+
+    def cancel_all(self):
+        """Отменить все задачи в очереди и в работе"""
+        with self._lock:
+            for job in self._active.values():
+                job.cancel()
+
+    def close(self):
+        """Отменить все задачи и остановить рабочий поток (после текущей задачи)"""
+        with self._lock:
+            self._closed = True
+            for job in self._active.values():
+                job.cancel()
+        try:
+            # Будит поток, ждущий на пустой очереди; при полной очереди он выйдет сам после задачи
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def is_busy(self):
+        with self._lock:
+            return any(not job.cancelled for job in self._active.values())
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._execute(job)
+            finally:
+                with self._lock:
+                    if self._active.get(job.key) is job:
+                        del self._active[job.key]
+                self._queue.task_done()
+            if self._closed:
+                return
+
+    def _execute(self, job):
+        if job.cancelled:
+            job.state = JOB_CANCELLED
+            return
+        job.state = JOB_RUNNING
+        try:
+            if not self.model.wait_until_ready():
+                raise RuntimeError("Не удалось загрузить ONNX модели")
+            if job.cancelled:
+                raise InferenceCancelled()
+            result = job.run(job._progress)
+            if job.cancelled:
+                raise InferenceCancelled()
+        except InferenceCancelled:
+            job.state = JOB_CANCELLED
+            print("⏹ Задача инференса отменена")
+            return
+        except Exception as e:
+            job.state = JOB_FAILED
+            print(f"Ошибка инференса: {e}")
+            if job.on_error:
+                job.on_error(e)
+            return
+        job.state = JOB_DONE
+        if job.on_done:
+            job.on_done(result)
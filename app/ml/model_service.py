@@ -0,0 +1,76 @@
+import threading
+
+from app.ml.jobs import InferenceJobManager
+
+INFERENCE_QUEUE_SIZE = 4
+
+
+class ModelService:
+    """Одна на процесс модель диагностики и очередь инференса над ней.
+
+    Экраны берут модель через acquire() и отдают через release(). PlantModel
+    и InferenceJobManager создаются при первом acquire, сами ONNX-сессии —
+    только при preload() или первом анализе (wait_until_ready в очереди).
+    Если в конфигурации задан inference_server_url, экраны получают
+    RemoteModel: анализ на сервере, локальная PlantModel — при его недоступности.
+    Когда последний экран отпустил модель, очередь останавливается, а модель
+    освобождается; следующий acquire создаст её заново.
+    """
+
+    def __init__(self, config=None, cache=None, max_queue=INFERENCE_QUEUE_SIZE):
+        self.config = config
+        self.cache = cache        # DatabaseManager — постоянный кэш результатов диагностики
+        self.max_queue = max_queue
+        self.model = None
+        self.jobs = None
+        self._users = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Взять общую модель (счётчик владельцев +1) -> PlantModel"""
+        with self._lock:
+            if self.model is None:
+                # onnxruntime импортируется вместе с inference — только когда модель нужна экрану
+                from app.ml.inference import PlantModel
+                self.model = PlantModel(self.config, cache=self.cache)
+                if self.model.config.inference_server_url:
+                    # Анализ на сервере в локальной сети, локальная модель — запасной вариант
+                    from app.ml.remote_inference import InferenceClient, RemoteModel
+                    client = InferenceClient(self.model.config.inference_server_url,
+                                             timeout=self.model.config.inference_server_timeout)
+                    self.model = RemoteModel(client, self.model)
+                # Все анализы идут через одну очередь: без параллельных прогонов общей модели
+                self.jobs = InferenceJobManager(self.model, max_queue=self.max_queue)
+            self._users += 1
+            return self.model
+
+    def release(self):
+        """Отпустить модель; последний владелец освобождает её и останавливает очередь"""
+        with self._lock:
+            if self._users == 0:
+                return
+            self._users -= 1
+            if self._users:
+                return
+            jobs, self.jobs, self.model = self.jobs, None, None
+        jobs.close()
+        print("✅ Модели диагностики освобождены")
+
+    def preload(self):
+        """Начать загрузку и прогрев моделей в фоне (повторный вызов ничего не делает)"""
+        with self._lock:
+            model = self.model
+        if model is not None:
+            model.start_loading()
+
+    @property
+    def users(self):
+        return self._users
+
+    def close(self):
+        """Остановить очередь при выходе из приложения, независимо от владельцев"""
+        with self._lock:
+            jobs, self.jobs, self.model = self.jobs, None, None
+            self._users = 0
+        if jobs is not None:
+            jobs.close()
@@ -0,0 +1,154 @@
+"""Подготовка квантованных вариантов моделей (INT8 / FP16).
+
+Запуск из корня репозитория:
+    python -m app.ml.quantization --int8 dynamic
+    python -m app.ml.quantization --int8 static --calibration-dir photos/ --fp16
+
+Файлы сохраняются рядом с исходными: segmentation_model.int8.onnx,
+model_classifier.fp16.onnx и т.д. Какой вариант загружать, решает
+AppConfig.model_variant (см. PlantModel._resolve_variant).
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    QuantFormat,
+    QuantType,
+    quantize_dynamic,
+    quantize_static,
+)
+
+from app.core.config import AppConfig
+from app.ml.inference import (
+    CLASSIFIER_MODEL,
+    SEGMENTATION_MODEL,
+    ImagePipeline,
+    PlantModel,
+    model_path,
+)
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+
+class FeedsCalibrationReader(CalibrationDataReader):
+    """Отдаёт заранее подготовленные входы модели для калибровки"""
+
+    def __init__(self, feeds):
+        self._feeds = feeds
+        self._iter = iter(feeds)
+
+    def get_next(self):
+        return next(self._iter, None)
+
+    def rewind(self):
+        self._iter = iter(self._feeds)
+
+
+def _list_images(folder, limit):
+    paths = sorted(p for p in Path(folder).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    return paths[:limit]
+
+
+def build_calibration_feeds(models_dir, calibration_dir, limit=100):
+    """Входы для калибровки обеих сетей. Вход классификатора строится по маскам fp32-сегментации"""
+    config = AppConfig()
+    config.models_dir = Path(models_dir)
+    config.model_variant = "fp32"
+    model = PlantModel(config)
+    if not model.load_models():
+        raise RuntimeError("Не удалось загрузить fp32-модели для калибровки")
+
+    seg_feeds, cls_feeds = [], []
+    for path in _list_images(calibration_dir, limit):
+        pipeline = ImagePipeline(path)
+        seg_input = model.preprocess_segmentation(pipeline)
+        leaf_prob, disease_prob = model.seg_sess.run(None, {"input_rgb": seg_input})
+        seg_feeds.append({"input_rgb": seg_input})
+        cls_feeds.append({"input": model.preprocess_classification(pipeline, leaf_prob[0, 0], disease_prob[0, 0])})
+    if not seg_feeds:
+        raise RuntimeError(f"В папке {calibration_dir} нет изображений для калибровки")
+    return seg_feeds, cls_feeds
+
+
+def _preprocess_for_quantization(src, workdir):
+    """Shape inference и оптимизация графа перед квантованием (если доступно)"""
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+    except ImportError:
+        return src
+    dst = Path(workdir) / f"{src.stem}.pre.onnx"
+    try:
+        quant_pre_process(str(src), str(dst))
+        return dst
+    except Exception as e:
+        print(f"⚠️ Предобработка {src.name} пропущена: {e}")
+        return src
+
+
+def quantize_int8(models_dir, mode="dynamic", calibration_dir=None, limit=100):
+    """INT8-варианты обеих моделей: dynamic (без данных) или static (с калибровкой по фото)"""
+    models_dir = Path(models_dir)
+    feeds = None
+    if mode == "static":
+        if not calibration_dir:
+            raise ValueError("Для статического квантования нужна папка с фото (--calibration-dir)")
+        feeds = build_calibration_feeds(models_dir, calibration_dir, limit)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        for i, name in enumerate((SEGMENTATION_MODEL, CLASSIFIER_MODEL)):
+            src = _preprocess_for_quantization(model_path(models_dir, name), workdir)
+            dst = model_path(models_dir, name, "int8")
+            if mode == "static":
+                quantize_static(
+                    str(src), str(dst),
+                    FeedsCalibrationReader(feeds[i]),
+                    quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8,
+                    weight_type=QuantType.QInt8,
+                    per_channel=True,
+                )
+            else:
+                quantize_dynamic(str(src), str(dst), weight_type=QuantType.QUInt8)
+            print(f"✅ {dst.name} ({mode})")
+
+
+def convert_fp16(models_dir):
+    """FP16-варианты обеих моделей (входы и выходы остаются float32)"""
+    try:
+        import onnx
+        from onnxconverter_common import float16
+    except ImportError as e:
+        print(f"⚠️ Для FP16 нужен пакет onnxconverter-common: {e}")
+        return False
+
+    models_dir = Path(models_dir)
+    for name in (SEGMENTATION_MODEL, CLASSIFIER_MODEL):
+        model = onnx.load(str(model_path(models_dir, name)))
+        model_fp16 = float16.convert_float_to_float16(model, keep_io_types=True)
+        dst = model_path(models_dir, name, "fp16")
+        onnx.save(model_fp16, str(dst))
+        print(f"✅ {dst.name}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Квантование моделей диагностики")
+    parser.add_argument("--models-dir", default=str(AppConfig().models_dir))
+    parser.add_argument("--int8", choices=["dynamic", "static"], help="построить INT8-вариант")
+    parser.add_argument("--fp16", action="store_true", help="построить FP16-вариант")
+    parser.add_argument("--calibration-dir", help="папка с фото для статической калибровки")
+    parser.add_argument("--limit", type=int, default=100, help="максимум фото для калибровки")
+    args = parser.parse_args()
+
+    if not args.int8 and not args.fp16:
+        parser.error("укажите --int8 и/или --fp16")
+    if args.int8:
+        quantize_int8(args.models_dir, args.int8, args.calibration_dir, args.limit)
+    if args.fp16:
+        convert_fp16(args.models_dir)
+
+
+if __name__ == "__main__":
+    main()
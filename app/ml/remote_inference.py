@@ -0,0 +1,177 @@
+import base64
+import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.ml.inference import PIPELINE_STAGES
+
+# После сбоя связи сервер не опрашивается столько секунд — анализы идут на устройстве
+RETRY_INTERVAL = 30.0
+# Таймаут проверки /health при открытии экрана диагностики
+HEALTH_TIMEOUT = 2.0
+
+
+class ServerUnavailable(Exception):
+    """Сервер инференса недоступен или перегружен — можно посчитать на устройстве"""
+
+
+class InferenceClient:
+    """HTTP-клиент сервера инференса (app/ml/inference_server.py)"""
+
+    def __init__(self, url, timeout=15):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+
+    def diagnose(self, data, name="image"):
+        """Байты изображения -> результат в формате PlantModel (маски — снова bytes)"""
+        request = urllib.request.Request(
+            f"{self.url}/diagnose", data=data, method="POST",
+            headers={'Content-Type': 'application/octet-stream',
+                     'X-Image-Name': urllib.parse.quote(name)},
+        )
+        result = self._call(request, self.timeout)
+        for key in ('leaf_mask', 'disease_mask'):
+            if result.get(key) is not None:
+                result[key] = base64.b64decode(result[key])
+        return result
+
+    def health(self, timeout=HEALTH_TIMEOUT):
+        return self._call(urllib.request.Request(f"{self.url}/health"), timeout)
+
+    def metrics(self):
+        return self._call(urllib.request.Request(f"{self.url}/metrics"), self.timeout)
+
+    def _call(self, request, timeout):
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode('utf-8')).get('error', str(e))
+            except ValueError:
+                message = str(e)
+            if e.code == 400:
+                # Сервер не смог прочитать изображение — на устройстве будет то же самое
+                raise ValueError(message)
+            raise ServerUnavailable(f"{e.code}: {message}")
+        except (OSError, ValueError) as e:
+            # URLError, обрыв соединения, таймаут, битый ответ
+            raise ServerUnavailable(str(e))
+
+
+class RemoteModel:
+    """Модель для экрана диагностики, которая считает на сервере инференса.
+
+    Повторяет то, что CameraScreen и InferenceJobManager используют у
+    PlantModel (loaded, start_loading, wait_until_ready, predict,
+    predict_batch, render_mask). Если сервер недоступен, анализ идёт на
+    локальной PlantModel; после сбоя сервер RETRY_INTERVAL секунд не
+    опрашивается. Наложение масок рисуется локально по маскам из ответа.
+    """
+
+    def __init__(self, client, local):
+        self.client = client
+        self.local = local
+        self._retry_at = 0.0
+
+    @property
+    def config(self):
+        return self.local.config
+
+    @property
+    def loaded(self):
+        return self.server_available or self.local.loaded
+
+    @property
+    def server_available(self):
+        return time.monotonic() >= self._retry_at
+
+    def _server_failed(self, error):
+        if self.server_available:
+            print(f"⚠️ Сервер инференса недоступен ({error}), диагностика на устройстве")
+        self._retry_at = time.monotonic() + RETRY_INTERVAL
+
+    def start_loading(self):
+        """Проверить сервер в фоне; без него — начать загрузку локальных моделей"""
+        threading.Thread(target=self._check_server, daemon=True).start()
+
+    def _check_server(self):
+        try:
+            self.client.health()
+        except ServerUnavailable as e:
+            self._server_failed(e)
+            self.local.start_loading()
+
+    def wait_until_ready(self, timeout=None):
+        if self.server_available:
+            return True
+        return self.local.wait_until_ready(timeout)
+
+    def _local_model(self):
+        if not self.local.wait_until_ready():
+            raise RuntimeError("Не удалось загрузить ONNX модели")
+        return self.local
+
+    def _remote_predict(self, image_path):
+        data = Path(image_path).read_bytes()
+        result = self.client.diagnose(data, Path(image_path).name)
+        result["path"] = str(image_path)
+        result["masked_image_path"] = None
+        return result
+
+    def predict(self, image_path, progress_callback=None):
+        if self.server_available:
+            try:
+                result = self._remote_predict(image_path)
+            except ServerUnavailable as e:
+                self._server_failed(e)
+            else:
+                if progress_callback:
+                    progress_callback("done", PIPELINE_STAGES["done"])
+                return result
+        return self._local_model().predict(image_path, progress_callback=progress_callback)
+
+    def predict_batch(self, image_paths, batch_size=8, progress_callback=None):
+        """Изображения уходят на сервер окнами по batch_size параллельных запросов —
+        сервер сам соберёт их в батч; не отправленные из-за сбоя считаются локально.
+        Исключение из progress_callback (отмена) снимает ещё не начатые запросы"""
+        image_paths = list(image_paths)
+        results = [None] * len(image_paths)
+        pool = ThreadPoolExecutor(max_workers=batch_size)
+        try:
+            for start in range(0, len(image_paths), batch_size):
+                if not self.server_available:
+                    break
+                window = range(start, min(start + batch_size, len(image_paths)))
+                futures = [pool.submit(self._remote_predict, image_paths[index]) for index in window]
+                for index, future in zip(window, futures):
+                    try:
+                        results[index] = future.result()
+                    except ServerUnavailable as e:
+                        self._server_failed(e)
+                    except Exception as e:
+                        results[index] = {"path": str(image_paths[index]), "error": str(e)}
+                    if progress_callback and results[index] is not None:
+                        progress_callback("batch", (index + 1) / len(image_paths))
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+        missing = [index for index, result in enumerate(results) if result is None]
+        if missing:
+            local_results = self._local_model().predict_batch(
+                [image_paths[index] for index in missing], batch_size=batch_size)
+            for index, result in zip(missing, local_results):
+                results[index] = result
+            if progress_callback:
+                progress_callback("batch", 1.0)
+        return results
+
+    def render_mask(self, result):
+        return self.local.render_mask(result)
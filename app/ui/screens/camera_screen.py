@@ -15,7 +15,8 @@ from kivymd.uix.toolbar import MDTopAppBar
 from kivymd.uix.progressbar import MDProgressBar
 from kivymd.app import MDApp
 
-from app.ml.inference import PlantModel
+from app.ml.jobs import JOB_QUEUED, JOB_RUNNING
+from app.ui.ui_thread import on_ui_thread
 import os 
 from kivy.utils import platform
 
@@ -34,6 +35,17 @@ import shutil
 from app.ml.inference import species_ru, disease_ru   # в начало файла
 import numpy as np
 
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+BATCH_SIZE = 8   # размер батча для пакетной диагностики папки
+
+# Подпись статуса после завершения этапа пайплайна (что выполняется дальше)
+STAGE_LABELS = {
+    "decode": "Сегментация листа...",
+    "segmentation": "Классификация...",
+    "classification": "Формирование результата...",
+    "done": "Готово!",
+}
+
 Builder.load_string('''
 #:import dp kivy.metrics.dp
 
@@ -106,6 +118,19 @@ Builder.load_string('''
                 opacity: 0
                 disabled: True
                 on_release: root._on_clear_pressed()
+
+            # Показать/скрыть маски поражений (строятся только по нажатию)
+            MDIconButton:
+                id: mask_btn
+                icon: "layers"
+                theme_icon_color: "Custom"
+                icon_color: "green"
+                size_hint: None, None
+                size: dp(48), dp(48)
+                pos_hint: {"top": 1, "x": 0}
+                opacity: 0
+                disabled: True
+                on_release: root.toggle_mask()
         
         # Статус и прогресс (изначально скрыты)
         MDBoxLayout:
@@ -185,6 +210,15 @@ Builder.load_string('''
                 md_bg_color: "green"
                 size_hint_x: 0.5
                 on_release: root.use_camera()
+
+            MDIconButton:
+                id: folder_btn
+                icon: "folder-multiple-image"
+                theme_icon_color: "Custom"
+                icon_color: "white"
+                md_bg_color: "green"
+                size_hint_x: 0.5
+                on_release: root.use_folder()
 ''')
 
 class CameraScreen(Screen):
@@ -197,11 +231,51 @@ class CameraScreen(Screen):
         self.progress_interval = None
         self.opening_dialog = False          # блокировка повторного открытия диалога
         self.reset_in_progress = False # блокировка повторного сброса
-        self.model = PlantModel()    
+        # Модель и очередь инференса общие для всех экранов (app.models): ONNX-сети
+        # загружаются один раз, сколько бы экранов диагностики ни было создано
+        self.models = MDApp.get_running_app().models
+        self.model = self.jobs = None
+        self.submitted_jobs = []             # задачи этого экрана — их и отменяет сброс
         self.current_result = None
         self.mask_active = False
-        # Загружаем модели сразу после запуска (отложенно, чтобы не тормозить UI)
-        Clock.schedule_once(lambda dt: self.model.load_models(), 0.5)  
+        self.acquire_model()
+
+    def on_enter(self, *args):
+        # Загрузка и прогрев моделей в фоновом потоке — при первом показе экрана
+        self.models.preload()
+
+    def on_parent(self, widget, parent):
+        # Экран снят с окна (ScreenManager убирает неактивные экраны) — модель
+        # отпускается; при возвращении берётся снова
+        if parent is None:
+            self.release_model()
+        else:
+            self.acquire_model()
+
+    def acquire_model(self):
+        """Взять общую модель (повторный вызов ничего не делает)"""
+        if self.model is not None:
+            return
+        self.model = self.models.acquire()
+        self.jobs = self.models.jobs
+
+    def release_model(self):
+        """Отпустить общую модель (экран больше не используется)"""
+        if self.model is None:
+            return
+        self._cancel_jobs()
+        self.model = self.jobs = None
+        self.models.release()
+
+    def _track_job(self, job):
+        self.submitted_jobs = [j for j in self.submitted_jobs if j.state in (JOB_QUEUED, JOB_RUNNING)]
+        if job not in self.submitted_jobs:
+            self.submitted_jobs.append(job)
+
+    def _cancel_jobs(self):
+        for job in self.submitted_jobs:
+            job.cancel()
+        self.submitted_jobs = []
     
     def _add_action_buttons(self):
         """Показать кнопки действий (Анализировать, Сбросить)"""
@@ -268,6 +342,135 @@ class CameraScreen(Screen):
    
 
 
+    def use_folder(self):
+        """Выбор папки с фото для пакетной диагностики"""
+        if self.opening_dialog:
+            return
+        self.opening_dialog = True
+        if platform == 'android':
+            try:
+                filechooser.choose_dir(title="Выберите папку с изображениями",
+                                       on_selection=self._on_folder_selection)
+            except Exception as e:
+                self.show_error("Папка", f"Ошибка выбора папки: {e}")
+                self.opening_dialog = False
+        else:
+            Clock.schedule_once(lambda dt: self._real_open_folder_dialog(), 0.1)
+
+    def _on_folder_selection(self, selection):
+        self.opening_dialog = False
+        if selection and len(selection) > 0:
+            folder = selection[0]
+            Clock.schedule_once(lambda dt: self.start_batch_analysis(folder), 0)
+        else:
+            print("❌ Выбор отменён")
+
+    def _real_open_folder_dialog(self):
+        try:
+            root = Tk()
+            root.withdraw()
+            folder = filedialog.askdirectory(title="Выберите папку с изображениями растений",
+                                             initialdir=os.getcwd())
+            root.destroy()
+            if folder:
+                print(f"✅ Выбрана папка: {folder}")
+                self.start_batch_analysis(folder)
+            else:
+                print("❌ Выбор отменён")
+        except Exception as e:
+            print(f"Ошибка диалога: {e}")
+            self.show_message("Ошибка", f"Не удалось открыть диалог: {e}")
+        finally:
+            self.opening_dialog = False
+
+    def start_batch_analysis(self, folder):
+        """Пакетная диагностика всех изображений в папке"""
+        paths = sorted(
+            os.path.join(folder, name) for name in os.listdir(folder)
+            if name.lower().endswith(IMAGE_EXTENSIONS) and not name.startswith('masked_')
+        )
+        if not paths:
+            self.show_message("Папка", "В папке нет изображений")
+            return
+
+        job = self.jobs.submit_batch(
+            paths, batch_size=BATCH_SIZE,
+            on_progress=on_ui_thread(lambda stage, value: self._update_batch_progress_ui(value, len(paths))),
+            on_done=on_ui_thread(self.show_batch_result),
+            on_error=on_ui_thread(lambda ex: self._on_batch_error(str(ex))),
+        )
+        if job is None:
+            self.show_message("Диагностика", "Очередь анализа заполнена, попробуйте позже")
+            return
+        self._track_job(job)
+
+        self.ids.status_box.height = dp(30)
+        self.ids.status_box.opacity = 1
+        self.ids.progress_bar.value = 0
+        self.ids.status_label.text = "Загрузка моделей..." if not self.model.loaded else \
+            f"Пакетная диагностика: 0 / {len(paths)}"
+        self.disable_buttons()
+
+    def _update_batch_progress_ui(self, value, total):
+        self.ids.progress_bar.value = value * 100
+        self.ids.status_label.text = f"Пакетная диагностика: {round(value * total)} / {total}"
+
+    def _on_batch_error(self, message):
+        self.enable_buttons()
+        self.ids.status_box.height = 0
+        self.ids.status_box.opacity = 0
+        self.show_error("Ошибка", message)
+
+    def show_batch_result(self, results):
+        """Показать сводку пакетной диагностики"""
+        self.enable_buttons()
+        self.ids.status_box.height = 0
+        self.ids.status_box.opacity = 0
+
+        lines = []
+        for result in results:
+            name = os.path.basename(result['path'])
+            if 'error' in result:
+                lines.append(f"[b]{name}[/b]\n  [color=ff0000]Ошибка:[/color] {result['error']}")
+                continue
+            species = species_ru.get(result['species_idx'], 'Неизвестно')
+            disease = disease_ru.get(result['disease_idx'], 'Неизвестно')
+            lines.append(
+                f"[b]{name}[/b]\n"
+                f"  Вид: {species} ({result['species_conf'] * 100:.1f}%)\n"
+                f"  Болезнь: {disease} ({result['disease_conf'] * 100:.1f}%)"
+            )
+
+        content = MDBoxLayout(
+            orientation="vertical",
+            size_hint_y=None,
+            height=dp(420),
+            padding=dp(10),
+        )
+        label = MDLabel(
+            text="\n\n".join(lines),
+            markup=True,
+            theme_text_color="Custom",
+            text_color=(0, 0, 0, 1),
+            size_hint_y=None,
+            halign="left",
+            valign="top",
+            font_style="Caption",
+        )
+        label.bind(texture_size=label.setter('size'))
+        scroll = ScrollView(size_hint_y=1, do_scroll_x=False)
+        scroll.add_widget(label)
+        content.add_widget(scroll)
+
+        dialog = MDDialog(
+            title=f"Диагностика папки: {len(results)} фото",
+            type="custom",
+            content_cls=content,
+            buttons=[MDFlatButton(text="Закрыть", on_release=lambda x: dialog.dismiss())],
+            size_hint=(0.95, 0.85)
+        )
+        dialog.open()
+
     def _open_file_dialog(self):
         Clock.schedule_once(lambda dt: self._real_open_file_dialog(), 0.1)
 
@@ -329,6 +532,10 @@ class CameraScreen(Screen):
             # Скрываем крестик
             self.ids.clear_btn.opacity = 0
             self.ids.clear_btn.disabled = True
+            # Скрываем кнопку маски
+            self.current_result = None
+            self.ids.mask_btn.opacity = 0
+            self.ids.mask_btn.disabled = True
             # Скрываем прогресс
             self.ids.progress_bar.value = 0
             self.ids.status_box.height = 0
@@ -336,6 +543,8 @@ class CameraScreen(Screen):
             if self.progress_interval:
                 Clock.unschedule(self.progress_interval)
                 self.progress_interval = None
+            # Отменяем анализ, запущенный для сброшенного изображения
+            self._cancel_jobs()
             print("🔄 Изображение сброшено")
         finally:
             self.reset_in_progress = False
@@ -352,50 +561,44 @@ class CameraScreen(Screen):
         if not self.selected_image_path:
             self.show_message("Ошибка", "Сначала выберите изображение")
             return
-        if not self.model.loaded:
-            # Попытаемся загрузить модели (можно сделать при старте приложения)
-            Clock.schedule_once(lambda dt: self.load_models_and_analyze(), 0)
-        else:
-            self._run_inference()
-    
-    def load_models_and_analyze(self):
-        if not self.model.load_models():
-            self.show_error("Ошибка модели", "Не удалось загрузить ONNX модели")
-            return
+        # Если модели ещё грузятся, поток инференса дождётся их готовности
         self._run_inference()
 
     def _run_inference(self):
-        """Запуск инференса в отдельном потоке"""
-        from threading import Thread
+        """Постановка анализа в очередь инференса (повторное нажатие не запускает дубль)"""
+        image_path = self.selected_image_path
+
+        # Колбэки очереди приходят из потока инференса — в UI их переносит on_ui_thread
+        job = self.jobs.submit(image_path,
+                               on_progress=on_ui_thread(self._update_progress_ui),
+                               on_done=on_ui_thread(lambda result: self._on_inference_done(image_path, result)),
+                               on_error=on_ui_thread(lambda ex: self._on_inference_error(str(ex))))
+        if job is None:
+            self.show_message("Диагностика", "Очередь анализа заполнена, попробуйте позже")
+            return
+        self._track_job(job)
+
         self.ids.status_box.height = dp(30)
         self.ids.status_box.opacity = 1
-        self.ids.progress_bar.value = 0
-        self.ids.status_label.text = "Загрузка моделей..."
-
-        def update_progress(value):
-            Clock.schedule_once(lambda dt: self._update_progress_ui(value))
+        if job.state == JOB_QUEUED:
+            self.ids.progress_bar.value = 0
+            self.ids.status_label.text = "Загрузка моделей..." if not self.model.loaded else "Декодирование..."
 
-        def inference_thread():
-            try:
-                result = self.model.predict(self.selected_image_path, progress_callback=update_progress)
-                Clock.schedule_once(lambda dt: self.show_analysis_result(result))
-            except Exception as ex:
-                print(f"Ошибка инференса: {ex}")
-                Clock.schedule_once(lambda dt: self.show_error("Ошибка", str(ex)))
+    def _on_inference_done(self, image_path, result):
+        if image_path != self.selected_image_path:
+            return   # изображение сменилось, пока шёл анализ
+        self.show_analysis_result(result)
 
-        self.thread = Thread(target=inference_thread, daemon=True)
-        self.thread.start()
+    def _on_inference_error(self, message):
+        self.ids.status_box.height = 0
+        self.ids.status_box.opacity = 0
+        self.enable_buttons()
+        self.show_error("Ошибка", message)
 
-    def _update_progress_ui(self, value):
+    def _update_progress_ui(self, stage, value):
+        """Прогресс по фактически завершённым этапам; подпись — следующий этап"""
         self.ids.progress_bar.value = value * 100
-        if value < 0.2:
-            self.ids.status_label.text = "Сегментация листа..."
-        elif value < 0.5:
-            self.ids.status_label.text = "Анализ поражений..."
-        elif value < 0.9:
-            self.ids.status_label.text = "Классификация..."
-        else:
-            self.ids.status_label.text = "Готово!"
+        self.ids.status_label.text = STAGE_LABELS.get(stage, "")
 
     def _format_result_text(self, result):
         """Форматирует текст результата с процентами по правилам"""
@@ -439,13 +642,12 @@ class CameraScreen(Screen):
     def show_analysis_result(self, result):
         """Показать результат анализа в нижней части экрана"""
         self.current_result = result
-        self.mask_active = True
+        self.mask_active = False
+        self.ids.mask_btn.opacity = 1
         self.disable_buttons()  # блокируем кнопки
-        # Подменяем картинку на размеченную
-        if 'masked_image_path' in result and result['masked_image_path']:
-            self.current_masked_path = result['masked_image_path']
-            self.ids.selected_image.source = result['masked_image_path']
-            self.ids.selected_image.reload()
+        # Подменяем картинку на размеченную, если маски уже построены
+        if result.get('masked_image_path'):
+            self._show_mask(result['masked_image_path'])
         # Скрываем прогресс-бар, если он был виден
         self.ids.status_box.height = 0
         self.ids.status_box.opacity = 0
@@ -569,15 +771,54 @@ class CameraScreen(Screen):
         #     self.ids.selected_image.reload()
         self.enable_buttons()
            
+    def toggle_mask(self):
+        """Показать маски поражений (построив изображение при первом нажатии) или скрыть их"""
+        if not self.current_result:
+            return
+        if self.mask_active:
+            self._hide_mask()
+            return
+        from threading import Thread
+        result = self.current_result
+        self.ids.mask_btn.disabled = True
+
+        def render_thread():
+            try:
+                masked_path = self.model.render_mask(result)
+                Clock.schedule_once(lambda dt: self._on_mask_rendered(result, masked_path))
+            except Exception as ex:
+                print(f"Ошибка построения маски: {ex}")
+                Clock.schedule_once(lambda dt: self._on_mask_rendered(result, None))
+
+        Thread(target=render_thread, daemon=True).start()
+
+    def _on_mask_rendered(self, result, masked_path):
+        if result is not self.current_result:
+            return   # изображение уже сброшено
+        self.ids.mask_btn.disabled = False
+        if masked_path:
+            self._show_mask(masked_path)
+        else:
+            self.show_error("Ошибка", "Не удалось построить маску")
+
+    def _show_mask(self, masked_path):
+        self.current_masked_path = masked_path
+        self.ids.selected_image.source = masked_path
+        self.ids.selected_image.reload()
+        self.mask_active = True
+
+    def _hide_mask(self):
+        if hasattr(self, 'original_image_path') and self.original_image_path:
+            self.ids.selected_image.source = self.original_image_path
+            self.ids.selected_image.reload()
+        self.mask_active = False
+        print(" Маска снята")
+
     def _on_clear_pressed(self):
         if self.mask_active:
             # Сбросить только маску, вернуть оригинал
-            if hasattr(self, 'original_image_path') and self.original_image_path:
-                self.ids.selected_image.source = self.original_image_path
-                self.ids.selected_image.reload()
-                self.mask_active = False
-                self.ids.clear_btn.icon = "close-circle"
-                print(" Маска снята")
+            self._hide_mask()
+            self.ids.clear_btn.icon = "close-circle"
         else:
             # Полный сброс изображения
             self.reset_image()
@@ -596,6 +837,8 @@ class CameraScreen(Screen):
         """Отключить все управляющие кнопки"""
         self.ids.camera_btn.disabled = True
         self.ids.gallery_btn.disabled = True
+        self.ids.folder_btn.disabled = True
+        self.ids.mask_btn.disabled = True
         self.ids.clear_btn.disabled = True
         # Отключаем кнопки в контейнере action_buttons (Анализировать, Сбросить)
         for child in self.ids.action_buttons.children:
@@ -606,6 +849,8 @@ class CameraScreen(Screen):
         """Включить все управляющие кнопки"""
         self.ids.camera_btn.disabled = False
         self.ids.gallery_btn.disabled = False
+        self.ids.folder_btn.disabled = False
+        self.ids.mask_btn.disabled = self.current_result is None
         self.ids.clear_btn.disabled = False
         for child in self.ids.action_buttons.children:
             if hasattr(child, 'disabled'):
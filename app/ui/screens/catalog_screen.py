@@ -1,6 +1,5 @@
 from kivy.lang import Builder
 from kivy.uix.screenmanager import Screen
-from kivymd.uix.bottomnavigation import MDBottomNavigationItem
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.button import MDRaisedButton, MDFlatButton, MDIconButton, MDRectangleFlatButton
 from kivymd.uix.dialog import MDDialog
@@ -22,9 +21,11 @@ from kivy.clock import Clock
 from kivy.properties import DictProperty
 from kivy.uix.widget import Widget 
 from kivy.metrics import sp
-import pandas as pd
 import os
 
+from app.core.catalog_export import export_catalog
+from app.ui.task_progress import run_in_background
+
 from kivy.utils import platform
 
 if platform == 'android':
@@ -36,8 +37,6 @@ else:
 Builder.load_string('''
 <CatalogTab>:
     name: 'catalog'
-    text: 'Каталог'
-    icon: 'view-list'
     
     MDBoxLayout:
         orientation: 'vertical'
@@ -953,7 +952,7 @@ class EditPesticideDialog(MDBoxLayout):
             self.type_menu = None
             
 
-class CatalogTab(MDBottomNavigationItem):
+class CatalogTab(Screen):
     app = ObjectProperty(None)
     restoring_scroll = BooleanProperty(False) # Добавьте флаг, чтобы on_recycle_scroll игнорировал изменения, вызванные программной установкой scroll_y:
     visible_count = 0          # сколько элементов показываем в RecycleView
@@ -986,7 +985,7 @@ class CatalogTab(MDBottomNavigationItem):
         self.selected_diseases = []
 
         self.data = []                 # все загруженные препараты (словари)
-        self.current_offset = 0
+        self.page_cursor = None        # (значение сортировки, id) последнего загруженного препарата
         self.saved_scroll_offset = 0.0
         self.limit = 10
         self.loading = False
@@ -1052,7 +1051,7 @@ class CatalogTab(MDBottomNavigationItem):
 
 
     def refresh_data(self):
-        self.current_offset = 0
+        self.page_cursor = None
         self.data = []
         self.visible_count = 0
         self.is_end_reached = False
@@ -1072,7 +1071,7 @@ class CatalogTab(MDBottomNavigationItem):
         if self.loading or self.is_end_reached:
             return
         self.loading = True
-        print(f"Загрузка offset={self.current_offset}, limit={self.limit}")
+        print(f"Загрузка после {self.page_cursor}, limit={self.limit}")
 
         rv = self.ids.pesticide_recycle
         viewport_height = rv.height
@@ -1090,12 +1089,12 @@ class CatalogTab(MDBottomNavigationItem):
         try:
             app = MDApp.get_running_app()
             new_items = app.db.get_pesticides_paginated(
-                offset=self.current_offset,
                 limit=self.limit,
                 search=self.search_query,
                 filters=self.filters,
                 sort_by=self.sort_settings['criteria'],
-                sort_order=self.sort_settings['order']
+                sort_order=self.sort_settings['order'],
+                after=self.page_cursor
             )
             if not new_items:
                 self.is_end_reached = True
@@ -1124,7 +1123,7 @@ class CatalogTab(MDBottomNavigationItem):
                 }
                 self.data.append(card_dict)
 
-            self.current_offset += len(new_items)
+            self.page_cursor = app.db.catalog_cursor(new_items[-1], self.sort_settings['criteria'])
             if len(new_items) < self.limit:
                 self.is_end_reached = True
 
@@ -1404,14 +1403,13 @@ class CatalogTab(MDBottomNavigationItem):
         self.selected_diseases = []
 
         app = MDApp.get_running_app()
-        cursor = app.db.connection.cursor()
+        references = app.db.references
 
         existing_cultures = []
         for name in species_list:
-            cursor.execute("SELECT id FROM cultures WHERE culture_name = ?", (name,))
-            row = cursor.fetchone()
-            print(f"DEBUG: culture '{name}' found: {row is not None}")
-            if row:
+            found = references.find("cultures", name) is not None
+            print(f"DEBUG: culture '{name}' found: {found}")
+            if found:
                 existing_cultures.append(name)
         if existing_cultures:
             self.selected_cultures = existing_cultures
@@ -1419,10 +1417,9 @@ class CatalogTab(MDBottomNavigationItem):
 
         existing_diseases = []
         for name in disease_list:
-            cursor.execute("SELECT id FROM diseases WHERE disease_name = ?", (name,))
-            row = cursor.fetchone()
-            print(f"DEBUG: disease '{name}' found: {row is not None}")
-            if row:
+            found = references.find("diseases", name) is not None
+            print(f"DEBUG: disease '{name}' found: {found}")
+            if found:
                 existing_diseases.append(name)
         if existing_diseases:
             self.selected_diseases = existing_diseases
@@ -1521,9 +1518,7 @@ class CatalogTab(MDBottomNavigationItem):
         # cultures = ["Пшеница", "Ячмень", "Кукуруза", "Подсолнечник", "Соя", "Рапс", "Сахарная свекла", "Картофель"]
          # Загружаем реальные культуры
         app = MDApp.get_running_app()
-        cursor = app.db.connection.cursor()
-        cursor.execute("SELECT culture_name FROM cultures ORDER BY culture_name")
-        cultures = [row['culture_name'] for row in cursor.fetchall()]
+        cultures = app.db.references.names("cultures")
         menu_items = [
             {
                 "text": culture,
@@ -1594,10 +1589,19 @@ class CatalogTab(MDBottomNavigationItem):
         unique_cultures = sorted(set([c for c in all_cultures if c]))
         self._update_culture_menu_items(unique_cultures)
 
+    def _writes_blocked(self):
+        """Фоновый импорт/экспорт держит запись в базу (отчёт импорта ждёт подтверждения)"""
+        if MDApp.get_running_app().tasks.is_busy():
+            self._show_error_message("Дождитесь завершения импорта/экспорта")
+            return True
+        return False
+
     def save_new_pesticide(self, new_data):
         if not new_data.get('name'):
             self._show_error_message("Название препарата обязательно!")
             return
+        if self._writes_blocked():
+            return
         try:
             app = MDApp.get_running_app()
             db = app.db
@@ -1605,20 +1609,16 @@ class CatalogTab(MDBottomNavigationItem):
 
             # Определяем type_id
             type_name = new_data.get('type', 'Гербициды')
-            cursor.execute("SELECT id FROM pesticide_types WHERE type_name = ?", (type_name,))
-            res = cursor.fetchone()
-            if not res:
-                cursor.execute("INSERT INTO pesticide_types (type_name) VALUES (?)", (type_name,))
-                type_id = cursor.lastrowid
-            else:
-                type_id = res['id']
+            type_id = db.references.get_or_create("types", type_name, cursor)
 
             # Вставляем препарат
             cursor.execute('''
-                INSERT INTO pesticides (name, description, application_rate, packaging, price, manufacturer, pesticide_type_id)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                INSERT INTO pesticides (name, name_cf, description, application_rate, packaging, price, manufacturer,
+                                        pesticide_type_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 new_data['name'],
+                new_data['name'].casefold(),
                 new_data.get('description', ''),
                 new_data.get('application_rate', ''),
                 new_data.get('packaging', ''),
@@ -1640,13 +1640,7 @@ class CatalogTab(MDBottomNavigationItem):
                     if key in seen:
                         continue
                     seen.add(key)
-                    cursor.execute("SELECT id FROM active_substances WHERE substance_name = ?", (substance_name,))
-                    res = cursor.fetchone()
-                    if not res:
-                        cursor.execute("INSERT INTO active_substances (substance_name) VALUES (?)", (substance_name,))
-                        substance_id = cursor.lastrowid
-                    else:
-                        substance_id = res['id']
+                    substance_id = db.references.get_or_create("substances", substance_name, cursor)
                     cursor.execute("INSERT INTO pesticide_active_substances (pesticide_id, substance_id, concentration) VALUES (?, ?, ?)",
                                 (pesticide_id, substance_id, concentration))
 
@@ -1655,13 +1649,7 @@ class CatalogTab(MDBottomNavigationItem):
             if cultures_str:
                 culture_list = [c.strip() for c in cultures_str.split(',') if c.strip()]
                 for cult_name in culture_list:
-                    cursor.execute("SELECT id FROM cultures WHERE culture_name = ?", (cult_name,))
-                    res = cursor.fetchone()
-                    if not res:
-                        cursor.execute("INSERT INTO cultures (culture_name) VALUES (?)", (cult_name,))
-                        culture_id = cursor.lastrowid
-                    else:
-                        culture_id = res['id']
+                    culture_id = db.references.get_or_create("cultures", cult_name, cursor)
                     cursor.execute("INSERT OR IGNORE INTO pesticide_cultures (pesticide_id, culture_id) VALUES (?, ?)", (pesticide_id, culture_id))
 
             # Болезни
@@ -1669,13 +1657,7 @@ class CatalogTab(MDBottomNavigationItem):
             if diseases_str:
                 disease_list = [d.strip() for d in diseases_str.split(',') if d.strip()]
                 for dis_name in disease_list:
-                    cursor.execute("SELECT id FROM diseases WHERE disease_name = ?", (dis_name,))
-                    res = cursor.fetchone()
-                    if not res:
-                        cursor.execute("INSERT INTO diseases (disease_name) VALUES (?)", (dis_name,))
-                        disease_id = cursor.lastrowid
-                    else:
-                        disease_id = res['id']
+                    disease_id = db.references.get_or_create("diseases", dis_name, cursor)
                     cursor.execute("INSERT OR IGNORE INTO pesticide_diseases (pesticide_id, disease_id) VALUES (?, ?)", (pesticide_id, disease_id))
 
             db.connection.commit()
@@ -1697,9 +1679,7 @@ class CatalogTab(MDBottomNavigationItem):
             self.disease_menu = None
             return
         app = MDApp.get_running_app()
-        cursor = app.db.connection.cursor()
-        cursor.execute("SELECT disease_name FROM diseases ORDER BY disease_name")
-        diseases = [row['disease_name'] for row in cursor.fetchall()]
+        diseases = app.db.references.names("diseases")
         menu_items = [
             {"text": d, "viewclass": "OneLineListItem", "height": dp(48),
             "on_release": lambda x=d: self.select_disease(x)} for d in diseases
@@ -2008,6 +1988,8 @@ class CatalogTab(MDBottomNavigationItem):
 
   
     def save_pesticide_changes(self, updated_data):
+        if self._writes_blocked():
+            return
         try:
             app = MDApp.get_running_app()
             db = app.db
@@ -2020,13 +2002,14 @@ class CatalogTab(MDBottomNavigationItem):
             # Обновляем основные поля препарата
             cursor.execute('''
                 UPDATE pesticides 
-                SET name = ?, description = ?, application_rate = ?, packaging = ?, 
+                SET name = ?, name_cf = ?, description = ?, application_rate = ?, packaging = ?, 
                     price = ?, manufacturer = ?, pesticide_type_id = (
                         SELECT id FROM pesticide_types WHERE type_name = ?
                     )
                 WHERE id = ?
             ''', (
                 updated_data['name'],
+                updated_data['name'].casefold(),
                 updated_data['description'],
                 updated_data['application_rate'],
                 updated_data['packaging'],
@@ -2051,13 +2034,7 @@ class CatalogTab(MDBottomNavigationItem):
                     if key in seen:
                         continue
                     seen.add(key)
-                    cursor.execute("SELECT id FROM active_substances WHERE substance_name = ?", (substance_name,))
-                    res = cursor.fetchone()
-                    if not res:
-                        cursor.execute("INSERT INTO active_substances (substance_name) VALUES (?)", (substance_name,))
-                        substance_id = cursor.lastrowid
-                    else:
-                        substance_id = res[0]
+                    substance_id = db.references.get_or_create("substances", substance_name, cursor)
                     cursor.execute("INSERT INTO pesticide_active_substances (pesticide_id, substance_id, concentration) VALUES (?, ?, ?)",
                                 (pesticide_id, substance_id, concentration))
 
@@ -2068,13 +2045,7 @@ class CatalogTab(MDBottomNavigationItem):
                 cursor.execute("DELETE FROM pesticide_cultures WHERE pesticide_id = ?", (pesticide_id,))
                 culture_list = [c.strip() for c in updated_data['cultures'].split(',') if c.strip()]
                 for cult_name in culture_list:
-                    cursor.execute("SELECT id FROM cultures WHERE culture_name = ?", (cult_name,))
-                    res = cursor.fetchone()
-                    if not res:
-                        cursor.execute("INSERT INTO cultures (culture_name) VALUES (?)", (cult_name,))
-                        culture_id = cursor.lastrowid
-                    else:
-                        culture_id = res[0]
+                    culture_id = db.references.get_or_create("cultures", cult_name, cursor)
                     cursor.execute("INSERT OR IGNORE INTO pesticide_cultures (pesticide_id, culture_id) VALUES (?, ?)", (pesticide_id, culture_id))
 
             # Болезни – аналогично
@@ -2082,13 +2053,7 @@ class CatalogTab(MDBottomNavigationItem):
                 cursor.execute("DELETE FROM pesticide_diseases WHERE pesticide_id = ?", (pesticide_id,))
                 disease_list = [d.strip() for d in updated_data['diseases'].split(',') if d.strip()]
                 for dis_name in disease_list:
-                    cursor.execute("SELECT id FROM diseases WHERE disease_name = ?", (dis_name,))
-                    res = cursor.fetchone()
-                    if not res:
-                        cursor.execute("INSERT INTO diseases (disease_name) VALUES (?)", (dis_name,))
-                        disease_id = cursor.lastrowid
-                    else:
-                        disease_id = res[0]
+                    disease_id = db.references.get_or_create("diseases", dis_name, cursor)
                     cursor.execute("INSERT OR IGNORE INTO pesticide_diseases (pesticide_id, disease_id) VALUES (?, ?)", (pesticide_id, disease_id))
 
             db.connection.commit()
@@ -2105,7 +2070,7 @@ class CatalogTab(MDBottomNavigationItem):
     def delete_pesticide(self, pesticide):
         """Удалить препарат из базы данных"""
         pesticide_id = pesticide.get('id')
-        if not pesticide_id:
+        if not pesticide_id or self._writes_blocked():
             return
         try:
             app = MDApp.get_running_app()
@@ -2301,15 +2266,7 @@ class CatalogTab(MDBottomNavigationItem):
         # Предварительно определим количество препаратов (без пагинации)
         try:
             app = MDApp.get_running_app()
-            pesticides = app.db.get_pesticides_paginated(
-                offset=0,
-                limit=100000,
-                search=self.search_query,
-                filters=self.filters,
-                sort_by=self.sort_settings['criteria'],
-                sort_order=self.sort_settings['order']
-            )
-            total_count = len(pesticides) if pesticides else 0
+            total_count = app.db.count_catalog(self.search_query, self.filters)
         except Exception as e:
             print(f"Ошибка при подсчёте: {e}")
             total_count = 0
@@ -2392,9 +2349,10 @@ class CatalogTab(MDBottomNavigationItem):
         # Проверяем количество
         try:
             app = MDApp.get_running_app()
+            # Достаточно одной строки: сам экспорт выполняется в фоне
             pesticides = app.db.get_pesticides_paginated(
                 offset=0,
-                limit=100000,
+                limit=1,
                 search=self.search_query,
                 filters=self.filters,
                 sort_by=self.sort_settings['criteria'],
@@ -2428,102 +2386,40 @@ class CatalogTab(MDBottomNavigationItem):
         self.export_to_excel()
 
     def export_to_excel(self):
-        """Экспорт каталога в Excel с учётом текущих фильтров, поиска и сортировки"""
-        try:
-            app = MDApp.get_running_app()
-            pesticides = app.db.get_pesticides_paginated(
-                offset=0,
-                limit=100000,
-                search=self.search_query,
-                filters=self.filters,
-                sort_by=self.sort_settings['criteria'],
-                sort_order=self.sort_settings['order']
-            )
-            if not pesticides:
-                self._show_error_message("Нет данных для экспорта")
-                return
-
-            cursor = app.db.connection.cursor()
-            data_rows = []
-
-            for pest in pesticides:
-                pid = pest['id']
-                cursor.execute('''
-                    SELECT a.substance_name, pas.concentration
-                    FROM pesticide_active_substances pas
-                    JOIN active_substances a ON pas.substance_id = a.id
-                    WHERE pas.pesticide_id = ?
-                ''', (pid,))
-                substances_list = [f"{row['substance_name']} {row['concentration']}" for row in cursor.fetchall()]
-                substances_str = "; ".join(substances_list) if substances_list else ""
-
-                cursor.execute('''
-                    SELECT c.culture_name
-                    FROM pesticide_cultures pc
-                    JOIN cultures c ON pc.culture_id = c.id
-                    WHERE pc.pesticide_id = ?
-                ''', (pid,))
-                cultures_list = [row['culture_name'] for row in cursor.fetchall()]
-                cultures_str = ", ".join(cultures_list) if cultures_list else ""
+        """Экспорт каталога в Excel с учётом текущих фильтров, поиска и сортировки (в фоне)"""
+        query = dict(
+            search=self.search_query,
+            filters=dict(self.filters),
+            sort_by=self.sort_settings['criteria'],
+            sort_order=self.sort_settings['order']
+        )
+        from datetime import datetime
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        default_name = f"catalog_export_{timestamp}.xlsx"
 
-                cursor.execute('''
-                    SELECT d.disease_name
-                    FROM pesticide_diseases pd
-                    JOIN diseases d ON pd.disease_id = d.id
-                    WHERE pd.pesticide_id = ?
-                ''', (pid,))
-                diseases_list = [row['disease_name'] for row in cursor.fetchall()]
-                diseases_str = ", ".join(diseases_list) if diseases_list else ""
-
-                data_rows.append({
-                    'Название': pest['name'],
-                    'Тип': pest.get('pesticide_type', ''),
-                    'Действующие вещества': substances_str,
-                    'Описание': pest.get('description') or '',
-                    'Норма расхода': pest.get('application_rate') or '',
-                    'Фасовка': pest.get('packaging') or '',
-                    'Цена, руб.': pest['price'],
-                    'Производитель': pest.get('manufacturer') or '',
-                    'Культуры': cultures_str,
-                    'Болезни': diseases_str,
-                })
-
-            df = pd.DataFrame(data_rows)
+        def on_done(count, file_path):
+            if count:
+                self._show_success_message(f"Каталог сохранён: {os.path.basename(file_path)}")
+            else:
+                self._show_error_message("Нет данных для экспорта")
 
-            from datetime import datetime
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            default_name = f"catalog_export_{timestamp}.xlsx"
-
-            def on_file_saved(file_path):
-                try:
-                    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
-                        df.to_excel(writer, sheet_name='Препараты', index=False)
-                        worksheet = writer.sheets['Препараты']
-                        for column in worksheet.columns:
-                            max_length = 0
-                            col_letter = column[0].column_letter
-                            for cell in column:
-                                try:
-                                    if len(str(cell.value)) > max_length:
-                                        max_length = len(str(cell.value))
-                                except:
-                                    pass
-                            adjusted_width = min(max_length + 2, 50)
-                            worksheet.column_dimensions[col_letter].width = adjusted_width
-                    self._show_success_message(f"Каталог сохранён: {os.path.basename(file_path)}")
-                except Exception as e:
-                    self._show_error_message(f"Ошибка сохранения: {e}")
-
-            self._save_file_dialog(
-                title="Сохранить каталог",
-                filters=[("Excel files", "*.xlsx")],
-                default_name=default_name,
-                on_success=on_file_saved
+        def on_file_saved(file_path):
+            started = run_in_background(
+                "Экспорт каталога",
+                lambda db, progress: export_catalog(db, file_path, progress=progress, **query),
+                lambda count: on_done(count, file_path),
+                on_error=lambda e: self._show_error_message(f"Ошибка экспорта: {str(e)[:100]}"),
+                on_cancelled=lambda: self._show_error_message("Экспорт отменён")
             )
-
-        except Exception as e:
-            self._show_error_message(f"Ошибка экспорта: {str(e)[:100]}")
-    
+            if not started:
+                self._show_error_message("Дождитесь завершения текущей операции")
+
+        self._save_file_dialog(
+            title="Сохранить каталог",
+            filters=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")],
+            default_name=default_name,
+            on_success=on_file_saved
+        )
 
     def _extract_price(self, price_str):
         """Извлечение числового значения цены из строки"""
@@ -1,14 +1,21 @@
+import importlib
+import time
+
+from kivy.clock import Clock
 from kivy.lang import Builder
 from kivy.uix.screenmanager import Screen
 from kivymd.uix.bottomnavigation import MDBottomNavigation, MDBottomNavigationItem
-from kivymd.uix.label import MDLabel
-from kivymd.uix.boxlayout import MDBoxLayout
+from kivymd.app import MDApp
 
-# Импортируем вкладки из отдельных файлов
-from app.ui.screens.settings_screen import SettingsTab
-from app.ui.screens.catalog_screen import CatalogTab
-# from app.ui.screens.orders_screen import OrdersTab
-from app.ui.screens.camera_screen import CameraScreen 
+# Вкладки: (name, подпись, иконка, модуль, класс содержимого). Модули вкладок
+# (pandas, tkinter, onnxruntime и их KV-разметка) импортируются при первом
+# показе вкладки, а не при запуске приложения
+TABS = (
+    ('diagnosis', 'Диагностика', 'camera', 'app.ui.screens.camera_screen', 'CameraScreen'),
+    ('catalog', 'Каталог', 'view-list', 'app.ui.screens.catalog_screen', 'CatalogTab'),
+    # ('orders', 'Заказы', 'cart', 'app.ui.screens.orders_screen', 'OrdersTab'),
+    ('settings', 'Импорт/Экспорт', 'database-export', 'app.ui.screens.settings_screen', 'SettingsTab'),
+)
 
 Builder.load_string('''
 <MainScreen>:
@@ -17,72 +24,84 @@ Builder.load_string('''
         panel_color: "#f5f5f5"
         selected_color_background: "#e0f2f1"
         text_color_active: "green"
+''')
 
-<DiagnosisTab>:
-    name: 'diagnosis'
-    text: 'Диагностика'
-    icon: 'camera'
 
-# <OrdersTab>:
-#     name: 'orders'
-#     text: 'Заказы'
-#     icon: 'cart'
-    
-    MDBoxLayout:
-        orientation: 'vertical'
-        padding: '20dp'
-        
+class LazyTab(MDBottomNavigationItem):
+    """Вкладка навигации, содержимое которой импортируется и строится при первом показе.
 
-''')
+    Панель вкладок видна сразу; модуль содержимого импортируется в следующем
+    кадре после перехода на вкладку (или при явном load()), так что ни первый
+    кадр приложения, ни нажатие на вкладку его не ждут. on_enter вкладки
+    передаётся содержимому.
+    """
 
-# Классы для вкладок навигации
-class DiagnosisTab(MDBottomNavigationItem):
-    def __init__(self, **kwargs):
+    def __init__(self, module, class_name, **kwargs):
         super().__init__(**kwargs)
-        # Создаем и добавляем экран камеры при инициализации
-        camera_screen = CameraScreen()
-        self.add_widget(camera_screen)
+        self.module = module
+        self.class_name = class_name
+        self.content = None
+
+    def load(self):
+        """Содержимое вкладки (создаётся при первом вызове)"""
+        if self.content is None:
+            started = time.perf_counter()
+            content_class = getattr(importlib.import_module(self.module), self.class_name)
+            self.content = content_class()
+            self.add_widget(self.content)
+            app = MDApp.get_running_app()
+            duration = app.startup.measure(f"tab:{self.name}", started)
+            print(f"✅ Вкладка '{self.text}' построена за {duration * 1000:.0f} мс")
+            if self.manager and self.manager.current == self.name:
+                self.content.dispatch('on_enter')
+        return self.content
+
+    def on_enter(self, *args):
+        if self.content is None:
+            Clock.schedule_once(lambda dt: self.load())
+        else:
+            self.content.dispatch('on_enter')
 
 
+class DiagnosisTab(LazyTab):
+    def on_tab_press(self, *args):
+        super().on_tab_press(*args)
+        MDApp.get_running_app().models.preload()
+
 
 class MainScreen(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
+        self.tabs = {}
         
     def on_enter(self):
         """Вызывается при переходе на экран"""
-        self._setup_navigation()
-    
-    def _setup_navigation(self):
-        """Настройка нижней панели навигации"""
-        bottom_nav = self.ids.bottom_nav
+        # Вкладки создаются один раз: повторный вход на экран не плодит их
+        # (и экраны камеры) заново
+        if not self.tabs:
+            self._setup_navigation()
 
-        # Добавляем вкладки
-        bottom_nav.add_widget(DiagnosisTab())
-        bottom_nav.add_widget(CatalogTab())
-        # bottom_nav.add_widget(OrdersTab())
-        bottom_nav.add_widget(SettingsTab())
+    @property
+    def catalog_tab(self):
+        """Содержимое вкладки каталога (строится при первом обращении)"""
+        return self.tabs['catalog'].load() if self.tabs else None
 
     def set_diagnosis_filters(self, species_list, disease_list):
         """Передать фильтры в CatalogTab и переключить вкладку"""
-        bottom_nav = self.ids.bottom_nav
-        # Найти вкладку CatalogTab по имени (name='catalog')
-        for child in bottom_nav.children:
-            if hasattr(child, 'name') and child.name == 'catalog':
-                child.set_diagnosis_filters(species_list, disease_list)
-                break
-        bottom_nav.switch_tab('catalog')
+        self.catalog_tab.set_diagnosis_filters(species_list, disease_list)
+        self.ids.bottom_nav.switch_tab('catalog')
     
     def _setup_navigation(self):
+        """Настройка нижней панели навигации"""
         bottom_nav = self.ids.bottom_nav
-        self.catalog_tab = CatalogTab()
-        bottom_nav.add_widget(DiagnosisTab())
-        bottom_nav.add_widget(self.catalog_tab)
-        bottom_nav.add_widget(SettingsTab())
+        for name, text, icon, module, class_name in TABS:
+            tab_class = DiagnosisTab if name == 'diagnosis' else LazyTab
+            self.tabs[name] = tab_class(module, class_name, name=name, text=text, icon=icon)
+            bottom_nav.add_widget(self.tabs[name])
 
     def switch_to_catalog_with_filters(self, species_list, disease_list):
         if self.catalog_tab:
             self.catalog_tab.set_diagnosis_filters(species_list, disease_list)
             # Принудительно обновляем каталог с новыми фильтрами
             self.catalog_tab.refresh_data()
-        self.ids.bottom_nav.switch_tab('catalog')
\ No newline at end of file
+        self.ids.bottom_nav.switch_tab('catalog')
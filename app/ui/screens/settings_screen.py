@@ -1,6 +1,5 @@
 from kivy.lang import Builder
 from kivy.uix.screenmanager import Screen
-from kivymd.uix.bottomnavigation import MDBottomNavigationItem
 from kivymd.uix.boxlayout import MDBoxLayout
 from kivymd.uix.button import MDRaisedButton, MDFlatButton
 from kivymd.uix.dialog import MDDialog
@@ -12,6 +11,11 @@ from kivy.uix.widget import Widget
 from kivy.clock import Clock
 from kivymd.app import MDApp
 import pandas as pd
+from contextlib import closing
+from app.core.catalog_export import export_catalog
+from app.core.descriptions import import_descriptions
+from app.core.price_list import PriceListImporter, PriceListUpdater, open_price_list, parse_composition
+from app.ui.task_progress import run_in_background
 import os
 from kivy.metrics import dp
 from kivy.properties import StringProperty
@@ -23,12 +27,19 @@ else:
     import tkinter.filedialog as filedialog
     import tkinter as Tk
 
+# Подписи полей в сводке обновления прайс-листа
+UPDATE_CHANGE_LABELS = {
+    'price': "цена",
+    'application_rate': "норма расхода",
+    'packaging': "упаковка",
+    'manufacturer': "производитель",
+    'pesticide_type_id': "тип",
+    'substances': "состав",
+}
 
 Builder.load_string('''
 <SettingsTab>:
     name: 'settings'
-    text: 'Импорт/Экспорт'
-    icon: 'database-export'
 
     MDBoxLayout:
         orientation: 'vertical'
@@ -106,7 +117,7 @@ class ImportExportDialog(MDBoxLayout):
         self.confirm_callback = confirm_callback
         self.cancel_callback = cancel_callback
 
-class SettingsTab(MDBottomNavigationItem):
+class SettingsTab(Screen):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.dialog = None
@@ -337,86 +348,17 @@ class SettingsTab(MDBottomNavigationItem):
         self._import_descriptions(selected)
 
     def _import_descriptions(self, selected_sheets):
-        """Парсинг выбранных листов описаний, сохранение в БД (в транзакции)"""
-        try:
-            app = MDApp.get_running_app()
-            db = app.db
-            cursor = db.connection.cursor()
-            cursor.execute("BEGIN TRANSACTION")
-
-            total_updated = 0
-            not_found_list = []   # (название, причина)
-
-            for sheet_name in selected_sheets:
-                df = pd.read_excel(self.current_import_file, sheet_name=sheet_name, header=0)
-                required = ['Название', 'Культуры', 'Болезни', 'Описание']
-                if not all(col in df.columns for col in required):
-                    missing = [col for col in required if col not in df.columns]
-                    found = [col for col in df.columns if col in required]
-                    not_found_list.append((
-                        f"Лист '{sheet_name}'",
-                        f"Отсутствуют колонки: {', '.join(missing)}.\nНайдены: {', '.join(found) if found else 'нет'}" ))
-                    continue
+        """Парсинг выбранных листов описаний в фоне (в транзакции); по завершении — отчёт"""
+        file_path = self.current_import_file
 
-                for _, row in df.iterrows():
-                    name = str(row['Название']).strip()
-                    if not name:
-                        continue
-                    cursor.execute("SELECT id, description FROM pesticides WHERE name = ?", (name,))
-                    res = cursor.fetchone()
-                    if not res:
-                        not_found_list.append((name, "Препарат не найден в БД"))
-                        continue
-
-                    pesticide_id = res['id']
-                    old_description = res['description'] or ""
-
-                    new_description = str(row['Описание']).strip() if pd.notna(row['Описание']) else ""
-                    cultures_str = str(row['Культуры']).strip() if pd.notna(row['Культуры']) else ""
-                    diseases_str = str(row['Болезни']).strip() if pd.notna(row['Болезни']) else ""
-
-                    has_changes = False
-
-                    if new_description != old_description:
-                        cursor.execute("UPDATE pesticides SET description = ? WHERE id = ?", (new_description, pesticide_id))
-                        has_changes = True
-
-                    if cultures_str:
-                        cursor.execute("DELETE FROM pesticide_cultures WHERE pesticide_id = ?", (pesticide_id,))
-                        culture_list = [c.strip() for c in cultures_str.split(',') if c.strip()]
-                        for cult_name in culture_list:
-                            culture_id = db.get_or_create_culture(cult_name, cursor=cursor)
-                            cursor.execute("INSERT OR IGNORE INTO pesticide_cultures (pesticide_id, culture_id) VALUES (?, ?)",
-                                        (pesticide_id, culture_id))
-                        has_changes = True
-
-                    if diseases_str:
-                        cursor.execute("DELETE FROM pesticide_diseases WHERE pesticide_id = ?", (pesticide_id,))
-                        disease_list = [d.strip() for d in diseases_str.split(',') if d.strip()]
-                        for dis_name in disease_list:
-                            disease_id = db.get_or_create_disease(dis_name, cursor=cursor)
-                            cursor.execute("INSERT OR IGNORE INTO pesticide_diseases (pesticide_id, disease_id) VALUES (?, ?)",
-                                        (pesticide_id, disease_id))
-                        has_changes = True
-
-                    if has_changes:
-                        total_updated += 1
-
-
-            self.current_import_stats = {
-                'cursor': cursor,
-                'updated': total_updated,
-                'not_found': not_found_list,
-            }
+        def on_done(stats):
+            self.current_import_stats = stats
             self.show_description_import_report_dialog()
 
-        except Exception as e:
-            if 'cursor' in locals():
-                cursor.execute("ROLLBACK")
-            self.show_message(f"Ошибка импорта описаний: {e}")
-            import traceback
-            traceback.print_exc()
-    
+        self._run_task("Импорт описаний",
+                       lambda db, progress: import_descriptions(db, file_path, selected_sheets, progress),
+                       on_done, "Ошибка импорта описаний")
+
     def show_description_import_report_dialog(self):
         """Диалог с отчётом импорта описаний"""
         stats = self.current_import_stats
@@ -487,9 +429,7 @@ class SettingsTab(MDBottomNavigationItem):
             self.close_dialog()
             return
         stats = self.current_import_stats
-        cursor = stats.get('cursor')
-        if cursor:
-            cursor.connection.commit()
+        self._finish_import_transaction(commit=True)
         self.close_dialog()
         self.show_message(f"Описания импортированы. Обновлено: {stats['updated']}, не найдено: {len(stats.get('not_found', []))}")
 
@@ -683,180 +623,35 @@ class SettingsTab(MDBottomNavigationItem):
             self.dialog.open()
 
     def process_selected_sheets(self, checkboxes):
-        """Сбор выбранных листов, парсинг с определением типа по строкам-разделителям"""
+        """Сбор выбранных листов, парсинг с определением типа по строкам-разделителям (в фоне)"""
         selected = [sheet for sheet, chk in checkboxes.items() if chk.active]
         if not selected:
             self.show_message("Ни одного листа не выбрано")
             return
         self.dialog.dismiss()
         self.skipped_items = []
-        try:
-            xl = pd.ExcelFile(self.current_import_file)
-            db = MDApp.get_running_app().db
-            cursor = db.connection.cursor()
-            report_lines = []
-            total_inserted = 0
-            total_skipped = 0
-            total_duplicates = 0
-            processed_sheets = 0
-            cursor.execute("BEGIN TRANSACTION")
-
-            # Словарь для определения типов по ключевым словам
-            type_variants = {
-                "ГЕРБИЦИДЫ": "Гербициды",
-                "ГЕРБЕЦИДЫ": "Гербициды",
-                "ИНСЕКТИЦИДЫ": "Инсектициды",
-                "ФУНГИЦИДЫ": "Фунгициды",
-                "ДЕСИКАНТЫ": "Десиканты",
-                "ПРОТРАВИТЕЛИ": "Протравители",
-                "ФУМИГАНТЫ": "Фумиганты",
-                "СПЕЦПРЕПАРАТЫ": "Спецпрепараты",
-                "РОДЕНТИЦИДЫ": "Родентициды"
-            }
-
-            for sheet_name in selected:
-                df = pd.read_excel(xl, sheet_name=sheet_name, header=None)
-                if df.empty:
-                    continue
-
-                # 1. Находим строку с заголовками (ищем "Препараты")
-                header_row = None
-                for idx, row in df.iterrows():
-                    first_cell = str(row.iloc[0]).strip()
-                    if first_cell == "№ п/п" or first_cell == "Препараты" or "препараты" in first_cell.lower():
-                        header_row = idx
-                        break
-                if header_row is None:
-                    report_lines.append(f"Лист '{sheet_name}': не найден заголовок, пропущен")
-                    continue
+        file_path = self.current_import_file
 
-                # 2. Получаем заголовки и обрезаем DataFrame до строк после заголовка
-                df.columns = df.iloc[header_row].astype(str).str.strip()
-                data_df = df.iloc[header_row + 1:].reset_index(drop=True)
-                # print(f"DEBUG: лист '{sheet_name}', строк данных: {len(data_df)}")
-                # Необходимые колонки
-                required = ['Препараты', 'Состав', 'Производитель', 'Упаковка',
-                            'Норма расхода, кг(л)/га', 'Цена за ед. (с НДС) в руб.']
-
-                # Проверяем наличие колонок (если нет – пробуем найти альтернативные названия)
-                if not all(col in df.columns for col in required):
-                    missing = [col for col in required if col not in df.columns]
-                    found = [col for col in df.columns if col in required]
-                    report_lines.append(
-                        f"Лист '{sheet_name}': не найдены необходимые колонки.\n"
-                        f"   Ожидались: {', '.join(required)}\n"
-                        f"   Найдены: {', '.join(found) if found else 'нет'}\n"
-                        f"   Отсутствуют: {', '.join(missing)}"
-                    )
-                    continue
+        def run(db, progress):
+            importer = PriceListImporter(db)
+            # Листы читаются потоком, кусками — файл не загружается в память целиком
+            with closing(open_price_list(file_path, selected, progress)) as sheets:
+                stats = importer.run(sheets, progress)
+            return stats, importer.skipped_items
 
-                sheet_inserted = 0
-                sheet_skipped = 0
-                sheet_duplicates = 0
-
-                # 3. Идём по строкам данных, отслеживая текущий тип
-                current_type = None
-                for idx, row in data_df.iterrows():
-                    first_cell = str(row.iloc[0]).strip().upper()
-                    # Проверяем, является ли строка разделителем (типом)
-                    if first_cell in type_variants:
-                        current_type = type_variants[first_cell]
-                        continue  # пропускаем строку-разделитель
-
-                    # Пропускаем пустые строки
-                    if pd.isna(row['Препараты']) or str(row['Препараты']).strip() == "":
-                        continue
-
-                    name = str(row['Препараты']).strip()
-                    composition = str(row['Состав']).strip() if pd.notna(row['Состав']) else ""
-                    manufacturer = str(row['Производитель']).strip() if pd.notna(row['Производитель']) else ""
-                    packaging = str(row['Упаковка']).strip() if pd.notna(row['Упаковка']) else ""
-                    rate = str(row['Норма расхода, кг(л)/га']).strip() if pd.notna(row['Норма расхода, кг(л)/га']) else ""
-                    price_str = str(row['Цена за ед. (с НДС) в руб.']).strip() if pd.notna(row['Цена за ед. (с НДС) в руб.']) else ""
-                    try:
-                        price = float(price_str.replace(',', '.'))
-                    except:
-                        sheet_skipped += 1
-                        self.skipped_items.append((sheet_name, name, "Неверная цена (не число или 'по запросу')"))
-                        continue
-
-                    # Если тип не определён, используем название листа как fallback
-                    if not current_type:
-                        ptype = type_variants.get(sheet_name.strip().upper(), sheet_name.capitalize())
-                    else:
-                        ptype = current_type
-
-                    # Вставляем тип, если его нет
-                    cursor.execute("SELECT id FROM pesticide_types WHERE type_name = ?", (ptype,))
-                    res = cursor.fetchone()
-                    if not res:
-                        cursor.execute("INSERT INTO pesticide_types (type_name) VALUES (?)", (ptype,))
-                        type_id = cursor.lastrowid
-                    else:
-                        type_id = res[0]
-
-                    # Проверка дубликата по имени
-                    cursor.execute("SELECT id FROM pesticides WHERE name = ?", (name,))
-                    if cursor.fetchone():
-                        # print(f"DEBUG: дубликат (импорт): '{name}' уже существует в БД или был добавлен ранее в этой транзакции")
-                        sheet_duplicates += 1
-                        self.skipped_items.append((sheet_name, name, "Дубликат в файле"))
-                        continue
-
-                    # Вставляем препарат
-                    cursor.execute('''
-                        INSERT INTO pesticides (name, description, application_rate, packaging, price, manufacturer, pesticide_type_id)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
-                    ''', (name, "", rate, packaging, price, manufacturer, type_id))
-                    pesticide_id = cursor.lastrowid
-
-                    # Обработка действующих веществ
-                    substances = self._parse_substances(composition)
-                    seen = set()
-                    for substance_name, concentration in substances:
-                        if not substance_name:
-                            continue
-                        key = (substance_name, concentration)
-                        if key in seen:
-                            continue
-                        seen.add(key)
-                        cursor.execute("SELECT id FROM active_substances WHERE substance_name = ?", (substance_name,))
-                        res = cursor.fetchone()
-                        if not res:
-                            cursor.execute("INSERT INTO active_substances (substance_name) VALUES (?)", (substance_name,))
-                            substance_id = cursor.lastrowid
-                        else:
-                            substance_id = res[0]
-                        cursor.execute("SELECT 1 FROM pesticide_active_substances WHERE pesticide_id = ? AND substance_id = ?", (pesticide_id, substance_id))
-                        if not cursor.fetchone():
-                            cursor.execute('''
-                                INSERT INTO pesticide_active_substances (pesticide_id, substance_id, concentration)
-                                VALUES (?, ?, ?)
-                            ''', (pesticide_id, substance_id, concentration))
-
-                    sheet_inserted += 1
-
-                total_inserted += sheet_inserted
-                total_skipped += sheet_skipped
-                total_duplicates += sheet_duplicates
-                processed_sheets += 1
-                report_lines.append(f"Лист '{sheet_name}': добавлено {sheet_inserted}, пропущено (цена) {sheet_skipped}, дубликатов {sheet_duplicates}")
-
-            self.current_import_stats = {
-                'report': report_lines,
-                'inserted': total_inserted,
-                'skipped': total_skipped,
-                'duplicates': total_duplicates,
-                'sheets': processed_sheets,
-                'cursor': cursor
-            }
+        def on_done(result):
+            self.current_import_stats, self.skipped_items = result
             self.show_import_report_dialog()
-        except Exception as e:
-            if 'cursor' in locals():
-                cursor.execute("ROLLBACK")
-            self.show_message(f"Ошибка при парсинге: {e}")
-            import traceback
-            traceback.print_exc()
+
+        self._run_task("Импорт прайс-листа", run, on_done, "Ошибка при парсинге")
+
+    def _run_task(self, title, run, on_done, error_text):
+        """run(db, progress) в фоне с диалогом прогресса; ошибки и отмена — сообщением"""
+        started = run_in_background(title, run, on_done,
+                                    on_error=lambda e: self.show_message(f"{error_text}: {e}"),
+                                    on_cancelled=lambda: self.show_message(f"{title}: отменено"))
+        if not started:
+            self.show_message("Дождитесь завершения текущей операции")
 
     def show_import_report_dialog(self):
         """Диалог с отчётом и кнопками подтверждения/отмены"""
@@ -941,9 +736,7 @@ class SettingsTab(MDBottomNavigationItem):
             self.close_dialog()
             return
         stats = self.current_import_stats
-        cursor = stats.get('cursor')
-        if cursor:
-            cursor.connection.commit()
+        self._finish_import_transaction(commit=True)
         self.close_dialog()
 
         # Формируем сообщение в зависимости от типа операции
@@ -1111,232 +904,20 @@ class SettingsTab(MDBottomNavigationItem):
             return
         self.dialog.dismiss()
         self.skipped_items = []
-        try:
-            xl = pd.ExcelFile(self.current_import_file)
-            db = MDApp.get_running_app().db
-            cursor = db.connection.cursor()
-            cursor.execute("BEGIN TRANSACTION")
-
-            # Загружаем существующие препараты
-            cursor.execute("SELECT id, name, price, application_rate, packaging, manufacturer, pesticide_type_id, description FROM pesticides")
-            existing = {}
-            for row in cursor.fetchall():
-                existing[row['name']] = {
-                    'id': row['id'],
-                    'price': row['price'],
-                    'application_rate': row['application_rate'],
-                    'packaging': row['packaging'],
-                    'manufacturer': row['manufacturer'],
-                    'pesticide_type_id': row['pesticide_type_id'],
-                    'description': row['description']
-                }
-            cursor.execute("SELECT id, type_name FROM pesticide_types")
-            type_map = {row['type_name']: row['id'] for row in cursor.fetchall()}
-
-            type_variants = {
-                "ГЕРБИЦИДЫ": "Гербициды",
-                "ГЕРБЕЦИДЫ": "Гербициды",
-                "ИНСЕКТИЦИДЫ": "Инсектициды",
-                "ФУНГИЦИДЫ": "Фунгициды",
-                "ДЕСИКАНТЫ": "Десиканты",
-                "ПРОТРАВИТЕЛИ": "Протравители",
-                "ФУМИГАНТЫ": "Фумиганты",
-                "СПЕЦПРЕПАРАТЫ": "Спецпрепараты",
-                "РОДЕНТИЦИДЫ": "Родентициды"
-            }
-
-            report_lines = []
-            total_new = 0
-            total_updated = 0
-            total_unchanged = 0
-            total_skipped = 0
-            processed_sheets = 0
-
-            for sheet_name in selected:
-                df = pd.read_excel(xl, sheet_name=sheet_name, header=None)
-                if df.empty:
-                    continue
-
-                # Находим строку с заголовками
-                header_row = None
-                for idx, row in df.iterrows():
-                    first_cell = str(row.iloc[0]).strip()
-                    if first_cell in ("№ п/п", "Препараты") or "препараты" in first_cell.lower():
-                        header_row = idx
-                        break
-                if header_row is None:
-                    report_lines.append(f"Лист '{sheet_name}': не найден заголовок, пропущен")
-                    continue
+        file_path = self.current_import_file
 
-                df.columns = df.iloc[header_row].astype(str).str.strip()
-                data_df = df.iloc[header_row + 1:].reset_index(drop=True)
-                # print(f"DEBUG: лист '{sheet_name}', строк данных: {len(data_df)}")
-                required = ['Препараты', 'Состав', 'Производитель', 'Упаковка',
-                            'Норма расхода, кг(л)/га', 'Цена за ед. (с НДС) в руб.']
-                if not all(col in data_df.columns for col in required):
-                    missing = [col for col in required if col not in data_df.columns]
-                    found = [col for col in data_df.columns if col in required]
-                    report_lines.append(
-                        f"Лист '{sheet_name}': не найдены необходимые колонки.\n"
-                        f"   Ожидались: {', '.join(required)}\n"
-                        f"   Найдены: {', '.join(found) if found else 'нет'}\n"
-                        f"   Отсутствуют: {', '.join(missing)}"
-                    )
-                    continue
+        def run(db, progress):
+            updater = PriceListUpdater(db)
+            # Листы читаются потоком, кусками — файл не загружается в память целиком
+            with closing(open_price_list(file_path, selected, progress)) as sheets:
+                stats = updater.run(sheets, progress)
+            return stats, updater.skipped_items
 
-                sheet_new = 0
-                sheet_updated = 0
-                sheet_unchanged = 0
-                sheet_skipped = 0
-                current_type = None
-
-                for _, row in data_df.iterrows():
-                    first_cell = str(row.iloc[0]).strip().upper()
-                    # Проверяем, является ли строка разделителем
-                    if first_cell in type_variants:
-                        current_type = type_variants[first_cell]
-                        continue
-
-                    # Пропускаем пустые строки
-                    if pd.isna(row['Препараты']) or str(row['Препараты']).strip() == "":
-                        continue
-
-                    name = str(row['Препараты']).strip()
-                    composition = str(row['Состав']).strip() if pd.notna(row['Состав']) else ""
-                    manufacturer = str(row['Производитель']).strip() if pd.notna(row['Производитель']) else ""
-                    packaging = str(row['Упаковка']).strip() if pd.notna(row['Упаковка']) else ""
-                    rate = str(row['Норма расхода, кг(л)/га']).strip() if pd.notna(row['Норма расхода, кг(л)/га']) else ""
-                    price_str = str(row['Цена за ед. (с НДС) в руб.']).strip() if pd.notna(row['Цена за ед. (с НДС) в руб.']) else ""
-                    try:
-                        price = float(price_str.replace(',', '.'))
-                    except:
-                        sheet_skipped += 1
-                        self.skipped_items.append((sheet_name, name, "Некорректная цена."))
-                        continue
-
-                    # Определяем тип: если current_type установлен, используем его, иначе fallback на имя листа
-                    if current_type:
-                        ptype = current_type
-                    else:
-                        ptype = type_variants.get(sheet_name.strip().upper(), sheet_name.capitalize())
-
-                    # Получаем type_id
-                    if ptype not in type_map:
-                        cursor.execute("INSERT INTO pesticide_types (type_name) VALUES (?)", (ptype,))
-                        type_id = cursor.lastrowid
-                        type_map[ptype] = type_id
-                    else:
-                        type_id = type_map[ptype]
-
-                    if name not in existing:
-                        # Новый препарат
-                        cursor.execute('''
-                            INSERT INTO pesticides (name, description, application_rate, packaging, price, manufacturer, pesticide_type_id)
-                            VALUES (?, ?, ?, ?, ?, ?, ?)
-                        ''', (name, "", rate, packaging, price, manufacturer, type_id))
-                        pesticide_id = cursor.lastrowid
-                        substances = self._parse_substances(composition)
-                        seen = set()
-                        for substance_name, concentration in substances:
-                            if not substance_name:
-                                continue
-                            key = (substance_name, concentration)
-                            if key in seen:
-                                continue
-                            seen.add(key)
-                            cursor.execute("SELECT id FROM active_substances WHERE substance_name = ?", (substance_name,))
-                            res = cursor.fetchone()
-                            if not res:
-                                cursor.execute("INSERT INTO active_substances (substance_name) VALUES (?)", (substance_name,))
-                                substance_id = cursor.lastrowid
-                            else:
-                                substance_id = res[0]
-                            cursor.execute("SELECT 1 FROM pesticide_active_substances WHERE pesticide_id = ? AND substance_id = ?", (pesticide_id, substance_id))
-                            if not cursor.fetchone():
-                                cursor.execute('''
-                                    INSERT INTO pesticide_active_substances (pesticide_id, substance_id, concentration)
-                                    VALUES (?, ?, ?)
-                                ''', (pesticide_id, substance_id, concentration))
-                        sheet_new += 1
-                        total_new += 1
-                        existing[name] = {'id': pesticide_id}
-                    else:
-                        # Обновление существующего
-                        old = existing[name]
-                        update_fields = []
-                        params = []
-                        if price != old['price']:
-                            update_fields.append("price = ?")
-                            params.append(price)
-                        if rate and rate != old['application_rate']:
-                            update_fields.append("application_rate = ?")
-                            params.append(rate)
-                        if packaging and packaging != old['packaging']:
-                            update_fields.append("packaging = ?")
-                            params.append(packaging)
-                        if manufacturer and manufacturer != old['manufacturer']:
-                            update_fields.append("manufacturer = ?")
-                            params.append(manufacturer)
-                        if ptype and old.get('pesticide_type_id') != type_id:
-                            update_fields.append("pesticide_type_id = ?")
-                            params.append(type_id)
-                        if update_fields:
-                            sql = f"UPDATE pesticides SET {', '.join(update_fields)} WHERE id = ?"
-                            params.append(old['id'])
-                            cursor.execute(sql, params)
-                            sheet_updated += 1
-                        else:
-                            sheet_unchanged += 1
-                        if composition:
-                            # Заменяем ДВ
-                            cursor.execute("DELETE FROM pesticide_active_substances WHERE pesticide_id = ?", (old['id'],))
-                            substances = self._parse_substances(composition)
-                            seen = set()
-                            for substance_name, concentration in substances:
-                                if not substance_name:
-                                    continue
-                                key = (substance_name, concentration)
-                                if key in seen:
-                                    continue
-                                seen.add(key)
-                                cursor.execute("SELECT id FROM active_substances WHERE substance_name = ?", (substance_name,))
-                                res = cursor.fetchone()
-                                if not res:
-                                    cursor.execute("INSERT INTO active_substances (substance_name) VALUES (?)", (substance_name,))
-                                    substance_id = cursor.lastrowid
-                                else:
-                                    substance_id = res[0]
-                                cursor.execute('''
-                                    INSERT INTO pesticide_active_substances (pesticide_id, substance_id, concentration)
-                                    VALUES (?, ?, ?)
-                                ''', (old['id'], substance_id, concentration))
-                            if not update_fields:
-                                sheet_updated += 1
-                                sheet_unchanged -= 1
-
-                processed_sheets += 1
-                total_new += sheet_new
-                total_updated += sheet_updated
-                total_unchanged += sheet_unchanged
-                total_skipped += sheet_skipped
-                report_lines.append(f"Лист '{sheet_name}': новых {sheet_new}, обновлено {sheet_updated}, без изменений {sheet_unchanged}, пропущено {sheet_skipped}")
-
-            self.current_import_stats = {
-                'report': report_lines,
-                'new': total_new,
-                'updated': total_updated,
-                'unchanged': total_unchanged,
-                'skipped': total_skipped,
-                'sheets': processed_sheets,
-                'cursor': cursor
-            }
+        def on_done(result):
+            self.current_import_stats, self.skipped_items = result
             self.show_update_report_dialog()
-        except Exception as e:
-            if 'cursor' in locals():
-                cursor.execute("ROLLBACK")
-            self.show_message(f"Ошибка при парсинге: {e}")
-            import traceback
-            traceback.print_exc()
+
+        self._run_task("Обновление цен", run, on_done, "Ошибка при парсинге")
 
     def show_update_report_dialog(self):
         """Диалог отчёта для обновления (аналогичный импорту)"""
@@ -1345,7 +926,14 @@ class SettingsTab(MDBottomNavigationItem):
         report_text += f"Новых препаратов: {stats['new']}\n"
         report_text += f"Обновлено: {stats['updated']}\n"
         report_text += f"Без изменений: {stats['unchanged']}\n"
-        report_text += f"Пропущено (неверная цена): {stats['skipped']}\n\n"
+        report_text += f"Пропущено (неверная цена): {stats['skipped']}\n"
+        if stats.get('repeated'):
+            report_text += f"Повторов в файле: {stats['repeated']}\n"
+        changes = [f"{label} — {stats['changes'][field]}" for field, label in UPDATE_CHANGE_LABELS.items()
+                   if stats.get('changes', {}).get(field)]
+        if changes:
+            report_text += "Изменено: " + ", ".join(changes) + "\n"
+        report_text += "\n"
         if stats.get('report'):
             report_text += "\nДетали по листам:\n" + "\n".join(stats['report'])
         label = MDLabel(
@@ -1517,53 +1105,18 @@ class SettingsTab(MDBottomNavigationItem):
     def cancel_import(self):
         """Отмена: откатываем транзакцию"""
         self.close_skipped_dialog()   # закрываем пропуски, если открыты
-        if hasattr(self, 'current_import_stats') and self.current_import_stats.get('cursor'):
-            self.current_import_stats['cursor'].execute("ROLLBACK")
+        if getattr(self, 'current_import_stats', None):
+            self._finish_import_transaction(commit=False)
         self.close_dialog()
         self.show_message("Импорт отменён.")
         self.current_import_stats = None
 
+    def _finish_import_transaction(self, commit):
+        """Зафиксировать или откатить транзакцию импорта; фоновые задачи снова принимаются"""
+        MDApp.get_running_app().tasks.finish(commit)
+
     def _parse_substances(self, composition_str):
-        if not composition_str:
-            return []
-        import re
-        # Разделяем по + или ; с пробелами
-        fragments = re.split(r'\s*[+;]\s*', composition_str)
-        result = []
-        conc_pattern = re.compile(r'([\d,\.]+\s*(?:г/кг|г/л|%|мг/кг|мг/л))')
-
-        for frag in fragments:
-            frag = frag.strip()
-            if not frag:
-                continue
-            match = conc_pattern.search(frag)
-            if match:
-                conc = match.group(1).strip()
-                # Убираем концентрацию из строки, остальное – название
-                name = frag[:match.start()].strip() + " " + frag[match.end():].strip()
-                name = name.strip()
-                if not name and result:
-                    # Если концентрация была в начале, а название не выделилось,
-                    # используем название предыдущего вещества (редкий случай)
-                    name = result[-1][0]
-                result.append((name, conc))
-            else:
-                # Нет концентрации – дописываем к последнему названию
-                if result:
-                    last_name, last_conc = result[-1]
-                    new_name = f"{last_name} {frag}".strip()
-                    result[-1] = (new_name, last_conc)
-                else:
-                    result.append((frag, ''))
-        # Удаляем дубликаты
-        seen = set()
-        unique = []
-        for name, conc in result:
-            key = (name, conc)
-            if key not in seen:
-                seen.add(key)
-                unique.append((name, conc))
-        return unique
+        return parse_composition(composition_str)
 
     def show_export_dialog(self, data_type):
         """Показать диалог экспорта"""
@@ -1595,89 +1148,26 @@ class SettingsTab(MDBottomNavigationItem):
     
     def export_full_catalog(self):
         self.close_dialog()  # закрываем диалог подтверждения
-        try:
-            app = MDApp.get_running_app()
-            db = app.db
-            cursor = db.connection.cursor()
-
-            # Получаем все препараты с типами
-            cursor.execute('''
-                SELECT p.id, p.name, p.description, p.application_rate, p.packaging,
-                    p.price, p.manufacturer, pt.type_name
-                FROM pesticides p
-                LEFT JOIN pesticide_types pt ON p.pesticide_type_id = pt.id
-                ORDER BY pt.type_name, p.name
-            ''')
-            pesticides = cursor.fetchall()
-
-            if not pesticides:
-                self.show_message("Нет данных для экспорта")
-                return
-
-            data_rows = []
-            for pest in pesticides:
-                pid = pest['id']
-                # Действующие вещества
-                cursor.execute('''
-                    SELECT s.substance_name, pas.concentration
-                    FROM pesticide_active_substances pas
-                    JOIN active_substances s ON pas.substance_id = s.id
-                    WHERE pas.pesticide_id = ?
-                ''', (pid,))
-                substances_list = [f"{row['substance_name']} {row['concentration']}" for row in cursor.fetchall()]
-                substances_str = "; ".join(substances_list) if substances_list else ""
-
-                # Культуры
-                cursor.execute('''
-                    SELECT c.culture_name
-                    FROM pesticide_cultures pc
-                    JOIN cultures c ON pc.culture_id = c.id
-                    WHERE pc.pesticide_id = ?
-                ''', (pid,))
-                cultures_list = [row['culture_name'] for row in cursor.fetchall()]
-                cultures_str = ", ".join(cultures_list) if cultures_list else ""
-
-                # Болезни
-                cursor.execute('''
-                    SELECT d.disease_name
-                    FROM pesticide_diseases pd
-                    JOIN diseases d ON pd.disease_id = d.id
-                    WHERE pd.pesticide_id = ?
-                ''', (pid,))
-                diseases_list = [row['disease_name'] for row in cursor.fetchall()]
-                diseases_str = ", ".join(diseases_list) if diseases_list else ""
-
-                data_rows.append({
-                    'Название': pest['name'],
-                    'Тип': pest['type_name'],
-                    'Действующие вещества': substances_str,
-                    'Описание': pest['description'] or '',
-                    'Норма расхода': pest['application_rate'] or '',
-                    'Фасовка': pest['packaging'] or '',
-                    'Цена, руб.': pest['price'],
-                    'Производитель': pest['manufacturer'] or '',
-                    'Культуры': cultures_str,
-                    'Болезни': diseases_str,
-                })
-
-            df = pd.DataFrame(data_rows)
-
-            def on_file_saved(file_path):
-                try:
-                    df.to_excel(file_path, index=False)
-                    self.show_message(f"Каталог сохранён: {os.path.basename(file_path)}")
-                except Exception as e:
-                    self.show_message(f"Ошибка сохранения: {e}")
-
-            self._save_file_dialog(
-                title="Сохранить каталог",
-                filters=[("Excel files", "*.xlsx")],
-                default_name="catalog_full.xlsx",
-                on_success=on_file_saved
-            )
-        except Exception as e:
-            self.show_message(f"Ошибка экспорта: {e}")
-    
+        app = MDApp.get_running_app()
+        if not app.db.connection.execute("SELECT 1 FROM pesticides LIMIT 1").fetchone():
+            self.show_message("Нет данных для экспорта")
+            return
+
+        def on_file_saved(file_path):
+            # Полный экспорт исторически пишется на лист 'Sheet1' — его читают по этому имени
+            self._run_task("Экспорт каталога",
+                           lambda db, progress: export_catalog(db, file_path, sort_by='type', progress=progress,
+                                                               sheet_name='Sheet1'),
+                           lambda count: self.show_message(f"Каталог сохранён: {os.path.basename(file_path)}"),
+                           "Ошибка экспорта")
+
+        self._save_file_dialog(
+            title="Сохранить каталог",
+            filters=[("Excel files", "*.xlsx"), ("CSV files", "*.csv")],
+            default_name="catalog_full.xlsx",
+            on_success=on_file_saved
+        )
+
     def export_data(self, data_type):
         """Заглушка для экспорта данных"""
         print(f" Экспорт {data_type} в Excel")
@@ -0,0 +1,69 @@
+from kivy.metrics import dp
+from kivymd.app import MDApp
+from kivymd.uix.boxlayout import MDBoxLayout
+from kivymd.uix.button import MDFlatButton
+from kivymd.uix.dialog import MDDialog
+from kivymd.uix.label import MDLabel
+from kivymd.uix.progressbar import MDProgressBar
+
+
+class TaskProgressDialog:
+    """Диалог хода фоновой задачи: этап, полоса прогресса и кнопка «Отмена»"""
+
+    def __init__(self, title, on_cancel):
+        self.on_cancel = on_cancel
+        self.status_label = MDLabel(text="Подготовка...", font_style="Caption", size_hint_y=None, height=dp(20))
+        self.progress_bar = MDProgressBar(value=0, size_hint_y=None, height=dp(8))
+        content = MDBoxLayout(orientation='vertical', spacing=dp(10), size_hint_y=None, height=dp(48),
+                              padding=[dp(10), dp(5), dp(10), dp(5)])
+        content.add_widget(self.status_label)
+        content.add_widget(self.progress_bar)
+        self.cancel_button = MDFlatButton(
+            text="Отмена",
+            theme_text_color="Custom",
+            text_color="white",
+            md_bg_color="green",
+            on_release=lambda x: self.cancel()
+        )
+        self.dialog = MDDialog(title=title, type="custom", content_cls=content, buttons=[self.cancel_button],
+                               size_hint=(0.9, None), auto_dismiss=False)
+
+    def open(self):
+        self.dialog.open()
+
+    def dismiss(self):
+        self.dialog.dismiss()
+
+    def update(self, stage, done, total):
+        self.status_label.text = f"{stage}: {done} из {total}" if total > 1 else stage
+        self.progress_bar.value = min(100, 100 * done / total) if total else 0
+
+    def cancel(self):
+        self.cancel_button.disabled = True
+        self.status_label.text = "Отмена..."
+        self.on_cancel()
+
+
+def run_in_background(title, run, on_done, on_error=None, on_cancelled=None):
+    """Запустить run(db, progress) через app.tasks с диалогом прогресса.
+
+    Колбэки вызываются в потоке UI после закрытия диалога. False — уже
+    выполняется другая фоновая задача.
+    """
+    tasks = MDApp.get_running_app().tasks
+    dialog = TaskProgressDialog(title, on_cancel=tasks.cancel)
+
+    def closing(callback):
+        def finish(*args):
+            dialog.dismiss()
+            if callback:
+                callback(*args)
+        return finish
+
+    task = tasks.submit(run, on_progress=dialog.update, on_done=closing(on_done),
+                        on_error=closing(on_error), on_cancelled=closing(on_cancelled))
+    if task is None:
+        return False
+    # Колбэки задачи приходят через Clock — не раньше следующего кадра, то есть после open()
+    dialog.open()
+    return True
@@ -0,0 +1,17 @@
+from kivy.clock import Clock
+
+
+def post(callback):
+    """Выполнить callback() в потоке UI, в следующем кадре.
+
+    Ядро (TaskRunner, InferenceJobManager) вызывает колбэки из рабочих
+    потоков и ничего не знает о Kivy; экраны передают ему post/on_ui_thread.
+    """
+    Clock.schedule_once(lambda dt: callback())
+
+
+def on_ui_thread(function):
+    """Колбэк для ядра: function(*args) выполнится в потоке UI"""
+    def callback(*args):
+        post(lambda: function(*args))
+    return callback
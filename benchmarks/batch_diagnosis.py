@@ -0,0 +1,55 @@
+"""Масштабирование пакетной диагностики по ядрам.
+
+Запуск из корня репозитория:
+    python -m benchmarks.batch_diagnosis --images photos/
+    python -m benchmarks.batch_diagnosis --images photos/ --workers 1 2 4 8 --batch-size 16 --limit 500
+
+Одна и та же выборка прогоняется через run_batch с разным числом процессов
+(результаты — во временный CSV, каждый прогон с нуля). Печатается
+пропускная способность в изображениях в секунду и ускорение относительно
+первого прогона. Время включает запуск процессов и загрузку моделей.
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from app.core.config import AppConfig
+from app.ml.batch_diagnosis import BATCH_SIZE, default_workers, run_batch
+
+
+def worker_counts():
+    """1, 2, 4, ... до числа ядер включительно"""
+    counts, count = [], 1
+    while count < default_workers():
+        counts.append(count)
+        count *= 2
+    return counts + [default_workers()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пакетной диагностики по числу процессов")
+    parser.add_argument("--images", required=True, help="папка с фото")
+    parser.add_argument("--workers", type=int, nargs="+", default=worker_counts())
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--limit", type=int, default=400, help="изображений на прогон")
+    parser.add_argument("--models-dir", default=str(AppConfig().models_dir))
+    args = parser.parse_args()
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in args.workers:
+            stats = run_batch(args.images, Path(tmp) / f"results_{workers}.csv", workers=workers,
+                              batch_size=args.batch_size, models_dir=args.models_dir, limit=args.limit)
+            if stats['interrupted'] or not stats['images']:
+                print(f"❌ Прогон с {workers} процессами не завершён")
+                return
+            rows.append((stats['workers'], stats['images'], stats['images_per_second']))
+
+    base = rows[0][2]
+    print(f"{'процессов':>10} {'изображений':>12} {'изобр/с':>9} {'ускорение':>10}")
+    for workers, images, rate in rows:
+        print(f"{workers:>10} {images:>12} {rate:>9.1f} {rate / base:>9.2f}×")
+
+
+if __name__ == "__main__":
+    main()
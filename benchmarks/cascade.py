@@ -0,0 +1,74 @@
+"""Сравнение каскадного режима с однопроходным 512×512.
+
+Запуск из корня репозитория:
+    python -m benchmarks.cascade --images photos/
+    python -m benchmarks.cascade --images photos/ --size 224
+
+Печатает среднюю задержку обоих режимов, долю ранних выходов на
+уменьшенном разрешении и совпадение top-1 (вид / болезнь) каскада
+с однопроходным режимом.
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import AppConfig
+from app.ml.inference import PlantModel
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+
+def run(model, paths, cascade):
+    """Прогон всех изображений в одном режиме"""
+    model.config.cascade_enabled = cascade
+    timings, results = [], []
+    for path in paths:
+        start = time.perf_counter()
+        results.append(model.predict(path))
+        timings.append(time.perf_counter() - start)
+    return timings, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк каскадного режима диагностики")
+    parser.add_argument("--images", required=True, help="папка с фото")
+    parser.add_argument("--size", type=int, default=256, help="сторона уменьшенного входа каскада")
+    parser.add_argument("--models-dir", default=str(AppConfig().models_dir))
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    paths = sorted(str(p) for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    paths = paths[:args.limit]
+    if not paths:
+        parser.error(f"в папке {args.images} нет изображений")
+
+    config = AppConfig()
+    config.models_dir = Path(args.models_dir)
+    config.cascade_size = (args.size, args.size)
+    config.lazy_mask_overlay = True
+    model = PlantModel(config)   # без кэша диагнозов: каждый прогон честный
+    if not model.load_models():
+        return
+    if not model.supports_cascade():
+        print("❌ У моделей фиксированное разрешение входа: каскад недоступен")
+        return
+    model.warm_up()
+
+    single_times, single = run(model, paths, cascade=False)
+    cascade_times, cascade = run(model, paths, cascade=True)
+
+    early = sum(r["inference_path"] == "low_res" for r in cascade)
+    species_agreement = np.mean([a["species_idx"] == b["species_idx"] for a, b in zip(single, cascade)])
+    disease_agreement = np.mean([a["disease_idx"] == b["disease_idx"] for a, b in zip(single, cascade)])
+
+    print(f"Изображений: {len(paths)}, каскад: {args.size}×{args.size} -> 512×512")
+    print(f"Однопроходный режим: {np.mean(single_times) * 1000:.1f} мс/изобр.")
+    print(f"Каскад:              {np.mean(cascade_times) * 1000:.1f} мс/изобр.")
+    print(f"Ранний выход:        {early} из {len(paths)} ({early / len(paths):.1%})")
+    print(f"Совпадение top-1:    вид {species_agreement:.3f}, болезнь {disease_agreement:.3f}")
+
+
+if __name__ == "__main__":
+    main()
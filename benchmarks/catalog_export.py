@@ -0,0 +1,91 @@
+"""Экспорт каталога: сборка строк и запись файла.
+
+Запуск из корня репозитория:
+    python -m benchmarks.catalog_export
+    python -m benchmarks.catalog_export --products 50000 --db /tmp/catalog_bench.db --out /tmp/catalog_export
+
+Сборка строк: прежняя схема (три запроса на каждый препарат) против
+iter_catalog_export (три GROUP BY на всю выборку). Запись: export_catalog в
+.xlsx (write-only) и .csv — время и пик памяти (tracemalloc, отдельным
+прогоном, т.к. он замедляет запись).
+"""
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+from app.core.catalog_export import export_catalog
+from benchmarks.synthetic_catalog import build_catalog, open_database
+
+
+def legacy_rows(db):
+    """Прежняя схема: препараты одним запросом, вещества, культуры и болезни — запросом на каждый"""
+    cursor = db.connection.cursor()
+    pesticides = cursor.execute('''
+        SELECT p.id, p.name, p.description, p.application_rate, p.packaging, p.price, p.manufacturer, pt.type_name
+        FROM pesticides p LEFT JOIN pesticide_types pt ON p.pesticide_type_id = pt.id
+        ORDER BY pt.type_name, p.name
+    ''').fetchall()
+    rows = []
+    for pest in pesticides:
+        pid = pest['id']
+        substances = cursor.execute('''
+            SELECT s.substance_name, pas.concentration FROM pesticide_active_substances pas
+            JOIN active_substances s ON pas.substance_id = s.id WHERE pas.pesticide_id = ?
+        ''', (pid,)).fetchall()
+        cultures = cursor.execute('''
+            SELECT c.culture_name FROM pesticide_cultures pc
+            JOIN cultures c ON pc.culture_id = c.id WHERE pc.pesticide_id = ?
+        ''', (pid,)).fetchall()
+        diseases = cursor.execute('''
+            SELECT d.disease_name FROM pesticide_diseases pd
+            JOIN diseases d ON pd.disease_id = d.id WHERE pd.pesticide_id = ?
+        ''', (pid,)).fetchall()
+        rows.append((pest['name'], pest['type_name'],
+                     "; ".join(f"{row['substance_name']} {row['concentration']}" for row in substances),
+                     pest['description'] or '', pest['application_rate'] or '', pest['packaging'] or '',
+                     pest['price'], pest['manufacturer'] or '',
+                     ", ".join(row['culture_name'] for row in cultures),
+                     ", ".join(row['disease_name'] for row in diseases)))
+    return len(rows)
+
+
+def set_based_rows(db):
+    return sum(1 for _ in db.iter_catalog_export(sort_by='type'))
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк экспорта каталога")
+    parser.add_argument("--db", default="/tmp/catalog_bench.db")
+    parser.add_argument("--products", type=int, default=50000, help="размер каталога, если БД создаётся")
+    parser.add_argument("--out", default="/tmp/catalog_export")
+    args = parser.parse_args()
+
+    db = open_database(args.db) if Path(args.db).exists() else build_catalog(args.db, args.products)
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+
+    for title, assemble in (("построчно", legacy_rows), ("GROUP BY", set_based_rows)):
+        count, elapsed = timed(assemble, db)
+        print(f"Сборка строк, {title:>9}: {count} за {elapsed:6.2f} с — {count / elapsed:8.0f} строк/с")
+
+    for suffix in (".xlsx", ".csv"):
+        path = out / f"catalog{suffix}"
+        count, elapsed = timed(export_catalog, db, path)
+        tracemalloc.start()
+        export_catalog(db, path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"Экспорт {suffix:>5}: {count} строк за {elapsed:6.2f} с — {count / elapsed:8.0f} строк/с,"
+              f" пик памяти {peak / 2 ** 20:6.1f} МБ")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""Число SQL-запросов и задержка страниц каталога.
+
+Запуск из корня репозитория:
+    python -m benchmarks.catalog_queries
+    python -m benchmarks.catalog_queries --db /tmp/catalog.db --products 50000
+
+Если БД не существует, она создаётся (benchmarks/synthetic_catalog.py).
+Глубокие страницы меряются двумя способами: LIMIT/OFFSET и курсором (after).
+Для сравнения печатается стоимость прежней схемы — отдельного подзапроса
+веществ на каждую строку страницы (только сами подзапросы).
+"""
+import argparse
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_catalog import build_catalog, open_database
+
+LEGACY_SUBSTANCES_SQL = """
+    SELECT GROUP_CONCAT(a.substance_name || ' ' || pas.concentration, '||')
+    FROM pesticide_active_substances pas
+    JOIN active_substances a ON pas.substance_id = a.id
+    WHERE pas.pesticide_id = ?
+"""
+
+
+class QueryCounter:
+    """Считает SQL-запросы соединения через trace callback"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.count = 0
+
+    def __enter__(self):
+        self.count = 0
+        self.connection.set_trace_callback(self._trace)
+        return self
+
+    def __exit__(self, *exc):
+        self.connection.set_trace_callback(None)
+
+    def _trace(self, statement):
+        self.count += 1
+
+
+def legacy_substances(db, ids):
+    """Прежняя схема: отдельный запрос веществ на каждую строку страницы"""
+    cursor = db.connection.cursor()
+    rows = []
+    for pesticide_id in ids:
+        cursor.execute(LEGACY_SUBSTANCES_SQL, (pesticide_id,))
+        rows.append(cursor.fetchone()[0] or '')
+    return rows
+
+
+def deep_cursor(db, position, sort_by='name', sort_order='asc'):
+    """Курсор строки на позиции position — как после долгой прокрутки"""
+    row = db.get_pesticides_paginated(offset=position - 1, limit=1, sort_by=sort_by, sort_order=sort_order)[0]
+    return db.catalog_cursor(row, sort_by)
+
+
+def measure(db, load, repeat, **kwargs):
+    """Среднее время и число запросов одной загрузки страницы"""
+    timings = []
+    with QueryCounter(db.connection) as counter:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = load(**kwargs)
+            timings.append(time.perf_counter() - start)
+    return len(rows), counter.count // repeat, 1000 * sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запросов каталога")
+    parser.add_argument("--db", default="/tmp/catalog_bench.db")
+    parser.add_argument("--products", type=int, default=50000)
+    parser.add_argument("--page", type=int, default=20, help="размер страницы прокрутки")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if Path(args.db).exists():
+        db = open_database(args.db)
+    else:
+        db = build_catalog(args.db, args.products)
+    total = db.connection.execute("SELECT COUNT(*) FROM pesticides").fetchone()[0]
+    print(f"Препаратов в каталоге: {total}")
+
+    cases = [
+        ("первая страница", dict(offset=0, limit=args.page)),
+        ("глубокая (offset)", dict(offset=total - args.page, limit=args.page)),
+        ("глубокая (курсор)", dict(limit=args.page, after=deep_cursor(db, total - args.page))),
+        ("по цене", dict(offset=0, limit=args.page, sort_by='price', sort_order='desc')),
+        ("по цене (курсор)", dict(limit=args.page, sort_by='price', sort_order='desc',
+                                  after=deep_cursor(db, total - args.page, sort_by='price', sort_order='desc'))),
+        ("экспорт", dict(offset=0, limit=100000)),
+    ]
+    for title, kwargs in cases:
+        repeat = 1 if kwargs['limit'] > 1000 else args.repeat
+        rows, queries, ms = measure(db, db.get_pesticides_paginated, repeat, **kwargs)
+        ids = [row['id'] for row in db.get_pesticides_paginated(**kwargs)]
+        _, legacy_queries, legacy_ms = measure(db, lambda: legacy_substances(db, ids), repeat)
+        print(f"{title:>18}: {rows:>6} строк | {queries} запрос, {ms:8.1f} мс"
+              f" | прежде дополнительно: {legacy_queries} запросов, {legacy_ms:8.1f} мс")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Задержка поиска по каталогу в зависимости от его размера.
+
+Запуск из корня репозитория:
+    python -m benchmarks.catalog_search
+    python -m benchmarks.catalog_search --sizes 5000 50000 --workdir /tmp
+
+Для каждого размера строится синтетический каталог (benchmarks/synthetic_catalog.py)
+и меряется первая страница поиска по FTS5 и прежним поиском подстрокой
+(LIKE по колонкам *_cf, как при сборке SQLite без FTS5), а также
+ранжированный search_pesticides.
+"""
+import argparse
+import time
+from pathlib import Path
+
+from benchmarks.synthetic_catalog import build_catalog, open_database
+
+QUERIES = ("альфа", "вещество-0042", "супер форте", "болезнь-0100")
+
+
+def measure(load, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = load()
+        timings.append(time.perf_counter() - start)
+    return len(rows), 1000 * sum(timings) / len(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска по каталогу")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5000, 50000])
+    parser.add_argument("--workdir", default="/tmp")
+    parser.add_argument("--page", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        path = Path(args.workdir) / f"catalog_search_{size}.db"
+        db = open_database(path) if path.exists() else build_catalog(path, size)
+        print(f"\nКаталог: {size} препаратов")
+        for query in QUERIES:
+            db.fts_enabled = True
+            rows, fts_ms = measure(lambda: db.get_pesticides_paginated(limit=args.page, search=query), args.repeat)
+            _, ranked_ms = measure(lambda: db.search_pesticides(query, limit=args.page), args.repeat)
+            db.fts_enabled = False
+            _, like_ms = measure(lambda: db.get_pesticides_paginated(limit=args.page, search=query), args.repeat)
+            print(f"{query:>16}: {rows:>3} строк | FTS {fts_ms:7.1f} мс | bm25 {ranked_ms:7.1f} мс"
+                  f" | LIKE {like_ms:7.1f} мс")
+        db.fts_enabled = True
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Ядро без UI: импорт модулей app.core / app.ml в процессе без Kivy.
+
+Запуск из корня репозитория:
+    python -m benchmarks.headless_import
+
+Каждый модуль импортируется в отдельном процессе, где kivy и kivymd
+запрещены (sys.modules[...] = None — любой их импорт падает с ImportError).
+Печатается время импорта и число загруженных модулей. Код возврата 1, если
+модуль ядра тянет Kivy, если `import app.ml.inference` загружает onnxruntime
+(он нужен только при создании сессии) или если PlantModel / DatabaseManager
+не создаются без дисплея.
+"""
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CORE_MODULES = ("app.core.config", "app.core.database", "app.core.price_list", "app.core.catalog_export",
+                "app.core.tasks", "app.core.startup", "app.ml.inference", "app.ml.jobs", "app.ml.model_service",
+                "app.ml.batch_diagnosis", "app.ml.inference_server", "app.ml.remote_inference")
+
+# Не должны грузиться при импорте соответствующего модуля ядра
+LAZY_IMPORTS = {"app.ml.inference": ("onnxruntime",), "app.ml.model_service": ("onnxruntime", "app.ml.inference"),
+                "app.ml.batch_diagnosis": ("onnxruntime", "pyarrow")}
+
+_PROBE = '''
+import json, sys, tempfile, time
+sys.modules["kivy"] = sys.modules["kivymd"] = None
+before = set(sys.modules)
+started = time.perf_counter()
+__import__({module!r})
+import_ms = (time.perf_counter() - started) * 1000
+loaded = sorted(set(sys.modules) - before)
+construct_ms = None
+if {module!r} == "app.ml.inference":
+    from app.ml.inference import PlantModel
+    started = time.perf_counter()
+    PlantModel()
+    construct_ms = (time.perf_counter() - started) * 1000
+elif {module!r} == "app.core.database":
+    from pathlib import Path
+    from app.core.database import DatabaseManager
+    with tempfile.TemporaryDirectory() as tmp:
+        started = time.perf_counter()
+        db = DatabaseManager()
+        db.database_path = Path(tmp) / "headless.db"
+        db.initialize()
+        construct_ms = (time.perf_counter() - started) * 1000
+        db.close()
+print(json.dumps({{"import_ms": import_ms, "construct_ms": construct_ms, "modules": loaded}}))
+'''
+
+
+def probe(module, runs=3):
+    """Лучший из runs прогонов: {'import_ms', 'construct_ms', 'modules'}"""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", _PROBE.format(module=module)],
+                                cwd=ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            lines = result.stderr.strip().splitlines()
+            raise RuntimeError(lines[-1] if lines else "import failed")
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+        if best is None or measured['import_ms'] < best['import_ms']:
+            best = measured
+    return best
+
+
+def main():
+    failures = []
+    for module in CORE_MODULES:
+        try:
+            measured = probe(module)
+        except RuntimeError as e:
+            print(f"❌ {module}: {e}")
+            failures.append(module)
+            continue
+        line = f"{measured['import_ms']:8.1f} мс  модулей {len(measured['modules']):4d}  {module}"
+        if measured['construct_ms'] is not None:
+            line += f"  (создание объекта {measured['construct_ms']:.1f} мс)"
+        print(line)
+        eager = [name for name in LAZY_IMPORTS.get(module, ()) if name in measured['modules']]
+        if eager:
+            print(f"❌ {module} при импорте загружает: {', '.join(eager)}")
+            failures.append(module)
+    if failures:
+        return 1
+    print("✅ Ядро импортируется без Kivy")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Сравнение загрузки фото: полное декодирование против draft-декодирования.
+
+Запуск из корня репозитория:
+    python -m benchmarks.image_decode --images photos/
+
+Каждый режим выполняется в отдельном процессе, чтобы пиковая память
+(ru_maxrss) не смешивалась. Печатает среднее время загрузки одного фото
+до тензора 512×512 и пиковую память процесса.
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from app.ml.image_loading import load_rgb_array
+from app.ml.inference import INPUT_SIZE
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+MODES = ("full", "draft")
+
+
+def load_full(path):
+    """Прежняя загрузка: полный декод, затем уменьшение (без учёта EXIF)"""
+    image = Image.open(path).convert('RGB')
+    return np.asarray(image.resize(INPUT_SIZE, Image.BILINEAR), dtype=np.uint8)
+
+
+def run_mode(mode, paths):
+    """Прогон в текущем процессе: время на фото и пиковая память"""
+    load = load_full if mode == "full" else lambda path: load_rgb_array(path, INPUT_SIZE)
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        load(path)
+        timings.append(time.perf_counter() - start)
+    # ru_maxrss в Linux — КБ
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"ms_per_image": 1000 * float(np.mean(timings)), "peak_rss_mb": peak_mb}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк декодирования фото")
+    parser.add_argument("--images", required=True, help="папка с фото")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)   # запуск дочернего процесса
+    args = parser.parse_args()
+
+    paths = sorted(str(p) for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    paths = paths[:args.limit]
+    if not paths:
+        parser.error(f"в папке {args.images} нет изображений")
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, paths)))
+        return
+
+    print(f"Фото: {len(paths)}")
+    for mode in MODES:
+        proc = subprocess.run(
+            [sys.executable, "-m", "benchmarks.image_decode", "--images", args.images,
+             "--limit", str(args.limit), "--mode", mode],
+            capture_output=True, text=True,
+        )
+        if proc.returncode != 0:
+            print(f"❌ {mode}: {proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else proc.returncode}")
+            continue
+        stats = json.loads(proc.stdout.strip().splitlines()[-1])
+        print(f"{mode:>6}: {stats['ms_per_image']:.1f} мс/фото, пик памяти {stats['peak_rss_mb']:.0f} МБ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Сервер инференса под нагрузкой на localhost.
+
+Запуск из корня репозитория:
+    python -m benchmarks.inference_server --images photos/
+    python -m benchmarks.inference_server --images photos/ --clients 1 4 16 --max-batch 8 --max-wait-ms 5
+
+Сервер поднимается в этом же процессе на свободном порту 127.0.0.1, затем
+для каждого числа клиентов все снимки отправляются параллельными
+запросами через InferenceClient. Печатается пропускная способность,
+задержка на клиенте (p50/p99), средний размер батча и гистограмма
+размеров батчей из /metrics.
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import AppConfig
+from app.ml.inference import PlantModel
+from app.ml.inference_server import MAX_BATCH, MAX_WAIT_MS, create_server
+from app.ml.remote_inference import InferenceClient
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+
+def run_clients(client, images, clients):
+    """Все изображения параллельными запросами -> (секунды, задержки запросов)"""
+    def send(item):
+        name, data = item
+        start = time.perf_counter()
+        client.diagnose(data, name)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        latencies = list(pool.map(send, images))
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк сервера инференса с динамическим батчингом")
+    parser.add_argument("--images", required=True, help="папка с фото")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--models-dir", default=str(AppConfig().models_dir))
+    parser.add_argument("--limit", type=int, default=200)
+    args = parser.parse_args()
+
+    paths = sorted(p for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)[:args.limit]
+    if not paths:
+        parser.error(f"в папке {args.images} нет изображений")
+    images = [(path.name, path.read_bytes()) for path in paths]
+
+    config = AppConfig()
+    config.models_dir = Path(args.models_dir)
+    config.lazy_mask_overlay = True
+    model = PlantModel(config)   # без кэша диагнозов: каждый запрос честный
+    if not model.load_models() or not model.warm_up():
+        return
+
+    print(f"{'клиентов':>9} {'изобр/с':>8} {'p50, мс':>8} {'p99, мс':>8} {'ср. батч':>9}  батчи")
+    for clients in args.clients:
+        server = create_server("127.0.0.1", 0, model=model, max_batch=args.max_batch,
+                               max_wait_ms=args.max_wait_ms)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = InferenceClient(f"http://127.0.0.1:{server.server_address[1]}")
+        try:
+            seconds, latencies = run_clients(client, images, clients)
+            metrics = client.metrics()
+        finally:
+            server.shutdown()
+            server.server_close()
+            server.batcher.close()
+        latencies = np.asarray(latencies) * 1000
+        histogram = " ".join(f"{size}:{count}" for size, count in metrics['batch_size_histogram'].items())
+        print(f"{clients:>9} {len(images) / seconds:>8.1f} {np.percentile(latencies, 50):>8.1f} "
+              f"{np.percentile(latencies, 99):>8.1f} {metrics['mean_batch_size']:>9.2f}  {histogram}")
+
+
+if __name__ == "__main__":
+    main()
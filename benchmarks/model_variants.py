@@ -0,0 +1,135 @@
+"""Сравнение вариантов моделей (fp32 / fp16 / int8): задержка, память и совпадение top-1.
+
+Запуск из корня репозитория:
+    python -m benchmarks.model_variants --images photos/ --variants fp32 int8 fp16
+    python -m benchmarks.model_variants --images photos/ --write-report
+
+Каждый вариант прогоняется в отдельном процессе, чтобы замеры памяти не
+смешивались. Совпадение считается относительно fp32 отдельно для головы
+вида и головы болезни. С --write-report результаты сохраняются в
+model_variants.json рядом с моделями — по нему AppConfig.model_variant = "auto"
+выбирает самый быстрый вариант с допустимой точностью.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.core.config import AppConfig
+from app.ml.inference import PlantModel, VARIANTS_REPORT_FILE
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tiff')
+
+
+def _rss_mb():
+    """Текущий RSS процесса в МБ (Linux /proc, иначе psutil, иначе пиковое значение)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2**20
+    except ImportError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_variant(variant, models_dir, paths, queue):
+    """Прогон одного варианта в дочернем процессе"""
+    config = AppConfig()
+    config.models_dir = Path(models_dir)
+    config.model_variant = variant
+    config.lazy_mask_overlay = True
+    model = PlantModel(config)
+
+    rss_before = _rss_mb()
+    start = time.perf_counter()
+    if not model.load_models() or model.variant != variant:
+        queue.put((variant, None))
+        return
+    load_ms = (time.perf_counter() - start) * 1000
+    model.warm_up()
+
+    timings, species, diseases = [], [], []
+    for path in paths:
+        start = time.perf_counter()
+        result = model.predict(path)
+        timings.append(time.perf_counter() - start)
+        species.append(result["species_idx"])
+        diseases.append(result["disease_idx"])
+
+    queue.put((variant, {
+        "load_ms": load_ms,
+        "latency_ms": float(np.mean(timings)) * 1000,
+        "p90_ms": float(np.percentile(timings, 90)) * 1000,
+        "rss_mb": _rss_mb() - rss_before,
+        "species": species,
+        "diseases": diseases,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк и проверка согласованности вариантов моделей")
+    parser.add_argument("--images", required=True, help="папка с фото")
+    parser.add_argument("--variants", nargs="+", default=["fp32", "int8", "fp16"])
+    parser.add_argument("--models-dir", default=str(AppConfig().models_dir))
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--write-report", action="store_true", help=f"сохранить {VARIANTS_REPORT_FILE}")
+    args = parser.parse_args()
+
+    paths = sorted(str(p) for p in Path(args.images).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS)
+    paths = paths[:args.limit]
+    if not paths:
+        parser.error(f"в папке {args.images} нет изображений")
+
+    variants = ["fp32"] + [v for v in args.variants if v != "fp32"]
+    ctx = multiprocessing.get_context("spawn")
+    stats = {}
+    for variant in variants:
+        queue = ctx.Queue()
+        proc = ctx.Process(target=run_variant, args=(variant, args.models_dir, paths, queue))
+        proc.start()
+        name, result = queue.get()
+        proc.join()
+        if result is None:
+            print(f"⚠️ Вариант {variant} недоступен — пропущен")
+            continue
+        stats[name] = result
+
+    if "fp32" not in stats:
+        print("❌ Не удалось запустить fp32-модели, сравнивать не с чем")
+        return
+
+    reference = stats["fp32"]
+    print(f"Изображений: {len(paths)}")
+    header = f"{'variant':>7} {'load,ms':>9} {'mean,ms':>9} {'p90,ms':>9} {'RSS,MB':>8} {'species':>8} {'disease':>8}"
+    print(header)
+    print("-" * len(header))
+    report = {"images": len(paths), "variants": {}}
+    for variant, s in stats.items():
+        species_agreement = float(np.mean(np.equal(s["species"], reference["species"])))
+        disease_agreement = float(np.mean(np.equal(s["diseases"], reference["diseases"])))
+        print(f"{variant:>7} {s['load_ms']:>9.1f} {s['latency_ms']:>9.1f} {s['p90_ms']:>9.1f} "
+              f"{s['rss_mb']:>8.1f} {species_agreement:>8.3f} {disease_agreement:>8.3f}")
+        report["variants"][variant] = {
+            "latency_ms": s["latency_ms"],
+            "p90_ms": s["p90_ms"],
+            "rss_mb": s["rss_mb"],
+            "species_agreement": species_agreement,
+            "disease_agreement": disease_agreement,
+        }
+
+    if args.write_report:
+        report_path = Path(args.models_dir) / VARIANTS_REPORT_FILE
+        report_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"✅ Отчёт сохранён: {report_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Бенчмарк настроек ONNX Runtime для сегментационной и классификационной моделей.
+
+Запуск из корня репозитория:
+    python -m benchmarks.onnx_sessions --runs 20
+    python -m benchmarks.onnx_sessions --threads 1 2 4 --levels basic all
+
+Для каждой конфигурации печатает время создания сессий и задержку одного
+прогона (среднее, p50, p90) — по этим цифрам подбираются настройки AppConfig
+под конкретный класс устройств.
+"""
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+from app.core.config import AppConfig
+from app.ml.inference import PlantModel, INPUT_SIZE
+
+
+def _percentile(values, q):
+    return float(np.percentile(values, q)) * 1000
+
+
+def bench_config(config, runs, warmup):
+    """Загрузить модели с данной конфигурацией и замерить задержку"""
+    model = PlantModel(config)
+    start = time.perf_counter()
+    if not model.load_models():
+        return None
+    load_ms = (time.perf_counter() - start) * 1000
+
+    rng = np.random.default_rng(0)
+    seg_input = rng.standard_normal((1, 3) + INPUT_SIZE, dtype=np.float32)
+    cls_input = rng.standard_normal((1, 5) + INPUT_SIZE, dtype=np.float32)
+
+    timings = []
+    for i in range(warmup + runs):
+        start = time.perf_counter()
+        model.seg_sess.run(None, {"input_rgb": seg_input})
+        model.cls_sess.run(None, {"input": cls_input})
+        if i >= warmup:
+            timings.append(time.perf_counter() - start)
+
+    return {
+        "load_ms": load_ms,
+        "mean_ms": float(np.mean(timings)) * 1000,
+        "p50_ms": _percentile(timings, 50),
+        "p90_ms": _percentile(timings, 90),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк настроек ONNX Runtime")
+    parser.add_argument("--threads", type=int, nargs="+", default=[0, 1, 2, 4],
+                        help="значения intra_op_num_threads (0 — по умолчанию)")
+    parser.add_argument("--levels", nargs="+", default=["basic", "extended", "all"],
+                        help="уровни оптимизации графа")
+    parser.add_argument("--modes", nargs="+", default=["sequential"],
+                        help="режимы исполнения: sequential / parallel")
+    parser.add_argument("--no-arena", action="store_true", help="дополнительно проверить без memory arena")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    args = parser.parse_args()
+
+    arenas = [True, False] if args.no_arena else [True]
+    header = f"{'threads':>7} {'level':>9} {'mode':>10} {'arena':>5} {'load,ms':>9} {'mean,ms':>9} {'p50,ms':>9} {'p90,ms':>9}"
+    print(header)
+    print("-" * len(header))
+
+    for threads, level, mode, arena in itertools.product(args.threads, args.levels, args.modes, arenas):
+        config = AppConfig()
+        config.onnx_intra_op_threads = threads
+        config.onnx_graph_optimization = level
+        config.onnx_execution_mode = mode
+        config.onnx_enable_mem_arena = arena
+        stats = bench_config(config, args.runs, args.warmup)
+        if stats is None:
+            print(f"{threads:>7} {level:>9} {mode:>10} {str(arena):>5}  ошибка загрузки моделей")
+            continue
+        print(f"{threads:>7} {level:>9} {mode:>10} {str(arena):>5} "
+              f"{stats['load_ms']:>9.1f} {stats['mean_ms']:>9.1f} {stats['p50_ms']:>9.1f} {stats['p90_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
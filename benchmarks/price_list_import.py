@@ -0,0 +1,186 @@
+"""Скорость импорта и обновления по прайс-листу (строк в секунду).
+
+Запуск из корня репозитория:
+    python -m benchmarks.price_list_import
+    python -m benchmarks.price_list_import --rows 5000 --products 50000 --db /tmp/catalog_bench.db
+
+Лист прайс-листа генерируется в том виде, в каком его отдаёт
+read_excel(header=None): шапка, строка заголовков, строки-разделители типов.
+Импорт идёт в существующий каталог (benchmarks/synthetic_catalog.py) и
+каждый раз откатывается. Для сравнения меряется прежняя построчная схема
+(SELECT типа, дубликата и каждого вещества, отдельный INSERT на строку).
+
+Для обновления прайс-лист собирается из препаратов каталога: у 10% меняется
+цена, 5% строк — новые препараты, остальные совпадают с каталогом.
+"""
+import argparse
+import random
+import time
+from pathlib import Path
+
+import pandas as pd
+
+from app.core.price_list import (PriceListImporter, PriceListUpdater, REQUIRED_COLUMNS, TYPE_VARIANTS,
+                                 dataframe_sheet, parse_composition, read_price_list_sheet)
+from benchmarks.synthetic_catalog import WORDS, build_catalog, open_database
+
+
+def price_list_sheet(rows, seed=0):
+    """Сырой лист прайс-листа на rows строк"""
+    rng = random.Random(seed)
+    width = len(REQUIRED_COLUMNS) + 1
+    table = [["Прайс-лист поставщика"] + [None] * (width - 1), [None] * width,
+             ["№ п/п"] + REQUIRED_COLUMNS]
+    separators = list(TYPE_VARIANTS)
+    for i in range(rows):
+        if i % 500 == 0:
+            table.append([separators[(i // 500) % len(separators)]] + [None] * (width - 1))
+        composition = " + ".join(f"Вещество-{rng.randrange(600):04d} {rng.randrange(10, 500)} г/л"
+                                 for _ in range(rng.randint(1, 3)))
+        price = "по запросу" if rng.random() < 0.02 else f"{rng.uniform(100, 20000):.2f}".replace('.', ',')
+        table.append([i + 1, f"Импорт {rng.choice(WORDS)} {i}", composition, f"Производитель {rng.randrange(50)}",
+                      rng.choice(("5 л", "10 л", "1 кг")), f"{rng.uniform(0.1, 3):.1f}", price])
+    return pd.DataFrame(table)
+
+
+def update_sheet(db, rows, seed=0):
+    """Лист для обновления: rows препаратов каталога (с их составом) и немного новых"""
+    rng = random.Random(seed)
+    catalog = db.connection.execute("""
+        SELECT p.name, p.manufacturer, p.packaging, p.application_rate, p.price, t.type_name,
+               (SELECT GROUP_CONCAT(a.substance_name || ' ' || pas.concentration, ' + ')
+                FROM pesticide_active_substances pas JOIN active_substances a ON a.id = pas.substance_id
+                WHERE pas.pesticide_id = p.id)
+        FROM pesticides p JOIN pesticide_types t ON t.id = p.pesticide_type_id
+        ORDER BY RANDOM() LIMIT ?
+    """, (rows,)).fetchall()
+    table = [["№ п/п"] + REQUIRED_COLUMNS]
+    for i, (name, manufacturer, packaging, rate, price, ptype, composition) in enumerate(catalog):
+        table.append([ptype.upper()] + [None] * len(REQUIRED_COLUMNS))
+        if rng.random() < 0.05:
+            name = f"Новинка {i}"
+        if rng.random() < 0.1:
+            price = round(price * 1.1, 2)
+        table.append([i + 1, name, composition, manufacturer, packaging, rate, str(price)])
+    return pd.DataFrame(table)
+
+
+def legacy_import(db, sheets):
+    """Прежняя схема: построчные SELECT и INSERT"""
+    cursor = db.connection.cursor()
+    cursor.execute("BEGIN TRANSACTION")
+    inserted = 0
+    for sheet_name, df in sheets:
+        sheet, _ = read_price_list_sheet(sheet_name, df)
+        for name, composition, manufacturer, packaging, rate, price, ptype in sheet.rows():
+            if price is None:
+                continue
+            cursor.execute("SELECT id FROM pesticide_types WHERE type_name = ?", (ptype,))
+            row = cursor.fetchone()
+            if row:
+                type_id = row[0]
+            else:
+                cursor.execute("INSERT INTO pesticide_types (type_name) VALUES (?)", (ptype,))
+                type_id = cursor.lastrowid
+            cursor.execute("SELECT id FROM pesticides WHERE name = ?", (name,))
+            if cursor.fetchone():
+                continue
+            cursor.execute('''
+                INSERT INTO pesticides (name, name_cf, description, application_rate, packaging, price, manufacturer,
+                                        pesticide_type_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, name.casefold(), "", rate, packaging, price, manufacturer, type_id))
+            pesticide_id = cursor.lastrowid
+            for substance_name, concentration in parse_composition(composition):
+                cursor.execute("SELECT id FROM active_substances WHERE substance_name = ?", (substance_name,))
+                row = cursor.fetchone()
+                if row:
+                    substance_id = row[0]
+                else:
+                    cursor.execute("INSERT INTO active_substances (substance_name, substance_name_cf) VALUES (?, ?)",
+                                   (substance_name, substance_name.casefold()))
+                    substance_id = cursor.lastrowid
+                cursor.execute("SELECT 1 FROM pesticide_active_substances WHERE pesticide_id = ? AND substance_id = ?",
+                               (pesticide_id, substance_id))
+                if not cursor.fetchone():
+                    cursor.execute("INSERT INTO pesticide_active_substances (pesticide_id, substance_id, concentration)"
+                                   " VALUES (?, ?, ?)", (pesticide_id, substance_id, concentration))
+            inserted += 1
+    return inserted
+
+
+def legacy_update(db, sheets):
+    """Прежняя схема обновления: построчное сравнение, UPDATE и перезапись состава"""
+    cursor = db.connection.cursor()
+    cursor.execute("BEGIN TRANSACTION")
+    existing = {row['name']: dict(row) for row in cursor.execute(
+        "SELECT id, name, price, application_rate, packaging, manufacturer, pesticide_type_id FROM pesticides")}
+    for sheet_name, df in sheets:
+        sheet, _ = read_price_list_sheet(sheet_name, df)
+        for name, composition, manufacturer, packaging, rate, price, ptype in sheet.rows():
+            if price is None:
+                continue
+            type_id = db.references.get_or_create("types", ptype, cursor)
+            if name not in existing:
+                cursor.execute("INSERT INTO pesticides (name, name_cf, description, application_rate, packaging, price,"
+                               " manufacturer, pesticide_type_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                               (name, name.casefold(), "", rate, packaging, price, manufacturer, type_id))
+                pesticide_id = cursor.lastrowid
+                existing[name] = {'id': pesticide_id}
+            else:
+                pesticide_id = existing[name]['id']
+                if price != existing[name]['price']:
+                    cursor.execute("UPDATE pesticides SET price = ? WHERE id = ?", (price, pesticide_id))
+                if composition:
+                    cursor.execute("DELETE FROM pesticide_active_substances WHERE pesticide_id = ?", (pesticide_id,))
+            for substance_name, concentration in parse_composition(composition):
+                substance_id = db.references.get_or_create("substances", substance_name, cursor)
+                cursor.execute("INSERT OR IGNORE INTO pesticide_active_substances (pesticide_id, substance_id, concentration)"
+                               " VALUES (?, ?, ?)", (pesticide_id, substance_id, concentration))
+    return len(existing)
+
+
+def bulk_import(db, sheets):
+    return PriceListImporter(db).run(dataframe_sheet(name, df) for name, df in sheets)['inserted']
+
+
+def bulk_update(db, sheets):
+    stats = PriceListUpdater(db).run(dataframe_sheet(name, df) for name, df in sheets)
+    return stats['new'] + stats['updated']
+
+
+def measure(db, load, sheets):
+    start = time.perf_counter()
+    inserted = load(db, sheets)
+    elapsed = time.perf_counter() - start
+    db.connection.rollback()
+    return inserted, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк импорта прайс-листа")
+    parser.add_argument("--db", default="/tmp/catalog_bench.db")
+    parser.add_argument("--products", type=int, default=50000, help="размер каталога, если БД создаётся")
+    parser.add_argument("--rows", type=int, default=5000, help="строк в прайс-листе")
+    args = parser.parse_args()
+
+    db = open_database(args.db) if Path(args.db).exists() else build_catalog(args.db, args.products)
+    total = db.connection.execute("SELECT COUNT(*) FROM pesticides").fetchone()[0]
+    sheets = [("Прайс", price_list_sheet(args.rows))]
+    rows = sum(len(read_price_list_sheet(name, df)[0]) for name, df in sheets)
+    print(f"Каталог: {total} препаратов, прайс-лист: {rows} строк")
+
+    for title, load in (("построчно", legacy_import), ("пачками", bulk_import)):
+        inserted, elapsed = measure(db, load, sheets)
+        print(f"{title:>10}: добавлено {inserted} за {elapsed:6.2f} с — {rows / elapsed:8.0f} строк/с")
+
+    sheets = [("Обновление", update_sheet(db, args.rows))]
+    print(f"Обновление: {args.rows} строк")
+    for title, load in (("построчно", legacy_update), ("множествами", bulk_update)):
+        _, elapsed = measure(db, load, sheets)
+        print(f"{title:>12}: {elapsed:6.2f} с — {args.rows / elapsed:8.0f} строк/с")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Чтение прайс-листа из .xlsx: время и пик памяти (tracemalloc).
+
+Запуск из корня репозитория:
+    python -m benchmarks.price_list_read
+    python -m benchmarks.price_list_read --rows 10000 50000 --out /tmp/price_list_bench
+
+Сравниваются прежнее чтение (read_excel(header=None) целого листа и разбор
+DataFrame) и потоковое open_price_list (openpyxl read_only, куски по
+PriceListSheetReader.CHUNK_SIZE строк). Строки кусков только считаются, а не
+накапливаются — так видно, что пик памяти чтения не растёт с размером листа;
+остаётся только таблица общих строк книги (sharedStrings), которую openpyxl
+держит целиком.
+"""
+import argparse
+import time
+import tracemalloc
+from pathlib import Path
+
+import pandas as pd
+from openpyxl import Workbook
+
+from app.core.price_list import open_price_list, read_price_list_sheet
+from benchmarks.price_list_import import price_list_sheet
+
+SHEET_NAME = "Прайс"
+
+
+def write_workbook(path, rows):
+    """Файл .xlsx с одним листом прайс-листа на rows строк (write_only)"""
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet(SHEET_NAME)
+    for values in price_list_sheet(rows).itertuples(index=False, name=None):
+        worksheet.append([None if pd.isna(value) else value for value in values])
+    workbook.save(path)
+
+
+def dataframe_read(path):
+    df = pd.read_excel(path, sheet_name=SHEET_NAME, header=None)
+    sheet, _ = read_price_list_sheet(SHEET_NAME, df)
+    return len(sheet)
+
+
+def streaming_read(path):
+    count = 0
+    for reader in open_price_list(path, [SHEET_NAME]):
+        for chunk in reader.chunks():
+            count += len(chunk)
+    return count
+
+
+def measure(read, path):
+    """(строк, секунд, пик памяти в байтах); время — без tracemalloc, он замедляет чтение в разы"""
+    start = time.perf_counter()
+    count = read(path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    read(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк чтения прайс-листа")
+    parser.add_argument("--out", default="/tmp/price_list_bench")
+    parser.add_argument("--rows", type=int, nargs="+", default=[5000, 20000, 50000])
+    args = parser.parse_args()
+
+    out = Path(args.out)
+    out.mkdir(parents=True, exist_ok=True)
+    for rows in args.rows:
+        path = out / f"price_list_{rows}.xlsx"
+        if not path.exists():
+            write_workbook(path, rows)
+        print(f"Прайс-лист: {rows} строк, {path.stat().st_size / 2 ** 20:.1f} МБ")
+        for title, read in (("DataFrame", dataframe_read), ("потоком", streaming_read)):
+            count, elapsed, peak = measure(read, path)
+            print(f"{title:>10}: {count} строк за {elapsed:6.2f} с — {count / elapsed:8.0f} строк/с,"
+                  f" пик памяти {peak / 2 ** 20:7.1f} МБ")
+
+
+if __name__ == "__main__":
+    main()
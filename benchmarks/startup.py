@@ -0,0 +1,116 @@
+"""Время запуска приложения: импорт модулей и первый кадр.
+
+Запуск из корня репозитория:
+    python -m benchmarks.startup
+    python -m benchmarks.startup --save-baseline benchmarks/startup_baseline.json
+    python -m benchmarks.startup --baseline benchmarks/startup_baseline.json --tolerance 0.2
+
+1. `python -X importtime -c "import main"` в отдельном процессе: время
+   импорта main и самые дорогие модули (собственное и суммарное время).
+   Модули вкладок и тяжёлые библиотеки (LAZY_MODULES) не должны
+   импортироваться при запуске — иначе бенчмарк считает это регрессией.
+2. `python main.py` с PLANT_STARTUP_PROFILE / PLANT_STARTUP_EXIT: приложение
+   пишет отметки StartupProfiler (imports, build, first_frame) и закрывается
+   после первого кадра. Без дисплея этот шаг пропускается.
+
+С --baseline время импорта и первого кадра сравнивается с сохранённым;
+превышение больше чем на tolerance — код возврата 1.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from app.core.startup import EXIT_ENV, PROFILE_ENV
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Импортируются только при первом показе вкладки / первой диагностике
+LAZY_MODULES = ("app.ui.screens.camera_screen", "app.ui.screens.catalog_screen", "app.ui.screens.settings_screen",
+                "app.ml.inference", "onnxruntime", "pandas")
+
+
+def import_times(module="main", runs=3):
+    """{модуль: (собственное, суммарное) время импорта в мс} — лучший из runs прогонов по суммарному времени module"""
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                                cwd=ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+        times = {}
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith("import time:") or "imported package" in line:
+                continue
+            self_us, cumulative_us, name = line[len("import time:"):].split("|")
+            times[name.strip()] = (int(self_us) / 1000, int(cumulative_us) / 1000)
+        if best is None or times[module][1] < best[module][1]:
+            best = times
+    return best
+
+
+def first_frame(timeout=60):
+    """Отметки StartupProfiler из запуска приложения или None, если окно не открылось"""
+    with tempfile.TemporaryDirectory() as tmp:
+        profile_path = Path(tmp) / "startup.json"
+        env = dict(os.environ, **{PROFILE_ENV: str(profile_path), EXIT_ENV: "1"})
+        try:
+            subprocess.run([sys.executable, "main.py"], cwd=ROOT, env=env, capture_output=True, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return None
+        if not profile_path.exists():
+            return None
+        return json.loads(profile_path.read_text(encoding="utf-8"))['marks_ms']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк запуска приложения")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15, help="сколько самых дорогих модулей показать")
+    parser.add_argument("--baseline", help="JSON с прежними результатами для сравнения")
+    parser.add_argument("--save-baseline", help="сохранить результаты в JSON")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="допустимый рост времени (доля)")
+    args = parser.parse_args()
+
+    failures = []
+    results = {}
+    try:
+        times = import_times(args.module)
+    except RuntimeError as e:
+        print(f"❌ Импорт {args.module} не удался: {e}")
+        return 1
+    results['import_ms'] = times[args.module][1]
+    print(f"Импорт {args.module}: {results['import_ms']:.0f} мс, модулей: {len(times)}")
+    for name, (self_ms, cumulative_ms) in sorted(times.items(), key=lambda item: -item[1][0])[:args.top]:
+        print(f"  {self_ms:8.1f} мс  (всего {cumulative_ms:8.1f})  {name}")
+
+    eager = [name for name in LAZY_MODULES if name in times]
+    if eager:
+        failures.append(f"импортируются при запуске: {', '.join(eager)}")
+
+    marks = first_frame()
+    if marks is None:
+        print("⚠️ Первый кадр не измерен: окно приложения не открылось (нет дисплея?)")
+    else:
+        results.update(marks)
+        print("Отметки запуска: " + ", ".join(f"{name} {ms:.0f} мс" for name, ms in marks.items()))
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        for key in ('import_ms', 'first_frame'):
+            if key in baseline and key in results and results[key] > baseline[key] * (1 + args.tolerance):
+                failures.append(f"{key}: {results[key]:.0f} мс при базовых {baseline[key]:.0f} мс")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    for failure in failures:
+        print(f"❌ Регрессия запуска — {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
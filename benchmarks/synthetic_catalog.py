@@ -0,0 +1,88 @@
+"""Синтетический каталог препаратов для бенчмарков БД.
+
+    python -m benchmarks.synthetic_catalog --out /tmp/catalog.db --products 50000
+
+Схема создаётся тем же DatabaseManager, что и в приложении; данные
+детерминированы (seed), чтобы прогоны можно было сравнивать.
+"""
+import argparse
+import random
+from pathlib import Path
+
+from app.core.database import DatabaseManager
+
+PESTICIDE_TYPES = ("Фунгицид", "Инсектицид", "Гербицид", "Акарицид", "Протравитель")
+WORDS = ("Альфа", "Бета", "Гамма", "Супер", "Форте", "Макс", "Агро", "Щит", "Стоп", "Экстра",
+         "Кроп", "Терра", "Вега", "Прима", "Ультра", "Ранчо", "Сигма", "Зенит", "Титан", "Юнона")
+
+
+def open_database(path):
+    """DatabaseManager поверх файла path (схема создаётся при необходимости)"""
+    db = DatabaseManager()
+    db.database_path = Path(path)
+    if not db.initialize():
+        raise RuntimeError(f"Не удалось открыть БД {path}")
+    return db
+
+
+def build_catalog(path, products=50000, substances=400, cultures=60, diseases=300, seed=0):
+    """Создать БД path и заполнить её синтетическим каталогом"""
+    path = Path(path)
+    if path.exists():
+        path.unlink()
+    rng = random.Random(seed)
+    db = open_database(path)
+    conn = db.connection
+
+    # Триггеры поискового индекса отключены на время заливки, индекс строится один раз
+    with db.search_index_suspended():
+        conn.executemany("INSERT INTO pesticide_types (type_name) VALUES (?)", [(t,) for t in PESTICIDE_TYPES])
+        conn.executemany("INSERT INTO active_substances (substance_name, substance_name_cf) VALUES (?, ?)",
+                         [(f"Вещество-{i:04d}", f"вещество-{i:04d}") for i in range(substances)])
+        conn.executemany("INSERT INTO cultures (culture_name, culture_name_cf) VALUES (?, ?)",
+                         [(f"Культура-{i:03d}", f"культура-{i:03d}") for i in range(cultures)])
+        conn.executemany("INSERT INTO diseases (disease_name, disease_name_cf) VALUES (?, ?)",
+                         [(f"Болезнь-{i:04d}", f"болезнь-{i:04d}") for i in range(diseases)])
+
+        products_rows = [
+            (i, f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}", f"Описание препарата {i}",
+             f"{rng.uniform(0.1, 3):.1f}", rng.choice(("5 л", "10 л", "1 кг", "20 кг")),
+             round(rng.uniform(100, 20000), 2), f"Производитель {rng.randrange(50)}", "шт",
+             rng.randrange(1, len(PESTICIDE_TYPES) + 1))
+            for i in range(1, products + 1)
+        ]
+        conn.executemany(
+            """INSERT INTO pesticides (id, name, name_cf, description, application_rate, packaging, price,
+                                       manufacturer, unit_of_measure, pesticide_type_id)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [row[:2] + (row[1].casefold(),) + row[2:] for row in products_rows],
+        )
+        conn.executemany(
+            "INSERT INTO pesticide_active_substances (pesticide_id, substance_id, concentration) VALUES (?, ?, ?)",
+            [(i, sid, f"{rng.randrange(10, 500)} г/л")
+             for i in range(1, products + 1)
+             for sid in rng.sample(range(1, substances + 1), rng.randint(1, 3))],
+        )
+        conn.executemany(
+            "INSERT INTO pesticide_cultures (pesticide_id, culture_id) VALUES (?, ?)",
+            [(i, cid) for i in range(1, products + 1) for cid in rng.sample(range(1, cultures + 1), rng.randint(1, 4))],
+        )
+        conn.executemany(
+            "INSERT INTO pesticide_diseases (pesticide_id, disease_id) VALUES (?, ?)",
+            [(i, did) for i in range(1, products + 1) for did in rng.sample(range(1, diseases + 1), rng.randint(1, 4))],
+        )
+        conn.commit()
+    return db
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генерация синтетического каталога")
+    parser.add_argument("--out", required=True, help="путь к создаваемой БД")
+    parser.add_argument("--products", type=int, default=50000)
+    args = parser.parse_args()
+    build_catalog(args.out, args.products).close()
+    print(f"✅ Каталог на {args.products} препаратов: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
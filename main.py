@@ -1,20 +1,34 @@
+# Отметки времени запуска — до импорта Kivy, чтобы учесть и его
+from app.core.startup import StartupProfiler
+STARTUP = StartupProfiler()
+
 from kivy.lang import Builder
 from kivymd.app import MDApp
 from kivy.uix.screenmanager import ScreenManager
 from kivy.core.window import Window 
 from kivy.metrics import dp
+from kivy.clock import Clock
 
 from app.core.config import AppConfig
 from app.core.database import DatabaseManager
+from app.core.tasks import TaskRunner
+from app.ml.model_service import ModelService
 from app.ui.screens.main_screen import MainScreen
-from app.ui.screens.camera_screen import CameraScreen
+from app.ui.ui_thread import post
+
+STARTUP.mark("imports")
 
 class PlantProtectionApp(MDApp):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
         self.config = AppConfig()
         self.db = DatabaseManager()
+        # Импорт/экспорт каталога в фоне; колбэки возвращаются в поток UI через post (Clock)
+        self.tasks = TaskRunner(self.db, post=post)
+        # Одна модель диагностики на процесс; экраны берут её через acquire/release
+        self.models = ModelService(self.config, cache=self.db)
         self.screen_manager = None
+        self.startup = STARTUP
 
     def build(self):
         Window.size = (dp(390), dp(640))
@@ -25,7 +39,23 @@ class PlantProtectionApp(MDApp):
         self._initialize_components()
         
         # Создание интерфейса
-        return self._create_interface()
+        interface = self._create_interface()
+        self.startup.mark("build")
+        return interface
+
+    def on_start(self):
+        # on_flip — после вывода кадра на экран: первый вызов и есть «первый кадр»
+        Window.bind(on_flip=self._on_first_frame)
+
+    def _on_first_frame(self, *args):
+        Window.unbind(on_flip=self._on_first_frame)
+        elapsed = self.startup.mark("first_frame")
+        print(f"✅ Первый кадр через {elapsed * 1000:.0f} мс после запуска")
+        profile_path = self.startup.profile_path()
+        if profile_path:
+            self.startup.save(profile_path)
+        if self.startup.exit_after_first_frame():
+            Clock.schedule_once(lambda dt: self.stop())
 
     def _initialize_components(self):
         """Инициализация основных компонентов приложения"""
@@ -44,17 +74,22 @@ class PlantProtectionApp(MDApp):
         main_screen = MainScreen(name='main')
         self.screen_manager.add_widget(main_screen)
         
-        # Добавляем экран диагностики (камера)
-        camera_screen = CameraScreen(name='camera_screen')
-        self.screen_manager.add_widget(camera_screen)
-
+        # Экран диагностики (камера) создаётся при первом открытии (open_diagnosis)
         return self.screen_manager
     
 
+    def on_stop(self):
+        # Неподтверждённый импорт при выходе откатывается
+        self.tasks.finish(commit=False)
+        self.models.close()
+
     # Методы навигации
     def open_diagnosis(self):
         print("📷 Открыть диагностику заболеваний")
         if self.screen_manager:
+            if not self.screen_manager.has_screen('camera_screen'):
+                from app.ui.screens.camera_screen import CameraScreen
+                self.screen_manager.add_widget(CameraScreen(name='camera_screen'))
             self.screen_manager.current = 'camera_screen'
     
     def open_catalog(self):